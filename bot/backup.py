@@ -0,0 +1,963 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+================================================================
+BACKUP - Sauvegardes en ligne PostgreSQL / Redis
+================================================================
+Les tables sont exportées en flux (COPY ... TO STDOUT), compressées
+(gzip) et hachées (SHA-256) à l'écriture, sur plusieurs connexions
+partageant le même instantané (pg_export_snapshot, comme pg_dump -j) :
+l'ensemble est cohérent sans bloquer les écritures. messages est
+exportée en incrémental : au-delà du dernier message_id sauvegardé,
+plus les lignes modifiées / supprimées depuis la sauvegarde parente.
+Redis : BGSAVE (en arrière-plan) puis copie de dump.rdb. Le manifeste
+(fichiers, lignes, empreintes, chaîne incrémentale) est écrit en
+dernier : un dossier sans manifest.json est une sauvegarde incomplète.
+La restauration est vérifiée dans une base de test (RESTORE_CHECK_DSN).
+================================================================
+"""
+
+import os
+import re
+import gzip
+import time
+import shutil
+import asyncio
+import hashlib
+from datetime import datetime, timedelta, timezone
+from dataclasses import dataclass, field
+from typing import Optional, List, Dict, Tuple, Any, Callable, Awaitable, AsyncIterator
+
+import orjson
+import structlog
+
+from services import Metrics
+
+logger = structlog.get_logger(__name__)
+
+# ================================================================
+# SCHÉMA
+# ================================================================
+
+# Suppressions physiques de messages (rétention) : rejouées par les
+# sauvegardes incrémentales, qui ne voient que les lignes présentes
+SCHEMA_SQL = '''
+CREATE TABLE IF NOT EXISTS message_purges (
+    message_id BIGINT NOT NULL,
+    purged_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+
+CREATE INDEX IF NOT EXISTS idx_message_purges_purged_at ON message_purges (purged_at);
+
+-- Chaque branche du filtre incrémental (OR) doit avoir son index, sinon parcours complet
+CREATE INDEX IF NOT EXISTS idx_messages_created_at ON messages (created_at);
+
+CREATE OR REPLACE FUNCTION messages_purged() RETURNS trigger AS $$
+BEGIN
+    INSERT INTO message_purges (message_id) SELECT message_id FROM purged;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS messages_purged ON messages;
+CREATE TRIGGER messages_purged AFTER DELETE ON messages
+    REFERENCING OLD TABLE AS purged
+    FOR EACH STATEMENT EXECUTE FUNCTION messages_purged();
+'''
+
+# Table exportée en incrémental, clé croissante (snowflake Discord)
+INCREMENTAL_TABLE = 'messages'
+WATERMARK_COLUMN = 'message_id'
+# Colonnes datées relues sur la marge : created_at (les snowflakes ne sont
+# pas dans l'ordre des commits : un message d'ID inférieur à la marque haute
+# peut être inséré juste après l'instantané parent), puis modifications et
+# suppressions logiques de tracking.py
+CHANGE_COLUMNS = ('created_at', 'edited_at', 'deleted_at')
+# Marge sur la date de la sauvegarde parente : lignes écrites par lots
+# avec la date Discord, parfois après coup (lignes ré-appliquées à
+# l'identique, sans effet)
+CHANGE_OVERLAP = timedelta(hours=1)
+
+# === Catalogue (schéma public, objets d'extensions exclus) ===
+
+NOT_EXTENSION = '''NOT EXISTS (
+    SELECT 1 FROM pg_depend d WHERE d.classid = {catalog}::regclass AND d.objid = {oid} AND d.deptype = 'e'
+)'''
+
+SNAPSHOT_SQL = '''
+SELECT pg_export_snapshot() AS snapshot, now() AS snapshot_at, current_database() AS database,
+       current_setting('server_version') AS server_version
+'''
+
+IDENTITY_SQL = '''
+SELECT current_database() AS database, inet_server_addr()::text AS address, inet_server_port() AS port
+'''
+
+EXTENSIONS_SQL = "SELECT extname AS name FROM pg_extension WHERE extname <> 'plpgsql' ORDER BY extname"
+
+ENUMS_SQL = '''
+SELECT t.typname AS name, array_agg(e.enumlabel ORDER BY e.enumsortorder) AS labels
+FROM pg_type t
+JOIN pg_enum e ON e.enumtypid = t.oid
+WHERE t.typnamespace = 'public'::regnamespace
+GROUP BY t.typname
+ORDER BY t.typname
+'''
+
+# Séquences autonomes ou SERIAL (les séquences d'identité sont recréées avec la colonne)
+SEQUENCES_SQL = f'''
+SELECT c.relname AS name, format_type(s.seqtypid, NULL) AS type, s.seqincrement AS increment,
+       s.seqmin AS min, s.seqmax AS max, s.seqstart AS start, s.seqcycle AS cycle,
+       EXISTS (
+           SELECT 1 FROM pg_depend d WHERE d.classid = 'pg_class'::regclass AND d.objid = c.oid AND d.deptype = 'i'
+       ) AS identity
+FROM pg_sequence s
+JOIN pg_class c ON c.oid = s.seqrelid
+WHERE c.relnamespace = 'public'::regnamespace
+  AND {NOT_EXTENSION.format(catalog="'pg_class'", oid='c.oid')}
+ORDER BY c.relname
+'''
+
+TABLES_SQL = f'''
+SELECT c.oid, c.relname AS name, pg_total_relation_size(c.oid) AS size
+FROM pg_class c
+WHERE c.relnamespace = 'public'::regnamespace AND c.relkind = 'r'
+  AND {NOT_EXTENSION.format(catalog="'pg_class'", oid='c.oid')}
+ORDER BY size DESC, c.relname
+'''
+
+COLUMNS_SQL = '''
+SELECT a.attrelid AS table_oid, a.attname AS name, format_type(a.atttypid, a.atttypmod) AS type,
+       a.attnotnull AS not_null, a.attidentity::text AS identity, a.attgenerated::text AS generated,
+       pg_get_expr(d.adbin, d.adrelid) AS default
+FROM pg_attribute a
+LEFT JOIN pg_attrdef d ON d.adrelid = a.attrelid AND d.adnum = a.attnum
+WHERE a.attrelid = ANY($1::oid[]) AND a.attnum > 0 AND NOT a.attisdropped
+ORDER BY a.attrelid, a.attnum
+'''
+
+FUNCTIONS_SQL = f'''
+SELECT pg_get_functiondef(p.oid) AS definition
+FROM pg_proc p
+WHERE p.pronamespace = 'public'::regnamespace AND p.prokind IN ('f', 'p')
+  AND {NOT_EXTENSION.format(catalog="'pg_proc'", oid='p.oid')}
+ORDER BY p.proname, p.oid
+'''
+
+# Clés étrangères en dernier (tables référencées complètes)
+CONSTRAINTS_SQL = '''
+SELECT c.relname AS table_name, k.conname AS name, pg_get_constraintdef(k.oid) AS definition
+FROM pg_constraint k
+JOIN pg_class c ON c.oid = k.conrelid
+WHERE c.relnamespace = 'public'::regnamespace AND c.relkind = 'r' AND k.contype IN ('p', 'u', 'c', 'x', 'f')
+ORDER BY k.contype = 'f', c.relname, k.conname
+'''
+
+# Index hors contraintes (créés par ADD CONSTRAINT)
+INDEXES_SQL = '''
+SELECT pg_get_indexdef(i.indexrelid) AS definition
+FROM pg_index i
+JOIN pg_class t ON t.oid = i.indrelid
+WHERE t.relnamespace = 'public'::regnamespace AND t.relkind = 'r'
+  AND NOT EXISTS (SELECT 1 FROM pg_constraint k WHERE k.conindid = i.indexrelid AND k.conrelid = i.indrelid)
+ORDER BY t.relname, i.indexrelid
+'''
+
+# Ordre de création (oid) : une vue dépend de vues plus anciennes
+VIEWS_SQL = f'''
+SELECT c.relname AS name, c.relkind::text AS kind, pg_get_viewdef(c.oid) AS definition
+FROM pg_class c
+WHERE c.relnamespace = 'public'::regnamespace AND c.relkind IN ('v', 'm')
+  AND {NOT_EXTENSION.format(catalog="'pg_class'", oid='c.oid')}
+ORDER BY c.oid
+'''
+
+TRIGGERS_SQL = '''
+SELECT pg_get_triggerdef(t.oid) AS definition
+FROM pg_trigger t
+JOIN pg_class c ON c.oid = t.tgrelid
+WHERE c.relnamespace = 'public'::regnamespace AND NOT t.tgisinternal
+ORDER BY c.relname, t.tgname
+'''
+
+SNAPSHOT_RE = re.compile(r'^[0-9A-F]+-[0-9A-F]+(-[0-9]+)?$', re.I)
+BACKUP_ID_RE = re.compile(r'^\d{8}T\d{6}Z$')
+
+MANIFEST = 'manifest.json'
+SCHEMA_PRE = 'schema_pre.sql'
+SCHEMA_POST = 'schema_post.sql'
+REDIS_FILE = 'redis.rdb.gz'
+PURGES_FILE = f'{INCREMENTAL_TABLE}.purged.copy.gz'
+
+CHUNK_SIZE = 1024 * 1024
+
+# ================================================================
+# SQL
+# ================================================================
+
+def ident(name: str) -> str:
+    """Identifiant SQL entre guillemets"""
+    return '"' + name.replace('"', '""') + '"'
+
+def literal(value: str) -> str:
+    return "'" + value.replace("'", "''") + "'"
+
+def _column_ddl(column: Dict[str, Any]) -> str:
+    parts = [ident(column['name']), column['type']]
+    if column['identity']:
+        parts.append('GENERATED ALWAYS AS IDENTITY' if column['identity'] == 'a' else 'GENERATED BY DEFAULT AS IDENTITY')
+    elif column['generated']:
+        parts.append(f"GENERATED ALWAYS AS ({column['default']}) STORED")
+    elif column['default'] is not None:
+        parts.append(f"DEFAULT {column['default']}")
+    if column['not_null']:
+        parts.append('NOT NULL')
+    return ' '.join(parts)
+
+def _statement(definition: str) -> str:
+    return definition.strip().rstrip(';') + ';\n'
+
+async def export_schema(conn, tables: List[Dict[str, Any]], columns: Dict[int, List[Dict[str, Any]]]) -> Tuple[str, str]:
+    """Schéma public depuis le catalogue (pg_dump absent de l'image)
+
+    schema_pre : avant les données (extensions, types, séquences, tables, fonctions).
+    schema_post : après (contraintes, index, vues, triggers, valeurs des séquences).
+    """
+    pre = ['SET check_function_bodies = false;\n']
+    post = []
+
+    for row in await conn.fetch(EXTENSIONS_SQL):
+        pre.append(f"CREATE EXTENSION IF NOT EXISTS {ident(row['name'])};\n")
+
+    for row in await conn.fetch(ENUMS_SQL):
+        labels = ', '.join(literal(label) for label in row['labels'])
+        pre.append(f"CREATE TYPE public.{ident(row['name'])} AS ENUM ({labels});\n")
+
+    sequences = await conn.fetch(SEQUENCES_SQL)
+    for seq in sequences:
+        if seq['identity']:
+            continue
+        pre.append(
+            f"CREATE SEQUENCE public.{ident(seq['name'])} AS {seq['type']} INCREMENT {seq['increment']} "
+            f"MINVALUE {seq['min']} MAXVALUE {seq['max']} START {seq['start']}"
+            f"{' CYCLE' if seq['cycle'] else ''};\n"
+        )
+
+    for table in tables:
+        body = ',\n    '.join(_column_ddl(column) for column in columns[table['oid']])
+        pre.append(f"CREATE TABLE public.{ident(table['name'])} (\n    {body}\n);\n")
+
+    for row in await conn.fetch(FUNCTIONS_SQL):
+        pre.append(_statement(row['definition']))
+
+    for row in await conn.fetch(CONSTRAINTS_SQL):
+        post.append(
+            f"ALTER TABLE public.{ident(row['table_name'])} ADD CONSTRAINT {ident(row['name'])} {row['definition']};\n"
+        )
+
+    for row in await conn.fetch(INDEXES_SQL):
+        post.append(_statement(row['definition']))
+
+    materialized = []
+    for row in await conn.fetch(VIEWS_SQL):
+        definition = row['definition'].strip().rstrip(';')
+        if row['kind'] == 'm':
+            post.append(f"CREATE MATERIALIZED VIEW public.{ident(row['name'])} AS {definition} WITH NO DATA;\n")
+            materialized.append(row['name'])
+        else:
+            post.append(f"CREATE VIEW public.{ident(row['name'])} AS {definition};\n")
+
+    for row in await conn.fetch(TRIGGERS_SQL):
+        post.append(_statement(row['definition']))
+
+    # Séquences : non transactionnelles, valeur courante (>= instantané)
+    for seq in sequences:
+        name = f"public.{ident(seq['name'])}"
+        row = await conn.fetchrow(f"SELECT last_value, is_called FROM {name}")
+        post.append(f"SELECT setval({literal(name)}, {row['last_value']}, {str(row['is_called']).lower()});\n")
+
+    for name in materialized:
+        post.append(f"REFRESH MATERIALIZED VIEW public.{ident(name)};\n")
+
+    return ''.join(pre), ''.join(post)
+
+# ================================================================
+# FICHIERS
+# ================================================================
+
+class _HashingFile:
+    """Fichier en écriture : SHA-256 et taille des octets écrits (compressés)"""
+
+    def __init__(self, path: str):
+        self._file = open(path, 'wb')
+        self.sha256 = hashlib.sha256()
+        self.size = 0
+
+    def write(self, data: bytes) -> int:
+        self.sha256.update(data)
+        self.size += len(data)
+        return self._file.write(data)
+
+    def flush(self):
+        self._file.flush()
+
+    def close(self):
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._file.close()
+
+class GzipSink:
+    """Sortie d'un COPY : tampon en mémoire, compression et écriture hors boucle"""
+
+    def __init__(self, path: str, level: int = 6):
+        self.path = path
+        self.level = level
+        self.raw_bytes = 0
+        self._temp = path + '.tmp'
+        self._buffer = bytearray()
+        self._file: Optional[_HashingFile] = None
+        self._gzip: Optional[gzip.GzipFile] = None
+
+    def _open(self):
+        self._file = _HashingFile(self._temp)
+        self._gzip = gzip.GzipFile(fileobj=self._file, mode='wb', compresslevel=self.level, mtime=0)
+
+    def _write(self, data: bytes):
+        if self._gzip is None:
+            self._open()
+        self._gzip.write(data)
+
+    async def write(self, chunk: bytes):
+        self.raw_bytes += len(chunk)
+        self._buffer += chunk
+        if len(self._buffer) >= CHUNK_SIZE:
+            data, self._buffer = bytes(self._buffer), bytearray()
+            await asyncio.get_running_loop().run_in_executor(None, self._write, data)
+
+    def _close(self) -> Dict[str, Any]:
+        if self._buffer or self._gzip is None:
+            self._write(bytes(self._buffer))
+            self._buffer.clear()
+        self._gzip.close()
+        self._file.close()
+        os.replace(self._temp, self.path)
+        return {'sha256': self._file.sha256.hexdigest(), 'bytes': self._file.size}
+
+    async def close(self) -> Dict[str, Any]:
+        """Terminer le fichier : {sha256, bytes}"""
+        return await asyncio.get_running_loop().run_in_executor(None, self._close)
+
+    def discard(self):
+        if self._gzip is not None:
+            self._gzip.close()
+            self._file.close()
+        if os.path.exists(self._temp):
+            os.unlink(self._temp)
+
+def _write_file(path: str, data: bytes) -> Dict[str, Any]:
+    temp = path + '.tmp'
+    with open(temp, 'wb') as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temp, path)
+    return {'sha256': hashlib.sha256(data).hexdigest(), 'bytes': len(data)}
+
+def _gzip_file(source: str, path: str, level: int = 6) -> Dict[str, Any]:
+    """Copie compressée d'un fichier (dump.rdb)"""
+    target = _HashingFile(path + '.tmp')
+    with open(source, 'rb') as src, gzip.GzipFile(fileobj=target, mode='wb', compresslevel=level, mtime=0) as gz:
+        shutil.copyfileobj(src, gz, CHUNK_SIZE)
+    target.close()
+    os.replace(path + '.tmp', path)
+    return {'sha256': target.sha256.hexdigest(), 'bytes': target.size}
+
+def file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        while chunk := f.read(CHUNK_SIZE):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+async def read_gzip(path: str) -> AsyncIterator[bytes]:
+    """Décompression en flux (source d'un copy_to_table)"""
+    loop = asyncio.get_running_loop()
+    f = await loop.run_in_executor(None, gzip.open, path, 'rb')
+    try:
+        while chunk := await loop.run_in_executor(None, f.read, CHUNK_SIZE):
+            yield chunk
+    finally:
+        f.close()
+
+def _copy_rows(status: str) -> int:
+    """'COPY 1234' -> 1234"""
+    try:
+        return int(status.rsplit(' ', 1)[-1])
+    except (AttributeError, ValueError):
+        return 0
+
+# ================================================================
+# SAUVEGARDES
+# ================================================================
+
+class BackupError(RuntimeError):
+    """Sauvegarde ou vérification impossible"""
+
+@dataclass
+class TableJob:
+    """Export d'une table (ou d'un extrait) vers un fichier"""
+    table: str
+    file: str
+    query: str
+    args: Tuple = ()
+    columns: List[str] = field(default_factory=list)
+    mode: str = 'full'
+    size: int = 0
+
+class BackupManager:
+    """Sauvegardes complètes / incrémentales, vérification, rétention"""
+
+    def __init__(
+        self,
+        connect: Callable[[], Awaitable],
+        pool_getter: Callable,
+        redis_getter: Callable,
+        root: str,
+        concurrency: int = 3,
+        compress_level: int = 6,
+        redis_data_path: Optional[str] = None,
+        redis_timeout: float = 300,
+        verify_connect: Optional[Callable[[], Awaitable]] = None,
+        retention_days: int = 30,
+        full_weekday: int = 6,
+        metrics: Optional[Metrics] = None,
+    ):
+        self.connect = connect                  # Connexion dédiée (une par worker)
+        self.pool_getter = pool_getter
+        self.redis_getter = redis_getter
+        self.root = root
+        self.concurrency = max(1, concurrency)
+        self.compress_level = compress_level
+        self.redis_data_path = redis_data_path  # Dossier de dump.rdb (volume Redis en lecture seule)
+        self.redis_timeout = redis_timeout
+        self.verify_connect = verify_connect    # Base de test (RESTORE_CHECK_DSN)
+        self.retention_days = retention_days
+        self.full_weekday = full_weekday        # 0 = lundi
+        self.metrics = metrics or Metrics(False)
+
+        self.progress: Optional[Dict[str, Any]] = None
+        self._lock = asyncio.Lock()
+
+    # === Cycle de vie ===
+
+    async def start(self):
+        """Créer le dossier et le journal des suppressions (idempotent)"""
+        await asyncio.get_running_loop().run_in_executor(None, lambda: os.makedirs(self.root, exist_ok=True))
+
+        pool = self.pool_getter()
+        if pool is None:
+            return
+        try:
+            async with pool.acquire() as conn:
+                await conn.execute(SCHEMA_SQL)
+        except Exception as e:
+            logger.error("backup_schema_failed", error=str(e))
+
+    @property
+    def running(self) -> bool:
+        return self._lock.locked()
+
+    # === Manifestes ===
+
+    def directory(self, backup_id: str) -> str:
+        return os.path.join(self.root, backup_id)
+
+    def _read_manifest(self, backup_id: str) -> Optional[Dict[str, Any]]:
+        try:
+            with open(os.path.join(self.directory(backup_id), MANIFEST), 'rb') as f:
+                return orjson.loads(f.read())
+        except (FileNotFoundError, orjson.JSONDecodeError):
+            return None
+
+    def _manifests(self) -> List[Dict[str, Any]]:
+        try:
+            names = sorted(name for name in os.listdir(self.root) if BACKUP_ID_RE.match(name))
+        except FileNotFoundError:
+            return []
+        return [manifest for manifest in map(self._read_manifest, names) if manifest is not None]
+
+    async def list(self) -> List[Dict[str, Any]]:
+        """Sauvegardes complètes (manifeste présent), de la plus ancienne à la plus récente"""
+        return await asyncio.get_running_loop().run_in_executor(None, self._manifests)
+
+    async def manifest(self, backup_id: str) -> Optional[Dict[str, Any]]:
+        if not BACKUP_ID_RE.match(backup_id):
+            return None
+        return await asyncio.get_running_loop().run_in_executor(None, self._read_manifest, backup_id)
+
+    async def _save_manifest(self, manifest: Dict[str, Any]):
+        path = os.path.join(self.directory(manifest['id']), MANIFEST)
+        data = orjson.dumps(manifest, option=orjson.OPT_INDENT_2)
+        await asyncio.get_running_loop().run_in_executor(None, _write_file, path, data)
+
+    async def chain(self, backup_id: str) -> List[Dict[str, Any]]:
+        """Sauvegarde complète de base puis incrémentales jusqu'à backup_id"""
+        chain = []
+        current = await self.manifest(backup_id)
+        while current is not None:
+            chain.append(current)
+            if current['kind'] == 'full':
+                return chain[::-1]
+            current = await self.manifest(current['parent'])
+        raise BackupError(f"chaîne incomplète pour {backup_id}")
+
+    # === Sauvegarde ===
+
+    async def run(self, full: Optional[bool] = None) -> Dict[str, Any]:
+        """Sauvegarder PostgreSQL puis Redis ; full=None : complète le jour prévu
+        ou sans parent utilisable, incrémentale sinon"""
+        if self._lock.locked():
+            raise BackupError("sauvegarde déjà en cours")
+
+        async with self._lock:
+            now = datetime.now(timezone.utc)
+            backup_id = now.strftime('%Y%m%dT%H%M%SZ')
+            directory = self.directory(backup_id)
+            await asyncio.get_running_loop().run_in_executor(None, lambda: os.makedirs(directory))
+
+            parent = None
+            if not full:
+                manifests = await self.list()
+                parent = manifests[-1] if manifests else None
+                if full is None and now.astimezone().weekday() == self.full_weekday:
+                    parent = None
+
+            kind = 'incremental' if parent else 'full'
+            self.progress = {'id': backup_id, 'kind': kind, 'stage': 'schema', 'started_at': now.isoformat(),
+                             'tables_total': 0, 'tables_done': 0, 'rows': 0, 'bytes': 0}
+            start = time.perf_counter()
+            try:
+                manifest = await self._backup(backup_id, directory, parent)
+            except BaseException as e:
+                self.metrics.backups_total.labels(kind=kind, status='error').inc()
+                logger.error("backup_failed", backup_id=backup_id, kind=kind, error=str(e))
+                await asyncio.get_running_loop().run_in_executor(None, shutil.rmtree, directory, True)
+                raise
+            finally:
+                self.progress = None
+                self.metrics.backup_tables_pending.set(0)
+
+            manifest['duration_s'] = round(time.perf_counter() - start, 3)
+            manifest['finished_at'] = datetime.now(timezone.utc).isoformat()
+            await self._save_manifest(manifest)
+
+            self.metrics.backups_total.labels(kind=manifest['kind'], status='ok').inc()
+            self.metrics.backup_duration.labels(stage='total').observe(manifest['duration_s'])
+            self.metrics.backup_last_success.labels(kind=manifest['kind']).set(time.time())
+            logger.info(
+                "backup_done",
+                backup_id=backup_id,
+                kind=manifest['kind'],
+                parent=manifest['parent'],
+                tables=len(manifest['tables']),
+                rows=sum(t['rows'] for t in manifest['tables'].values()),
+                bytes=sum(f['bytes'] for f in manifest['files'].values()),
+                duration_s=manifest['duration_s'],
+            )
+            return manifest
+
+    async def _backup(self, backup_id: str, directory: str, parent: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        loop = asyncio.get_running_loop()
+        files: Dict[str, Dict[str, Any]] = {}
+        stage_start = time.perf_counter()
+
+        coordinator = await self.connect()
+        try:
+            # Instantané exporté : gardé ouvert jusqu'à la fin des exports
+            async with coordinator.transaction(isolation='repeatable_read', readonly=True):
+                info = await coordinator.fetchrow(SNAPSHOT_SQL)
+                snapshot = info['snapshot']
+                if not SNAPSHOT_RE.match(snapshot or ''):
+                    raise BackupError(f"identifiant d'instantané inattendu : {snapshot!r}")
+
+                tables = [dict(row) for row in await coordinator.fetch(TABLES_SQL)]
+                columns: Dict[int, List[Dict[str, Any]]] = {}
+                for row in await coordinator.fetch(COLUMNS_SQL, [table['oid'] for table in tables]):
+                    columns.setdefault(row['table_oid'], []).append(dict(row))
+
+                pre, post = await export_schema(coordinator, tables, columns)
+                files[SCHEMA_PRE] = await loop.run_in_executor(None, _write_file, os.path.join(directory, SCHEMA_PRE), pre.encode())
+                files[SCHEMA_POST] = await loop.run_in_executor(None, _write_file, os.path.join(directory, SCHEMA_POST), post.encode())
+                self.metrics.backup_duration.labels(stage='schema').observe(time.perf_counter() - stage_start)
+
+                # Colonnes copiées : les colonnes générées sont recalculées à la restauration
+                copied = {
+                    table['name']: [c['name'] for c in columns.get(table['oid'], []) if not c['generated']]
+                    for table in tables
+                }
+
+                watermark = None
+                if INCREMENTAL_TABLE in copied:
+                    watermark = {
+                        'table': INCREMENTAL_TABLE,
+                        'column': WATERMARK_COLUMN,
+                        'value': await coordinator.fetchval(
+                            f"SELECT max({ident(WATERMARK_COLUMN)}) FROM public.{ident(INCREMENTAL_TABLE)}"
+                        ),
+                        'since': None,
+                    }
+
+                # Schéma de messages modifié depuis la parente : repartir d'une complète
+                if parent is not None and (
+                    watermark is None
+                    or not parent.get('watermark')
+                    or parent['tables'].get(INCREMENTAL_TABLE, {}).get('columns') != copied[INCREMENTAL_TABLE]
+                ):
+                    logger.info("backup_full_forced", backup_id=backup_id, parent=parent['id'])
+                    parent = None
+
+                jobs = self._jobs(tables, copied, parent, watermark)
+                count = None
+                if parent is not None:
+                    # Nombre de lignes attendu après restauration de la chaîne
+                    count = await coordinator.fetchval(f"SELECT count(*) FROM public.{ident(INCREMENTAL_TABLE)}")
+
+                self.progress.update(stage='tables', kind='incremental' if parent else 'full', tables_total=len(jobs))
+                stage_start = time.perf_counter()
+                results = await self._dump_tables(snapshot, jobs, directory)
+                self.metrics.backup_duration.labels(stage='tables').observe(time.perf_counter() - stage_start)
+        finally:
+            await coordinator.close()
+
+        tables_manifest = {}
+        for job in jobs:
+            result = results[job.file]
+            files[job.file] = {'sha256': result['sha256'], 'bytes': result['bytes']}
+            if job.file == PURGES_FILE:
+                continue
+            tables_manifest[job.table] = {
+                'file': job.file,
+                'columns': job.columns,
+                'mode': job.mode,
+                'rows': result['rows'],
+                'count': count if job.mode == 'incremental' else result['rows'],
+            }
+
+        stage_start = time.perf_counter()
+        redis = await self._redis_snapshot(directory)
+        if redis.get('file'):
+            files[REDIS_FILE] = {'sha256': redis.pop('sha256'), 'bytes': redis.pop('bytes')}
+        self.metrics.backup_duration.labels(stage='redis').observe(time.perf_counter() - stage_start)
+
+        return {
+            'version': 1,
+            'id': backup_id,
+            'kind': 'incremental' if parent else 'full',
+            'parent': parent['id'] if parent else None,
+            'base': (parent.get('base') or parent['id']) if parent else backup_id,
+            'database': info['database'],
+            'server_version': info['server_version'],
+            'snapshot_at': info['snapshot_at'].isoformat(),
+            'started_at': self.progress['started_at'],
+            'watermark': watermark,
+            'tables': tables_manifest,
+            'files': files,
+            'redis': redis,
+            'verified': None,
+        }
+
+    def _jobs(self, tables: List[Dict[str, Any]], copied: Dict[str, List[str]],
+              parent: Optional[Dict[str, Any]], watermark: Optional[Dict[str, Any]]) -> List[TableJob]:
+        """Exports à lancer, les plus grosses tables d'abord (durée totale minimale)"""
+        jobs = []
+        for table in tables:
+            name, cols = table['name'], copied[table['name']]
+            select = f"SELECT {', '.join(ident(c) for c in cols)} FROM public.{ident(name)}"
+            job = TableJob(table=name, file=f'{name}.copy.gz', query=select, columns=cols, size=table['size'])
+
+            if name == INCREMENTAL_TABLE and parent is not None:
+                since = datetime.fromisoformat(parent['snapshot_at']) - CHANGE_OVERLAP
+                watermark['since'] = since.isoformat()
+                changed = [c for c in CHANGE_COLUMNS if c in cols]
+                conditions = [f"{ident(WATERMARK_COLUMN)} > $1"] + [f"{ident(c)} >= $2" for c in changed]
+                job.query = f"{select} WHERE {' OR '.join(conditions)}"
+                job.args = (parent['watermark']['value'] or 0, since) if changed else (parent['watermark']['value'] or 0,)
+                job.mode = 'incremental'
+                if 'message_purges' in copied:
+                    jobs.append(TableJob(
+                        table=INCREMENTAL_TABLE,
+                        file=PURGES_FILE,
+                        query="SELECT DISTINCT message_id FROM public.message_purges WHERE purged_at >= $1",
+                        args=(since,),
+                        columns=['message_id'],
+                        mode='purged',
+                    ))
+            jobs.append(job)
+        return jobs
+
+    async def _dump_tables(self, snapshot: str, jobs: List[TableJob], directory: str) -> Dict[str, Dict[str, Any]]:
+        """Exports en parallèle : une connexion par worker, même instantané"""
+        queue: asyncio.Queue = asyncio.Queue()
+        for job in sorted(jobs, key=lambda job: job.size, reverse=True):
+            queue.put_nowait(job)
+        results: Dict[str, Dict[str, Any]] = {}
+        self.metrics.backup_tables_pending.set(len(jobs))
+
+        async def _worker():
+            conn = await self.connect()
+            try:
+                async with conn.transaction(isolation='repeatable_read', readonly=True):
+                    await conn.execute(f"SET TRANSACTION SNAPSHOT {literal(snapshot)}")
+                    while not queue.empty():
+                        job = queue.get_nowait()
+                        results[job.file] = await self._dump_table(conn, job, directory)
+                        self.metrics.backup_tables_pending.dec()
+                        self.progress['tables_done'] += 1
+            finally:
+                await conn.close()
+
+        try:
+            async with asyncio.TaskGroup() as group:
+                for _ in range(min(self.concurrency, len(jobs))):
+                    group.create_task(_worker())
+        except ExceptionGroup as failures:
+            raise failures.exceptions[0]  # Première erreur (les autres workers sont annulés)
+        return results
+
+    async def _dump_table(self, conn, job: TableJob, directory: str) -> Dict[str, Any]:
+        sink = GzipSink(os.path.join(directory, job.file), self.compress_level)
+        start = time.perf_counter()
+        written = 0
+
+        async def _output(chunk: bytes):
+            nonlocal written
+            await sink.write(chunk)
+            written += len(chunk)
+            self.progress['bytes'] += len(chunk)
+            self.metrics.backup_bytes.labels(table=job.table).inc(len(chunk))
+
+        try:
+            status = await conn.copy_from_query(job.query, *job.args, output=_output)
+            result = await sink.close()
+        except BaseException:
+            await asyncio.get_running_loop().run_in_executor(None, sink.discard)
+            raise
+
+        rows = _copy_rows(status)
+        self.progress['rows'] += rows
+        self.metrics.backup_rows.labels(table=job.table).inc(rows)
+        logger.debug("backup_table_done", table=job.table, mode=job.mode, rows=rows, raw_bytes=written,
+                     bytes=result['bytes'], duration_s=round(time.perf_counter() - start, 3))
+        return {**result, 'rows': rows}
+
+    async def _redis_snapshot(self, directory: str) -> Dict[str, Any]:
+        """BGSAVE (fork, sans bloquer Redis) puis copie de dump.rdb si le volume est monté
+
+        Une erreur Redis n'invalide pas la sauvegarde PostgreSQL : elle est
+        consignée dans le manifeste.
+        """
+        redis = self.redis_getter()
+        if redis is None:
+            return {'status': 'skipped'}
+
+        self.progress['stage'] = 'redis'
+        started = int(time.time())
+        try:
+            try:
+                await redis.bgsave()
+            except Exception as e:
+                if 'in progress' not in str(e):  # Sauvegarde déjà lancée par Redis : on l'attend
+                    raise
+
+            async with asyncio.timeout(self.redis_timeout):
+                while True:
+                    info = await redis.info('persistence')
+                    if not int(info.get('rdb_bgsave_in_progress', 0)) and int(info.get('rdb_last_save_time', 0)) >= started:
+                        break
+                    await asyncio.sleep(1)
+            if info.get('rdb_last_bgsave_status', 'ok') != 'ok':
+                raise BackupError(f"BGSAVE en échec ({info.get('rdb_last_bgsave_status')})")
+
+            result = {'status': 'saved', 'last_save': int(info['rdb_last_save_time'])}
+            source = os.path.join(self.redis_data_path, 'dump.rdb') if self.redis_data_path else None
+            if source and os.path.exists(source):
+                copy = await asyncio.get_running_loop().run_in_executor(
+                    None, _gzip_file, source, os.path.join(directory, REDIS_FILE), self.compress_level
+                )
+                result.update(status='copied', file=REDIS_FILE, **copy)
+            return result
+        except Exception as e:
+            logger.warning("backup_redis_failed", error=str(e))
+            return {'status': 'error', 'error': str(e)}
+
+    # === Restauration / vérification ===
+
+    async def _check_files(self, chain: List[Dict[str, Any]]):
+        """Empreintes de tous les fichiers de la chaîne"""
+        def _check():
+            errors = []
+            for manifest in chain:
+                for name, expected in manifest['files'].items():
+                    path = os.path.join(self.directory(manifest['id']), name)
+                    if not os.path.exists(path):
+                        errors.append(f"{manifest['id']}/{name} manquant")
+                    elif file_sha256(path) != expected['sha256']:
+                        errors.append(f"{manifest['id']}/{name} : empreinte différente")
+            return errors
+
+        errors = await asyncio.get_running_loop().run_in_executor(None, _check)
+        if errors:
+            raise BackupError('; '.join(errors[:5]))
+
+    async def restore(self, backup_id: str, conn) -> Dict[str, Any]:
+        """Restaurer la chaîne jusqu'à backup_id dans la base de `conn` (schéma public remplacé)"""
+        chain = await self.chain(backup_id)
+        await self._check_files(chain)
+
+        base, latest = chain[0], chain[-1]
+        loop = asyncio.get_running_loop()
+
+        def read(manifest: Dict[str, Any], name: str) -> str:
+            with open(os.path.join(self.directory(manifest['id']), name), encoding='utf-8') as f:
+                return f.read()
+
+        await conn.execute("DROP SCHEMA IF EXISTS public CASCADE; CREATE SCHEMA public;")
+        await conn.execute(await loop.run_in_executor(None, read, latest, SCHEMA_PRE))
+
+        for name, table in latest['tables'].items():
+            source = base if table['mode'] == 'incremental' else latest
+            file = source['tables'][name]['file']
+            await conn.copy_to_table(
+                name,
+                schema_name='public',
+                columns=source['tables'][name]['columns'],
+                source=read_gzip(os.path.join(self.directory(source['id']), file)),
+            )
+
+        # Incrémentales dans l'ordre : suppressions rejouées, puis lignes nouvelles ou modifiées
+        for manifest in chain[1:]:
+            table = manifest['tables'][INCREMENTAL_TABLE]
+            directory = self.directory(manifest['id'])
+            target = f"public.{ident(INCREMENTAL_TABLE)}"
+            key = ident(WATERMARK_COLUMN)
+            async with conn.transaction():
+                if PURGES_FILE in manifest['files']:
+                    await conn.execute("CREATE TEMP TABLE backup_purged (message_id BIGINT) ON COMMIT DROP")
+                    await conn.copy_to_table('backup_purged', source=read_gzip(os.path.join(directory, PURGES_FILE)))
+                    await conn.execute(f"DELETE FROM {target} t USING backup_purged p WHERE t.{key} = p.message_id")
+
+                cols = ', '.join(ident(c) for c in table['columns'])
+                await conn.execute(f"CREATE TEMP TABLE backup_delta (LIKE {target}) ON COMMIT DROP")
+                await conn.copy_to_table('backup_delta', columns=table['columns'],
+                                         source=read_gzip(os.path.join(directory, table['file'])))
+                await conn.execute(f"DELETE FROM {target} t USING backup_delta d WHERE t.{key} = d.{key}")
+                await conn.execute(f"INSERT INTO {target} ({cols}) SELECT {cols} FROM backup_delta")
+
+        await conn.execute(await loop.run_in_executor(None, read, latest, SCHEMA_POST))
+        return latest
+
+    async def verify(self, backup_id: Optional[str] = None) -> Dict[str, Any]:
+        """Restaurer dans la base de test puis comparer les nombres de lignes au manifeste"""
+        if self.verify_connect is None:
+            raise BackupError("base de test non configurée (RESTORE_CHECK_DSN)")
+        if backup_id is None:
+            manifests = await self.list()
+            if not manifests:
+                raise BackupError("aucune sauvegarde")
+            backup_id = manifests[-1]['id']
+        manifest = await self.manifest(backup_id)
+        if manifest is None:
+            raise BackupError(f"sauvegarde {backup_id} introuvable")
+
+        start = time.perf_counter()
+        errors: List[str] = []
+        scratch = await self.verify_connect()
+        try:
+            await self._check_scratch(scratch)
+            await self.restore(backup_id, scratch)
+            for name, table in manifest['tables'].items():
+                restored = await scratch.fetchval(f"SELECT count(*) FROM public.{ident(name)}")
+                if restored != table['count']:
+                    errors.append(f"{name} : {restored} lignes (attendu {table['count']})")
+            watermark = manifest.get('watermark')
+            if watermark and watermark['value'] is not None:
+                restored = await scratch.fetchval(
+                    f"SELECT max({ident(watermark['column'])}) FROM public.{ident(watermark['table'])}"
+                )
+                if restored != watermark['value']:
+                    errors.append(f"{watermark['table']}.{watermark['column']} max {restored} (attendu {watermark['value']})")
+        except Exception as e:
+            errors.append(str(e))
+        finally:
+            await scratch.close()
+
+        duration = time.perf_counter() - start
+        result = {
+            'at': datetime.now(timezone.utc).isoformat(),
+            'ok': not errors,
+            'errors': errors[:20],
+            'duration_s': round(duration, 3),
+        }
+        manifest['verified'] = result
+        await self._save_manifest(manifest)
+
+        self.metrics.backup_duration.labels(stage='verify').observe(duration)
+        self.metrics.backups_total.labels(kind='verify', status='ok' if result['ok'] else 'error').inc()
+        if result['ok']:
+            self.metrics.backup_last_success.labels(kind='verify').set(time.time())
+            logger.info("backup_verified", backup_id=backup_id, duration_s=result['duration_s'])
+        else:
+            logger.error("backup_verify_failed", backup_id=backup_id, errors=result['errors'])
+        return {'id': backup_id, **result}
+
+    async def _check_scratch(self, scratch):
+        """Refuser une base de test qui serait la base de production"""
+        conn = await self.connect()
+        try:
+            production = await conn.fetchrow(IDENTITY_SQL)
+        finally:
+            await conn.close()
+        target = await scratch.fetchrow(IDENTITY_SQL)
+        if tuple(target.values()) == tuple(production.values()):
+            raise BackupError("RESTORE_CHECK_DSN désigne la base de production")
+
+    # === Rétention ===
+
+    async def prune(self) -> List[str]:
+        """Supprimer les sauvegardes expirées, sauf les bases de chaînes conservées
+        et la dernière complète ; dossiers incomplets (sans manifeste) après un jour"""
+        manifests = await self.list()
+        by_id = {m['id']: m for m in manifests}
+        cutoff = datetime.now(timezone.utc) - timedelta(days=self.retention_days)
+
+        keep = set()
+        fulls = [m for m in manifests if m['kind'] == 'full']
+        if fulls:
+            keep.add(fulls[-1]['id'])
+        for manifest in manifests:
+            if manifest['id'] not in keep and datetime.fromisoformat(manifest['finished_at']) < cutoff:
+                continue
+            # Sauvegarde conservée : ses parentes aussi (restauration de la chaîne)
+            current = manifest
+            while current is not None:
+                keep.add(current['id'])
+                current = by_id.get(current['parent']) if current['parent'] else None
+
+        def _prune() -> List[str]:
+            removed = []
+            for name in sorted(os.listdir(self.root)):
+                path = os.path.join(self.root, name)
+                if not BACKUP_ID_RE.match(name) or name in keep or not os.path.isdir(path):
+                    continue
+                if name not in by_id:
+                    # Incomplet : ignoré pendant la sauvegarde en cours
+                    if (self.progress and self.progress['id'] == name) or time.time() - os.path.getmtime(path) < 86400:
+                        continue
+                shutil.rmtree(path, ignore_errors=True)
+                removed.append(name)
+            return removed
+
+        removed = await asyncio.get_running_loop().run_in_executor(None, _prune)
+        if removed:
+            logger.info("backups_pruned", removed=removed, kept=len(keep))
+        return removed
@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+================================================================
+BENCH - Débit du moteur de modération (messages/seconde)
+================================================================
+Usage: cd bot && python -m bench.bench_moderation [--messages N]
+================================================================
+"""
+
+import argparse
+import asyncio
+import random
+import string
+import time
+from datetime import datetime, timezone
+from types import SimpleNamespace
+
+from moderation import ModerationEngine, ModerationPipeline, Rule
+
+def build_rules(keywords: int, regexes: int, domains: int):
+    """Jeu de règles synthétique"""
+    rng = random.Random(42)
+    rules = []
+    for i in range(keywords):
+        word = ''.join(rng.choices(string.ascii_lowercase, k=rng.randint(5, 10)))
+        rules.append(Rule(len(rules) + 1, 'keyword', word))
+    for i in range(regexes):
+        rules.append(Rule(len(rules) + 1, 'regex', rf'\b(?:promo|offre)-{i}-\d{{3,}}\b'))
+    for i in range(domains):
+        rules.append(Rule(len(rules) + 1, 'link_allow', f'site{i}.fr'))
+    rules.append(Rule(len(rules) + 1, 'link_allow', 'gvb-electricite.fr'))
+    return rules
+
+def build_messages(count: int):
+    """Messages de 20 à 2000 caractères, 1% avec lien externe"""
+    rng = random.Random(7)
+    vocab = ["tableau", "disjoncteur", "chantier", "câble", "gaine", "prise", "devis", "RAS", "ok", "demain"]
+    messages = []
+    for i in range(count):
+        length = rng.choice((20, 200, 2000))
+        words, size = [], 0
+        while size < length:
+            word = rng.choice(vocab)
+            words.append(word)
+            size += len(word) + 1
+        if i % 100 == 0:
+            words.append("https://exemple.com/page")
+        messages.append(' '.join(words)[:2000])
+    return messages
+
+def bench_engine(rules, messages):
+    """Débit de ModerationEngine.check seul"""
+    engine = ModerationEngine(spam_max_messages=10**9)
+    engine.load(rules)
+
+    start = time.perf_counter()
+    for i, content in enumerate(messages):
+        engine.check(i % 50, content, now=float(i))
+    elapsed = time.perf_counter() - start
+    return len(messages) / elapsed
+
+async def bench_pipeline(rules, messages, workers: int):
+    """Débit bout en bout file + workers (sans Discord ni PostgreSQL)"""
+    engine = ModerationEngine(spam_max_messages=10**9)
+    engine.load(rules)
+    pipeline = ModerationPipeline(None, pool_getter=lambda: None, engine=engine, workers=workers, queue_size=len(messages))
+
+    async def _noop_apply(message, violation):
+        return None
+    pipeline._apply = _noop_apply
+
+    guild = SimpleNamespace(id=1)
+    channel = SimpleNamespace(id=1)
+    fake = [
+        SimpleNamespace(
+            id=i,
+            guild=guild,
+            channel=channel,
+            author=SimpleNamespace(id=i % 50, bot=False, guild_permissions=None),
+            content=content,
+            created_at=datetime.now(timezone.utc)
+        )
+        for i, content in enumerate(messages)
+    ]
+
+    tasks = [asyncio.create_task(pipeline._worker(w)) for w in range(workers)]
+    start = time.perf_counter()
+    for message in fake:
+        pipeline.submit(message)
+    await pipeline.queue.join()
+    elapsed = time.perf_counter() - start
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    return len(messages) / elapsed
+
+def main():
+    parser = argparse.ArgumentParser(description="Bench modération")
+    parser.add_argument('--messages', type=int, default=20000)
+    parser.add_argument('--keywords', type=int, default=500)
+    parser.add_argument('--regexes', type=int, default=5)
+    parser.add_argument('--domains', type=int, default=50)
+    parser.add_argument('--workers', type=int, default=4)
+    args = parser.parse_args()
+
+    rules = build_rules(args.keywords, args.regexes, args.domains)
+    messages = build_messages(args.messages)
+
+    print(f"Règles : {len(rules)} | Messages : {len(messages)}")
+    print(f"Moteur   : {bench_engine(rules, messages):,.0f} msg/s")
+    print(f"Pipeline : {asyncio.run(bench_pipeline(rules, messages, args.workers)):,.0f} msg/s")
+
+if __name__ == "__main__":
+    main()
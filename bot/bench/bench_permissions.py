@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+================================================================
+BENCH - Contrôles de permission (utils.has_role vs index)
+================================================================
+Usage: cd bot && python -m bench.bench_permissions [--checks N]
+================================================================
+"""
+
+import argparse
+import random
+import time
+from types import SimpleNamespace
+
+import utils
+from permissions import PermissionIndex
+
+class FakeRole(SimpleNamespace):
+    def __lt__(self, other):
+        return self.position < other.position
+
+class FakeGuild:
+    """Serveur avec N rôles dont Manager / Admin"""
+
+    def __init__(self, guild_id: int, roles: int):
+        self.id = guild_id
+        names = [f"role-{i}" for i in range(roles - 2)] + ['Manager', 'Admin']
+        self.roles = [FakeRole(id=guild_id * 1000 + i, name=name, position=i) for i, name in enumerate(names)]
+        self.default_role = FakeRole(id=guild_id, name='@everyone', position=-1)
+        self._by_id = {role.id: role for role in self.roles}
+
+    def get_role(self, role_id: int):
+        return self._by_id.get(role_id)
+
+class FakeMember:
+    """Membre : member.roles reconstruit et trie la liste à chaque accès, comme discord.py"""
+
+    def __init__(self, member_id: int, guild: FakeGuild, role_ids):
+        self.id = member_id
+        self.guild = guild
+        self._roles = list(role_ids)
+        self.guild_permissions = SimpleNamespace(administrator=False)
+
+    @property
+    def roles(self):
+        result = [role for role in map(self.guild.get_role, self._roles) if role]
+        result.append(self.guild.default_role)
+        result.sort()
+        return result
+
+def build_members(guild: FakeGuild, count: int, roles_per_member: int):
+    """Membres à N rôles, 5% Manager, 1% Admin"""
+    rng = random.Random(42)
+    plain = [role.id for role in guild.roles[:-2]]
+    manager, admin = guild.roles[-2].id, guild.roles[-1].id
+    members = []
+    for i in range(count):
+        role_ids = rng.sample(plain, roles_per_member)
+        if i % 20 == 0:
+            role_ids.append(manager)
+        if i % 100 == 0:
+            role_ids.append(admin)
+        members.append(FakeMember(i, guild, role_ids))
+    return members
+
+def bench_has_role(members, checks: int) -> float:
+    """utils.is_manager sans index (scan des noms)"""
+    count = len(members)
+    start = time.perf_counter()
+    for i in range(checks):
+        utils.is_manager(members[i % count])
+    return checks / (time.perf_counter() - start)
+
+def bench_index(guild, members, checks: int, cold: bool = False) -> float:
+    """utils.is_manager avec index (cold : masque membre recalculé à chaque contrôle)"""
+    index = PermissionIndex()
+    index.build(guild)
+    count = len(members)
+    start = time.perf_counter()
+    for i in range(checks):
+        if cold:
+            index.guilds[guild.id].members.clear()
+        utils.is_manager(members[i % count], index)
+    return checks / (time.perf_counter() - start)
+
+def check_equivalence(guild, members):
+    """Mêmes réponses avec et sans index"""
+    index = PermissionIndex()
+    index.build(guild)
+    for member in members:
+        assert utils.is_manager(member) == utils.is_manager(member, index)
+        assert utils.is_admin(member) == utils.is_admin(member, index)
+
+def main():
+    parser = argparse.ArgumentParser(description="Bench permissions")
+    parser.add_argument('--roles', type=int, default=200)
+    parser.add_argument('--members', type=int, default=5000)
+    parser.add_argument('--roles-per-member', type=int, default=5)
+    parser.add_argument('--checks', type=int, default=200000)
+    args = parser.parse_args()
+
+    guild = FakeGuild(1, args.roles)
+    members = build_members(guild, args.members, args.roles_per_member)
+    check_equivalence(guild, members)
+
+    print(f"Rôles : {args.roles} | Membres : {args.members} | Contrôles : {args.checks}")
+    print(f"has_role      : {bench_has_role(members, args.checks):,.0f} contrôles/s")
+    print(f"Index (froid) : {bench_index(guild, members, args.checks, cold=True):,.0f} contrôles/s")
+    print(f"Index         : {bench_index(guild, members, args.checks):,.0f} contrôles/s")
+
+if __name__ == "__main__":
+    main()
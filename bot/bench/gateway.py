@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+================================================================
+BENCH - Gateway Discord synthétique
+================================================================
+Objets minimaux (guild, channel, membre, message) suffisants pour
+faire passer des événements dans on_message et le dispatch de
+commandes discord.py, sans connexion Discord.
+================================================================
+"""
+
+import random
+import itertools
+from datetime import datetime, timezone
+from types import SimpleNamespace
+from typing import List, Optional, Iterator
+
+from discord.ext import commands
+
+VOCAB = [
+    "tableau", "disjoncteur", "chantier", "câble", "gaine", "prise", "devis",
+    "RAS", "ok", "demain", "photo", "livraison", "interrupteur", "différentiel",
+]
+
+# ================================================================
+# OBJETS DISCORD SIMULÉS
+# ================================================================
+
+class FakeChannel:
+    """Channel texte : send() enregistre au lieu d'appeler l'API"""
+
+    def __init__(self, channel_id: int, name: str, guild=None):
+        self.id = channel_id
+        self.name = name
+        self.guild = guild
+        self.mention = f"<#{channel_id}>"
+        self.sent = 0
+
+    async def send(self, content: Optional[str] = None, **kwargs):
+        self.sent += 1
+        return SimpleNamespace(id=0, content=content, **kwargs)
+
+class FakeMessage(SimpleNamespace):
+    """Message : delete() / add_reaction() sans appel API"""
+
+    async def delete(self, *, delay: Optional[float] = None):
+        self.deleted = True
+
+    async def add_reaction(self, emoji):
+        pass
+
+class FakeGuild:
+    """Guild avec channels et membres synthétiques"""
+
+    def __init__(self, guild_id: int, channels: int, members: int):
+        self.id = guild_id
+        self.name = f"guild-{guild_id}"
+        self.channels = [FakeChannel(guild_id * 1000 + i, f"chantier-{i}", self) for i in range(channels)]
+        self.members = [
+            SimpleNamespace(
+                id=guild_id * 100000 + i,
+                name=f"tech{i}",
+                display_name=f"Tech {i}",
+                bot=False,
+                mention=f"<@{guild_id * 100000 + i}>",
+                roles=[],
+                guild_permissions=SimpleNamespace(manage_messages=False, administrator=False),
+            )
+            for i in range(members)
+        ]
+        self.member_count = members
+        self.roles = []
+        self.categories = []
+
+class BenchContext(commands.Context):
+    """Contexte de commande : send() sans appel HTTP"""
+
+    async def send(self, content: Optional[str] = None, **kwargs):
+        return await self.channel.send(content, **kwargs)
+
+# ================================================================
+# GÉNÉRATEUR D'ÉVÉNEMENTS
+# ================================================================
+
+class SyntheticGateway:
+    """Flux d'événements MESSAGE_CREATE reproductible"""
+
+    def __init__(
+        self,
+        guilds: int = 1,
+        channels: int = 20,
+        members: int = 50,
+        command_ratio: float = 0.05,
+        commands_mix: Optional[List[str]] = None,
+        prefix: str = '!',
+        seed: int = 42,
+    ):
+        self.guilds = [FakeGuild(1000 + g, channels, members) for g in range(guilds)]
+        self.command_ratio = command_ratio
+        self.commands_mix = commands_mix or ['ping', 'help', 'info']
+        self.prefix = prefix
+        self.rng = random.Random(seed)
+        self._ids = itertools.count(10 ** 17)
+
+    def message(self, content: Optional[str] = None, guild: Optional[FakeGuild] = None) -> FakeMessage:
+        """Un message synthétique (contenu aléatoire si non fourni)"""
+        rng = self.rng
+        guild = guild or rng.choice(self.guilds)
+        channel = rng.choice(guild.channels)
+        author = rng.choice(guild.members)
+
+        if content is None:
+            if rng.random() < self.command_ratio:
+                content = self.prefix + rng.choice(self.commands_mix)
+            else:
+                length = rng.choice((20, 80, 200, 2000))
+                words, size = [], 0
+                while size < length:
+                    word = rng.choice(VOCAB)
+                    words.append(word)
+                    size += len(word) + 1
+                content = ' '.join(words)[:2000]
+
+        return FakeMessage(
+            id=next(self._ids),
+            content=content,
+            author=author,
+            channel=channel,
+            guild=guild,
+            created_at=datetime.now(timezone.utc),
+            attachments=[],
+            mentions=[],
+            _state=None,
+        )
+
+    def stream(self, count: int) -> Iterator[FakeMessage]:
+        for _ in range(count):
+            yield self.message()
+
+async def attach(bot: commands.Bot, user_id: int = 1):
+    """Brancher le bot sur la gateway simulée (boucle, utilisateur connecté, contexte)"""
+    await bot._async_setup_hook()
+    bot._connection.user = SimpleNamespace(id=user_id, name='GVBOT', bot=True)
+    bot.ws = SimpleNamespace(latency=0.05)
+    bot._ready.set()
+
+    async def get_context(message, *, cls=BenchContext):
+        return await commands.Bot.get_context(bot, message, cls=cls)
+
+    bot.get_context = get_context
@@ -0,0 +1,382 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+================================================================
+BENCH - Suite de charge hors-ligne (bot + API)
+================================================================
+Usage:
+    cd bot
+    python -m bench.run                     # Fakes mémoire
+    python -m bench.run --save              # Enregistrer baseline
+    python -m bench.run --postgres-dsn postgresql://gvb:pw@localhost/bench
+    python -m bench.run --only ingest,api
+
+Scénarios : ingestion on_message (msg/s), latence commandes
+(p50/p99), API FastAPI (req/s, polling /stats revalidé par ETag), modération, logs, rappels,
+permissions, modifications/suppressions. Les résultats sont
+comparés à bench/baselines.json (régression > --tolerance => exit 1).
+================================================================
+"""
+
+import os
+import sys
+import json
+import time
+import asyncio
+import logging
+import argparse
+import resource
+import tracemalloc
+from types import SimpleNamespace
+from typing import Dict, List, Callable, Awaitable
+
+# Backends mémoire avant import du bot
+os.environ.setdefault('USE_FAKE_BACKENDS', 'true')
+os.environ.setdefault('API_KEY', 'bench')
+
+import structlog
+import httpx
+
+import bot_monster
+from fakes import FakePool, FakeRedis
+from bench.gateway import SyntheticGateway, attach
+from bench import bench_moderation, bench_permissions
+from reminders import Reminder, ReminderQueue
+from tracking import MessageTracker
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baselines.json')
+
+# Sens des métriques : True = plus haut est meilleur
+HIGHER_IS_BETTER = {
+    'ingest_msg_per_s': True,
+    'command_p50_ms': False,
+    'command_p99_ms': False,
+    'api_req_per_s': True,
+    'api_poll_req_per_s': True,
+    'api_poll_bytes_each': False,
+    'moderation_msg_per_s': True,
+    'log_events_per_s': True,
+    'reminders_insert_per_s': True,
+    'reminders_pop_per_s': True,
+    'reminders_bytes_each': False,
+    'permission_checks_per_s': True,
+    'edit_events_per_s': True,
+    'peak_rss_mb': False,
+}
+
+# ================================================================
+# OUTILS
+# ================================================================
+
+def percentile(samples: List[float], pct: float) -> float:
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+def peak_rss_mb() -> float:
+    """RSS max du process (ru_maxrss en Ko sous Linux)"""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+async def setup_backends(args):
+    """PostgreSQL réel (DSN) ou fake, Redis réel / fakeredis / fake"""
+    services = bot_monster.services
+
+    if args.postgres_dsn:
+        import asyncpg
+        pool = await asyncpg.create_pool(args.postgres_dsn, min_size=5, max_size=20)
+    else:
+        pool = FakePool(max_size=20, latency=args.db_latency_ms / 1000)
+        task_ids = iter(range(1, 10 ** 9))
+        pool.on('INSERT INTO tasks', lambda kind, query, params: next(task_ids))
+        pool.on('AS fingerprint', {'n': 0, 'fingerprint': None})
+
+    # Même découpage que la production (un seul pool physique)
+    services.db = bot_monster._metered('write', pool, bot_monster.DB_WRITE_POOL_MAX)
+    services.db_read = bot_monster._metered('read', pool, bot_monster.DB_READ_POOL_MAX)
+    services.db_batch = bot_monster._metered('batch', pool, bot_monster.DB_BATCH_POOL_MAX, acquire_timeout=None)
+
+    if args.redis_url:
+        from redis import asyncio as aioredis
+        services.redis = aioredis.from_url(args.redis_url, decode_responses=True)
+    else:
+        try:
+            import fakeredis
+            services.redis = fakeredis.aioredis.FakeRedis(decode_responses=True)
+        except ImportError:
+            services.redis = FakeRedis()
+
+# ================================================================
+# SCÉNARIOS
+# ================================================================
+
+async def scenario_ingest(args, gateway: SyntheticGateway) -> Dict[str, float]:
+    """on_message réel sur un flux de messages (sans commandes)"""
+    messages = [gateway.message(content=None) for _ in range(args.messages)]
+    messages = [m for m in messages if not m.content.startswith(gateway.prefix)]
+
+    start = time.perf_counter()
+    for message in messages:
+        await bot_monster.on_message(message)
+    elapsed = time.perf_counter() - start
+    await bot_monster.moderation.queue.join()
+
+    return {'ingest_msg_per_s': len(messages) / elapsed}
+
+async def scenario_commands(args, gateway: SyntheticGateway) -> Dict[str, float]:
+    """Latence bout en bout on_message -> dispatch -> handler"""
+    samples = []
+    for i in range(args.commands):
+        message = gateway.message(content=gateway.prefix + gateway.commands_mix[i % len(gateway.commands_mix)])
+        start = time.perf_counter()
+        await bot_monster.on_message(message)
+        samples.append((time.perf_counter() - start) * 1000)
+
+    return {
+        'command_p50_ms': percentile(samples, 50),
+        'command_p99_ms': percentile(samples, 99),
+    }
+
+async def scenario_api(args, gateway: SyntheticGateway) -> Dict[str, float]:
+    """Routes FastAPI via transport ASGI (sans socket)"""
+    headers = {'Authorization': f"Bearer {bot_monster.API_KEY}"}
+    task = {'user_id': 1, 'assignee_id': 2, 'description': 'Bench', 'chantier': 'bench'}
+    calls: List[Callable[[httpx.AsyncClient], Awaitable]] = [
+        lambda c: c.get('/'),
+        lambda c: c.get('/health'),
+        lambda c: c.get('/stats', headers=headers),
+        lambda c: c.post('/api/discord/task', headers=headers, json=task),
+    ]
+
+    transport = httpx.ASGITransport(app=bot_monster.api_app)
+    async with httpx.AsyncClient(transport=transport, base_url='http://bench') as client:
+        sem = asyncio.Semaphore(args.api_concurrency)
+
+        async def _one(i: int):
+            async with sem:
+                await calls[i % len(calls)](client)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(_one(i) for i in range(args.api_requests)))
+        elapsed = time.perf_counter() - start
+
+        # Tableau de bord : /stats interrogé en boucle, revalidé par ETag
+        polls = {'bytes': 0}
+
+        async def _poller(count: int):
+            etag = None
+            for _ in range(count):
+                poll_headers = {**headers, 'Accept-Encoding': 'gzip, zstd'}
+                if etag:
+                    poll_headers['If-None-Match'] = etag
+                response = await client.get('/stats', headers=poll_headers)
+                etag = response.headers.get('etag', etag)
+                polls['bytes'] += int(response.headers.get('content-length', 0))
+
+        pollers = max(1, args.api_concurrency // 4)
+        per_poller = max(1, args.api_requests // pollers)
+        start = time.perf_counter()
+        await asyncio.gather(*(_poller(per_poller) for _ in range(pollers)))
+        poll_elapsed = time.perf_counter() - start
+
+    return {
+        'api_req_per_s': args.api_requests / elapsed,
+        'api_poll_req_per_s': pollers * per_poller / poll_elapsed,
+        'api_poll_bytes_each': polls['bytes'] / (pollers * per_poller),
+    }
+
+async def scenario_moderation(args, gateway: SyntheticGateway) -> Dict[str, float]:
+    """Débit pipeline de modération (règles synthétiques)"""
+    rules = bench_moderation.build_rules(500, 5, 50)
+    messages = bench_moderation.build_messages(min(args.messages, 5000))
+    rate = await bench_moderation.bench_pipeline(rules, messages, workers=4)
+    return {'moderation_msg_per_s': rate}
+
+async def scenario_logs(args, gateway: SyntheticGateway) -> Dict[str, float]:
+    """Coût des logs sur la boucle (erreur répétée, ex. PostgreSQL indisponible)"""
+    structlog.configure(wrapper_class=structlog.make_filtering_bound_logger(logging.INFO))
+    sink = bot_monster.log_sink
+    stream, sink.stream = sink.stream, open(os.devnull, 'wb')
+    logger = structlog.get_logger('bench')
+    try:
+        start = time.perf_counter()
+        for i in range(args.messages):
+            logger.error("message_logging_failed", error="connection refused", message_id=i)
+        elapsed = time.perf_counter() - start
+    finally:
+        structlog.configure(wrapper_class=structlog.make_filtering_bound_logger(logging.WARNING))
+        sink.close()
+        sink.stream.close()
+        sink.stream = stream
+
+    return {'log_events_per_s': args.messages / elapsed}
+
+async def scenario_reminders(args, gateway: SyntheticGateway) -> Dict[str, float]:
+    """File de rappels : insertion, extraction, mémoire par rappel en attente"""
+    count = args.reminders
+    now = int(time.time())
+
+    tracemalloc.start()
+    queue = ReminderQueue()
+    start = time.perf_counter()
+    for i in range(count):
+        due = now + 3600 + i % 86400
+        queue.replace('tasks', i, [Reminder('tasks', i, due - 3600, due, 1000 + i % 50, f"Tâche {i}", f"chantier-{i % 100}")])
+    insert_elapsed = time.perf_counter() - start
+    memory, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    start = time.perf_counter()
+    popped = len(queue.pop_due(now + 86400))
+    pop_elapsed = time.perf_counter() - start
+
+    return {
+        'reminders_insert_per_s': count / insert_elapsed,
+        'reminders_pop_per_s': popped / pop_elapsed,
+        'reminders_bytes_each': memory / count,
+    }
+
+async def scenario_permissions(args, gateway: SyntheticGateway) -> Dict[str, float]:
+    """Contrôles is_manager via l'index (200 rôles, 5 rôles par membre)"""
+    guild = bench_permissions.FakeGuild(1, 200)
+    members = bench_permissions.build_members(guild, args.members, 5)
+    return {'permission_checks_per_s': bench_permissions.bench_index(guild, members, args.messages * 10)}
+
+async def scenario_edits(args, gateway: SyntheticGateway) -> Dict[str, float]:
+    """Modifications / suppressions brutes : fusion + écriture par lots"""
+    tracker = MessageTracker(lambda: bot_monster.services.db, window=3600, batch_size=500)
+    rng = gateway.rng
+
+    start = time.perf_counter()
+    for i in range(args.messages):
+        message_id = 10 ** 17 + i // 5 + rng.randrange(3)  # ~5 corrections rapides par message
+        if i % 20 == 0:
+            tracker.delete([message_id])
+        else:
+            tracker.on_raw_edit(SimpleNamespace(message_id=message_id, data={'content': f"version {i}"}))
+        if tracker.pending >= tracker.batch_size:
+            await tracker.flush()
+    await tracker.flush()
+    elapsed = time.perf_counter() - start
+
+    written = tracker.stats['applied_edits'] + tracker.stats['applied_deletes']
+    return {
+        'edit_events_per_s': args.messages / elapsed,
+        'edit_rows_per_event': written / args.messages,
+    }
+
+SCENARIOS = {
+    'ingest': scenario_ingest,
+    'commands': scenario_commands,
+    'api': scenario_api,
+    'moderation': scenario_moderation,
+    'logs': scenario_logs,
+    'reminders': scenario_reminders,
+    'permissions': scenario_permissions,
+    'edits': scenario_edits,
+}
+
+# ================================================================
+# BASELINES
+# ================================================================
+
+def compare(results: Dict[str, float], baseline: Dict[str, float], tolerance: float) -> List[str]:
+    """Métriques dégradées au-delà de la tolérance"""
+    regressions = []
+    for name, value in results.items():
+        reference = baseline.get(name)
+        if not reference or name not in HIGHER_IS_BETTER:
+            continue
+        change = (value - reference) / reference
+        worse = -change if HIGHER_IS_BETTER[name] else change
+        if worse > tolerance:
+            regressions.append(f"{name}: {reference:,.2f} -> {value:,.2f} ({change:+.0%})")
+    return regressions
+
+def print_results(results: Dict[str, float], baseline: Dict[str, float]):
+    for name, value in results.items():
+        line = f"  {name:<24} {value:>14,.2f}"
+        reference = baseline.get(name)
+        if reference:
+            line += f"   (baseline {reference:,.2f}, {(value - reference) / reference:+.1%})"
+        print(line)
+
+# ================================================================
+# MAIN
+# ================================================================
+
+async def run(args) -> Dict[str, float]:
+    structlog.configure(wrapper_class=structlog.make_filtering_bound_logger(logging.WARNING))
+
+    await setup_backends(args)
+    await attach(bot_monster.bot)
+    await bot_monster.extension_manager.load_all()
+    await bot_monster.moderation.start()
+    bot_monster.warmer.path = None  # Pas d'instantané local : mesures reproductibles
+    await bot_monster.warmer.start()
+
+    gateway = SyntheticGateway(
+        guilds=args.guilds,
+        channels=args.channels,
+        members=args.members,
+    )
+
+    results: Dict[str, float] = {}
+    selected = args.only.split(',') if args.only else list(SCENARIOS)
+    try:
+        for name in selected:
+            results.update(await SCENARIOS[name](args, gateway))
+    finally:
+        await bot_monster.moderation.stop()
+
+    results['peak_rss_mb'] = peak_rss_mb()
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description="Bench bot + API hors-ligne")
+    parser.add_argument('--messages', type=int, default=20000)
+    parser.add_argument('--commands', type=int, default=2000)
+    parser.add_argument('--api-requests', type=int, default=5000)
+    parser.add_argument('--api-concurrency', type=int, default=50)
+    parser.add_argument('--reminders', type=int, default=50000)
+    parser.add_argument('--guilds', type=int, default=1)
+    parser.add_argument('--channels', type=int, default=20)
+    parser.add_argument('--members', type=int, default=50)
+    parser.add_argument('--db-latency-ms', type=float, default=0.0, help="Latence simulée FakePool")
+    parser.add_argument('--postgres-dsn', help="PostgreSQL local (conteneur / cluster tmp) au lieu du fake")
+    parser.add_argument('--redis-url', help="Redis local au lieu de fakeredis")
+    parser.add_argument('--only', help=f"Scénarios : {','.join(SCENARIOS)}")
+    parser.add_argument('--baseline', default=BASELINE_PATH)
+    parser.add_argument('--save', action='store_true', help="Enregistrer les résultats comme baseline")
+    parser.add_argument('--tolerance', type=float, default=0.2, help="Régression tolérée (0.2 = 20%%)")
+    args = parser.parse_args()
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+
+    results = asyncio.run(run(args))
+
+    print("================================")
+    print("BENCH GVBOT")
+    print("================================")
+    print_results(results, baseline)
+
+    if args.save:
+        baseline.update(results)
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump(baseline, f, indent=2, sort_keys=True)
+        print(f"\n✅ Baseline enregistrée : {args.baseline}")
+        return
+
+    regressions = compare(results, baseline, args.tolerance)
+    if regressions:
+        print("\n❌ Régressions :")
+        for line in regressions:
+            print(f"  {line}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -26,13 +26,13 @@ import os
 import sys
 import asyncio
 import logging
-from datetime import datetime, timedelta, time
+from datetime import datetime, date, timedelta
 from typing import Optional, List, Dict, Any
 import json
 
 # Discord
 import discord
-from discord.ext import commands, tasks
+from discord.ext import commands
 
 # Database
 import asyncpg
@@ -40,17 +40,38 @@ from redis import asyncio as aioredis
 
 # API REST
 from fastapi import FastAPI, HTTPException, Header, Request
-from fastapi.responses import JSONResponse
+from fastapi.responses import Response, FileResponse
 import uvicorn
 
 # Monitoring
-from prometheus_client import Counter, Histogram, Gauge, generate_latest
+from prometheus_client import generate_latest
 from prometheus_client import CONTENT_TYPE_LATEST
 
 # Utilities
 from dotenv import load_dotenv
 import structlog
 
+# Modules internes
+from services import Services, Metrics, MeteredPool
+from fakes import FakePool, FakeRedis
+from moderation import ModerationPipeline
+from flood import FloodDetector
+from extensions import ExtensionManager
+from logsink import LogSink, LEVELS
+from scheduler import Scheduler
+from reminders import ReminderEngine
+from media import MediaPipeline
+from tracking import MessageTracker
+from guild_config import GuildConfigStore, for_each_guild
+from utils import paginate, KeysetPageSource, set_permission_index
+from permissions import PermissionIndex, Capability, parse_capabilities, capability_names, requires
+from responses import FastJSONResponse, Payload, json_response
+from queries import QueryObserver
+from backup import BackupManager, BackupError
+from warmup import CacheWarmer, to_json
+from webhooks import WebhookQueue, WebhookEvent, WebhookError, parse_sources
+from reports import ReportEngine, Report, FORMATS as REPORT_FORMATS, MEDIA_TYPES as REPORT_MEDIA_TYPES, parse_week, previous_week, slugify
+
 # ================================================================
 # CONFIGURATION
 # ================================================================
@@ -70,6 +91,17 @@ DB_USER = os.getenv('POSTGRES_USER', 'gvb')
 DB_PASS = os.getenv('POSTGRES_PASSWORD')
 DB_NAME = os.getenv('POSTGRES_DB', 'discord_gvb')
 
+# Pools PostgreSQL : écritures courtes / lectures interactives / batch
+DB_READ_DSN = os.getenv('POSTGRES_READ_DSN')  # Réplica en lecture (optionnel)
+DB_WRITE_POOL_MAX = int(os.getenv('DB_WRITE_POOL_MAX', 10))
+DB_READ_POOL_MAX = int(os.getenv('DB_READ_POOL_MAX', 8))
+DB_BATCH_POOL_MAX = int(os.getenv('DB_BATCH_POOL_MAX', 2))
+DB_WRITE_TIMEOUT = float(os.getenv('DB_WRITE_TIMEOUT', 10))
+DB_READ_TIMEOUT = float(os.getenv('DB_READ_TIMEOUT', 30))
+DB_BATCH_TIMEOUT = float(os.getenv('DB_BATCH_TIMEOUT', 900))
+DB_ACQUIRE_TIMEOUT = float(os.getenv('DB_ACQUIRE_TIMEOUT', 10))
+DB_POOL_MAX_WAITERS = int(os.getenv('DB_POOL_MAX_WAITERS', 500))
+
 # Redis Config
 REDIS_HOST = os.getenv('REDIS_HOST', 'redis_discord')
 REDIS_PORT = int(os.getenv('REDIS_PORT', 6379))
@@ -78,11 +110,72 @@ REDIS_PASS = os.getenv('REDIS_PASSWORD')
 # API Config
 API_KEY = os.getenv('API_KEY')
 API_PORT = int(os.getenv('API_PORT', 5000))
+API_COMPRESS_MIN_BYTES = int(os.getenv('API_COMPRESS_MIN_BYTES', 1024))
+API_STATS_CACHE_SECONDS = float(os.getenv('API_STATS_CACHE_SECONDS', 5))
 
-# Channels IDs
+# Channels IDs (défauts du serveur GUILD_ID, surchargés par !config)
 CHANNEL_PLANNING_HEBDO = int(os.getenv('CHANNEL_PLANNING_HEBDO', 0)) if os.getenv('CHANNEL_PLANNING_HEBDO') else None
 CHANNEL_LOGS_BOT = int(os.getenv('CHANNEL_LOGS_BOT', 0)) if os.getenv('CHANNEL_LOGS_BOT') else None
 CHANNEL_ANNONCES = int(os.getenv('CHANNEL_ANNONCES', 0)) if os.getenv('CHANNEL_ANNONCES') else None
+CHANNEL_RAPPELS = int(os.getenv('CHANNEL_RAPPELS', 0)) if os.getenv('CHANNEL_RAPPELS') else None
+
+# Pièces jointes des channels chantier (photos, PDF)
+MEDIA_ENABLED = os.getenv('MEDIA_ENABLED', 'true').lower() == 'true'
+MEDIA_PATH = os.getenv('MEDIA_PATH', '/app/media')
+MEDIA_CATEGORY = os.getenv('MEDIA_CATEGORY', 'CHANTIERS ACTIFS')
+MEDIA_DOWNLOADS = int(os.getenv('MEDIA_DOWNLOADS', 4))
+MEDIA_PROCESS_WORKERS = int(os.getenv('MEDIA_PROCESS_WORKERS', 2))
+MEDIA_MAX_MB = int(os.getenv('MEDIA_MAX_MB', 25))
+
+# Suivi des modifications / suppressions (fenêtre de fusion, taille des lots)
+TRACK_EDITS_ENABLED = os.getenv('TRACK_EDITS_ENABLED', 'true').lower() == 'true'
+TRACK_FLUSH_SECONDS = float(os.getenv('TRACK_FLUSH_SECONDS', 2))
+TRACK_BATCH_SIZE = int(os.getenv('TRACK_BATCH_SIZE', 500))
+
+# Rapports hebdomadaires par chantier (data/reports, rendu dans un pool de processus)
+REPORTS_ENABLED = os.getenv('REPORTS_ENABLED', 'true').lower() == 'true'
+REPORTS_PATH = os.getenv('REPORTS_PATH', '/app/reports')
+REPORTS_WORKERS = int(os.getenv('REPORTS_WORKERS', 2))
+REPORTS_DB_CONCURRENCY = int(os.getenv('REPORTS_DB_CONCURRENCY', 3))
+
+# Requêtes lentes : seuil, échantillon rejoué sous EXPLAIN ANALYZE, intervalle par requête
+QUERY_LOG_ENABLED = os.getenv('QUERY_LOG_ENABLED', 'true').lower() == 'true'
+SLOW_QUERY_MS = float(os.getenv('SLOW_QUERY_MS', 200))
+EXPLAIN_SAMPLE_RATE = float(os.getenv('EXPLAIN_SAMPLE_RATE', 0.1))
+EXPLAIN_INTERVAL_SECONDS = float(os.getenv('EXPLAIN_INTERVAL_SECONDS', 600))
+
+# Sauvegardes (COPY en parallèle, messages en incrémental, complète le jour BACKUP_FULL_WEEKDAY)
+BACKUP_ENABLED = os.getenv('BACKUP_ENABLED', 'true').lower() == 'true'
+BACKUP_PATH = os.getenv('BACKUP_PATH', '/app/backups')
+BACKUP_RETENTION_DAYS = int(os.getenv('BACKUP_RETENTION_DAYS', 30))
+BACKUP_CONCURRENCY = int(os.getenv('BACKUP_CONCURRENCY', 3))
+BACKUP_FULL_WEEKDAY = int(os.getenv('BACKUP_FULL_WEEKDAY', 6))  # 0 = lundi
+BACKUP_COMPRESS_LEVEL = int(os.getenv('BACKUP_COMPRESS_LEVEL', 6))
+BACKUP_REDIS_DATA = os.getenv('BACKUP_REDIS_DATA', '/redis-data')  # Volume Redis (lecture seule)
+RESTORE_CHECK_DSN = os.getenv('RESTORE_CHECK_DSN')  # Base de test des restaurations (optionnel)
+
+# Préchargement au démarrage (instantané local restauré puis revalidé en arrière-plan)
+WARMUP_CONCURRENCY = int(os.getenv('WARMUP_CONCURRENCY', 4))
+WARMUP_TIMEOUT_SECONDS = float(os.getenv('WARMUP_TIMEOUT_SECONDS', 10))
+WARMUP_SNAPSHOT_PATH = os.getenv('WARMUP_SNAPSHOT_PATH', '/app/cache/warmup.json') or None
+WARMUP_SNAPSHOT_MAX_AGE_HOURS = float(os.getenv('WARMUP_SNAPSHOT_MAX_AGE_HOURS', 24))
+PLANNING_CACHE_SECONDS = float(os.getenv('PLANNING_CACHE_SECONDS', 300))
+CHANTIERS_CACHE_SECONDS = float(os.getenv('CHANTIERS_CACHE_SECONDS', 300))
+# Embed "Bot démarré" : all (channel logs de chaque serveur), home (GUILD_ID seul), off
+STARTUP_EMBED = os.getenv('STARTUP_EMBED', 'all').lower()
+
+# Webhooks entrants (POST /api/webhooks/{source}, signés HMAC, file Redis Stream)
+INBOUND_ENABLED = os.getenv('INBOUND_ENABLED', 'true').lower() == 'true'
+INBOUND_SOURCES = parse_sources(os.getenv('INBOUND_SOURCES'))  # nom:secret[:channel_id],...
+INBOUND_WORKERS = int(os.getenv('INBOUND_WORKERS', 4))
+INBOUND_MAX_ATTEMPTS = int(os.getenv('INBOUND_MAX_ATTEMPTS', 5))
+INBOUND_RETRY_SECONDS = float(os.getenv('INBOUND_RETRY_SECONDS', 30))
+INBOUND_STREAM_MAXLEN = int(os.getenv('INBOUND_STREAM_MAXLEN', 100000))
+INBOUND_MAX_BYTES = int(os.getenv('INBOUND_MAX_BYTES', 256 * 1024))
+INBOUND_TOLERANCE_SECONDS = float(os.getenv('INBOUND_TOLERANCE_SECONDS', 300))
+
+# Multi-serveurs : tâches planifiées exécutées sur N serveurs à la fois
+GUILD_JOB_CONCURRENCY = int(os.getenv('GUILD_JOB_CONCURRENCY', 4))
 
 # Webhooks Discord
 WEBHOOK_LOGS_URL = os.getenv('WEBHOOK_LOGS_URL')
@@ -92,17 +185,62 @@ WEBHOOK_ALERTS_URL = os.getenv('WEBHOOK_ALERTS_URL')
 ENABLE_METRICS = os.getenv('ENABLE_METRICS', 'false').lower() == 'true'
 METRICS_PORT = int(os.getenv('METRICS_PORT', 9090))
 
+# Backends en mémoire (tests de charge sans PostgreSQL ni Redis)
+USE_FAKE_BACKENDS = os.getenv('USE_FAKE_BACKENDS', 'false').lower() == 'true'
+
+# Modération automatique
+MODERATION_ENABLED = os.getenv('MODERATION_ENABLED', 'true').lower() == 'true'
+MODERATION_WORKERS = int(os.getenv('MODERATION_WORKERS', 4))
+MODERATION_QUEUE_SIZE = int(os.getenv('MODERATION_QUEUE_SIZE', 10000))
+MODERATION_RELOAD_SECONDS = int(os.getenv('MODERATION_RELOAD_SECONDS', 60))
+
+# Extensions (cogs)
+EXTENSIONS_HOT_RELOAD = os.getenv('EXTENSIONS_HOT_RELOAD', 'false').lower() == 'true'
+EXTENSIONS_DB_QUOTA = int(os.getenv('EXTENSIONS_DB_QUOTA', 5))
+
+# Détection flood / doublons
+FLOOD_WINDOW_SECONDS = int(os.getenv('FLOOD_WINDOW_SECONDS', 300))
+FLOOD_MAX_USERS = int(os.getenv('FLOOD_MAX_USERS', 5000))
+FLOOD_SHARED_REDIS = os.getenv('FLOOD_SHARED_REDIS', 'false').lower() == 'true'
+FLOOD_SKIP_DUPLICATE_INSERTS = os.getenv('FLOOD_SKIP_DUPLICATE_INSERTS', 'false').lower() == 'true'
+
+# Tâches planifiées (cron, fuseau local)
+SCHEDULER_TIMEZONE = os.getenv('SCHEDULER_TIMEZONE', os.getenv('TZ', 'Europe/Paris'))
+
+# Rappels d'échéances (minutes avant l'échéance, séparées par des virgules)
+REMINDERS_ENABLED = os.getenv('REMINDERS_ENABLED', 'true').lower() == 'true'
+REMINDER_TASK_LEADS = [int(m) for m in os.getenv('REMINDER_TASK_LEADS', '1440,60').split(',') if m.strip()]
+REMINDER_PLANNING_LEADS = [int(m) for m in os.getenv('REMINDER_PLANNING_LEADS', '720').split(',') if m.strip()]
+REMINDER_HORIZON_HOURS = int(os.getenv('REMINDER_HORIZON_HOURS', 48))
+REMINDER_GRACE_MINUTES = int(os.getenv('REMINDER_GRACE_MINUTES', 60))
+
+# Logs (file bornée + thread d'écriture)
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'info').lower()
+LOG_QUEUE_SIZE = int(os.getenv('LOG_QUEUE_SIZE', 10000))
+LOG_SAMPLE_BURST = int(os.getenv('LOG_SAMPLE_BURST', 20))
+LOG_SAMPLE_WINDOW_SECONDS = float(os.getenv('LOG_SAMPLE_WINDOW_SECONDS', 10))
+LOG_FORWARD_ENABLED = os.getenv('LOG_FORWARD_ENABLED', 'false').lower() == 'true'
+LOG_FORWARD_LEVEL = os.getenv('LOG_FORWARD_LEVEL', 'error').lower()
+
 # ================================================================
 # LOGGING STRUCTURÉ
 # ================================================================
 
+# Écriture stdout / webhook dans un thread : aucun I/O sur la boucle asyncio
+log_sink = LogSink(
+    queue_size=LOG_QUEUE_SIZE,
+    sample_burst=LOG_SAMPLE_BURST,
+    sample_window=LOG_SAMPLE_WINDOW_SECONDS,
+    forward_level=LOG_FORWARD_LEVEL,
+    webhook_url=WEBHOOK_LOGS_URL if LOG_FORWARD_ENABLED else None
+)
+
 structlog.configure(
     processors=[
-        structlog.processors.TimeStamper(fmt="iso"),
         structlog.processors.add_log_level,
-        structlog.processors.JSONRenderer()
+        log_sink
     ],
-    wrapper_class=structlog.make_filtering_bound_logger(logging.INFO),
+    wrapper_class=structlog.make_filtering_bound_logger(LEVELS.get(LOG_LEVEL, logging.INFO)),
     context_class=dict,
     logger_factory=structlog.PrintLoggerFactory(),
 )
@@ -110,22 +248,13 @@ structlog.configure(
 logger = structlog.get_logger(__name__)
 
 # ================================================================
-# MÉTRIQUES PROMETHEUS
+# SERVICES PARTAGÉS
 # ================================================================
 
-if ENABLE_METRICS:
-    # Compteurs
-    METRIC_COMMANDS_TOTAL = Counter('discord_commands_total', 'Total commands executed', ['command'])
-    METRIC_MESSAGES_TOTAL = Counter('discord_messages_total', 'Total messages logged')
-    METRIC_API_REQUESTS_TOTAL = Counter('api_requests_total', 'Total API requests', ['endpoint', 'method'])
-    
-    # Histogrammes
-    METRIC_COMMAND_DURATION = Histogram('discord_command_duration_seconds', 'Command execution time', ['command'])
-    METRIC_API_DURATION = Histogram('api_request_duration_seconds', 'API request duration', ['endpoint'])
-    
-    # Gauges
-    METRIC_GUILD_MEMBERS = Gauge('discord_guild_members_total', 'Total guild members')
-    METRIC_DB_CONNECTIONS = Gauge('postgres_connections_active', 'Active PostgreSQL connections')
+# Pool DB, Redis, cache, métriques : accessibles partout via bot.services
+services = Services(metrics=Metrics(ENABLE_METRICS))
+metrics = services.metrics
+log_sink.on_drop = lambda reason, count: metrics.logs_dropped.labels(reason=reason).inc(count)
 
 # ================================================================
 # BOT DISCORD
@@ -143,41 +272,373 @@ bot = commands.Bot(
     case_insensitive=True
 )
 
-# Pools globaux
-db_pool: Optional[asyncpg.Pool] = None
-redis_client: Optional[aioredis.Redis] = None
+bot.services = services
 
 # FastAPI app
-api_app = FastAPI(title="GVBOT API", version="2.0")
+api_app = FastAPI(title="GVBOT API", version="2.0", default_response_class=FastJSONResponse)
+
+# Connexions dédiées, hors pools : workers COPY des sauvegardes, LISTEN
+async def _dedicated_connect():
+    if USE_FAKE_BACKENDS:
+        return await services.db_batch.pool.connect()
+    return await asyncpg.connect(
+        host=DB_HOST,
+        port=DB_PORT,
+        user=DB_USER,
+        password=DB_PASS,
+        database=DB_NAME,
+        command_timeout=DB_BATCH_TIMEOUT
+    )
+
+# Extensions : découverte + quotas DB par cog
+extension_manager = ExtensionManager(
+    bot,
+    pool_getter=lambda: services.db,
+    default_db_quota=EXTENSIONS_DB_QUOTA,
+    on_timing=lambda cog, kind, seconds: metrics.cog_duration.labels(cog=cog, kind=kind).observe(seconds)
+)
+bot.extension_manager = extension_manager
+
+# Configuration par serveur (chargée dans on_ready)
+guild_config = GuildConfigStore(
+    pool_getter=lambda: services.db,
+    listen_connect=_dedicated_connect,
+    defaults={
+        'planning_channel_id': CHANNEL_PLANNING_HEBDO,
+        'logs_channel_id': CHANNEL_LOGS_BOT,
+        'announce_channel_id': CHANNEL_ANNONCES,
+        'reminders_channel_id': CHANNEL_RAPPELS,
+    },
+    default_guild_id=GUILD_ID
+)
+bot.guild_config = guild_config
+
+# Index doublons (mémoire bornée, partagé via Redis si activé)
+flood = FloodDetector(
+    window=FLOOD_WINDOW_SECONDS,
+    max_users=FLOOD_MAX_USERS,
+    redis_getter=(lambda: services.redis) if FLOOD_SHARED_REDIS else None
+)
+
+# Modération (workers démarrés dans on_ready)
+moderation = ModerationPipeline(
+    bot,
+    pool_getter=lambda: services.db,
+    workers=MODERATION_WORKERS,
+    queue_size=MODERATION_QUEUE_SIZE,
+    reload_interval=MODERATION_RELOAD_SECONDS,
+    logs_channel_for=lambda guild_id: guild_config.get(guild_id).logs_channel_id
+)
+
+# Tâches planifiées persistantes (démarrées dans on_ready)
+scheduler = Scheduler(
+    pool_getter=lambda: services.db,
+    redis_getter=lambda: services.redis,
+    lock_connect=_dedicated_connect,
+    timezone=SCHEDULER_TIMEZONE,
+    metrics=metrics
+)
+bot.scheduler = scheduler
+
+# Index rôles -> capacités (construit dans on_ready, mis à jour par événements)
+permissions = PermissionIndex(pool_getter=lambda: services.db)
+bot.permissions = permissions
+set_permission_index(permissions)
+
+# Rappels tâches / planning (DM, sinon mention dans CHANNEL_RAPPELS)
+reminders = ReminderEngine(
+    bot,
+    pool_getter=lambda: services.db,
+    listen_connect=_dedicated_connect,
+    leads={'tasks': REMINDER_TASK_LEADS, 'planning': REMINDER_PLANNING_LEADS},
+    horizon=REMINDER_HORIZON_HOURS * 3600,
+    grace=REMINDER_GRACE_MINUTES * 60,
+    fallback_channel_for=lambda user_id: _reminders_channel(user_id),
+    tz=SCHEDULER_TIMEZONE,
+    metrics=metrics
+)
+
+def _reminders_channel(user_id: int) -> Optional[int]:
+    """Channel de rappels du premier serveur (configuré) dont l'utilisateur est membre"""
+    for guild in bot.guilds:
+        channel_id = guild_config.get(guild.id).reminders_channel_id
+        if channel_id and guild.get_member(user_id):
+            return channel_id
+    return None
+
+# Pièces jointes chantier (workers démarrés dans on_ready)
+media = MediaPipeline(
+    pool_getter=lambda: services.db,
+    root=MEDIA_PATH,
+    downloads=MEDIA_DOWNLOADS,
+    process_workers=MEDIA_PROCESS_WORKERS,
+    max_bytes=MEDIA_MAX_MB * 1024 * 1024,
+    channel_filter=lambda channel: getattr(getattr(channel, 'category', None), 'name', None) == MEDIA_CATEGORY,
+    metrics=metrics
+)
+
+# Modifications / suppressions de messages (écrites par lots)
+tracker = MessageTracker(
+    pool_getter=lambda: services.db,
+    window=TRACK_FLUSH_SECONDS,
+    batch_size=TRACK_BATCH_SIZE,
+    metrics=metrics
+)
+
+# Rapports hebdomadaires (agrégats sur le pool batch, connexions bornées)
+reports = ReportEngine(
+    pool_getter=lambda: services.batch,
+    root=REPORTS_PATH,
+    workers=REPORTS_WORKERS,
+    db_concurrency=REPORTS_DB_CONCURRENCY,
+    metrics=metrics
+)
+
+backups = BackupManager(
+    connect=_dedicated_connect,
+    pool_getter=lambda: services.batch,
+    redis_getter=lambda: services.redis,
+    root=BACKUP_PATH,
+    concurrency=BACKUP_CONCURRENCY,
+    compress_level=BACKUP_COMPRESS_LEVEL,
+    redis_data_path=BACKUP_REDIS_DATA,
+    verify_connect=(lambda: asyncpg.connect(RESTORE_CHECK_DSN, command_timeout=DB_BATCH_TIMEOUT)) if RESTORE_CHECK_DSN else None,
+    retention_days=BACKUP_RETENTION_DAYS,
+    full_weekday=BACKUP_FULL_WEEKDAY,
+    metrics=metrics
+)
+
+# Latences par requête, requêtes lentes, changements de plan (EXPLAIN sur le pool batch)
+query_observer = QueryObserver(
+    pool_getter=lambda: services.batch,
+    slow_ms=SLOW_QUERY_MS,
+    sample_rate=EXPLAIN_SAMPLE_RATE,
+    explain_interval=EXPLAIN_INTERVAL_SECONDS,
+    metrics=metrics
+)
+
+# ================================================================
+# CACHE (préchargé au démarrage)
+# ================================================================
+
+PLANNING_WEEK_SQL = '''
+    SELECT id, user_id, user_name, chantier, type, date_debut, date_fin, notes
+    FROM planning
+    WHERE date_debut < date_trunc('week', CURRENT_DATE) + INTERVAL '7 days'
+      AND COALESCE(date_fin, date_debut) >= date_trunc('week', CURRENT_DATE)
+    ORDER BY date_debut, user_name
+'''
+
+async def _load_stats_globales() -> Dict[str, Any]:
+    async with services.reader.acquire() as conn:
+        stats = await conn.fetchrow('SELECT * FROM stats_globales')
+    return to_json(dict(stats) if stats else {})
+
+async def stats_globales() -> Dict[str, Any]:
+    """Vue stats_globales (cache court, partagé par !info et /stats)"""
+    return await services.cache.get_or_load('stats:globales', _load_stats_globales, ttl=API_STATS_CACHE_SECONDS)
+
+def _planning_key() -> str:
+    year, week, _ = date.today().isocalendar()
+    return f"planning:{year}-W{week:02d}"
+
+async def _load_week_planning() -> List[Dict[str, Any]]:
+    async with services.reader.acquire() as conn:
+        rows = await conn.fetch(PLANNING_WEEK_SQL)
+    return to_json([dict(row) for row in rows])
+
+async def week_planning() -> List[Dict[str, Any]]:
+    """Planning de la semaine ISO en cours (dates en ISO 8601)"""
+    return await services.cache.get_or_load(_planning_key(), _load_week_planning, ttl=PLANNING_CACHE_SECONDS)
+
+async def _load_chantiers() -> List[Dict[str, Any]]:
+    return to_json(await reports.chantiers())
+
+async def active_chantiers() -> List[Dict[str, Any]]:
+    """Chantiers actifs (invalidé par !creerchantier / !archiverchantier)"""
+    return await services.cache.get_or_load('chantiers:actifs', _load_chantiers, ttl=CHANTIERS_CACHE_SECONDS)
+
+warmer = CacheWarmer(
+    path=WARMUP_SNAPSHOT_PATH,
+    concurrency=WARMUP_CONCURRENCY,
+    timeout=WARMUP_TIMEOUT_SECONDS,
+    max_age=WARMUP_SNAPSHOT_MAX_AGE_HOURS * 3600,
+    metrics=metrics
+)
+warmer.add('guild_config', guild_config.load, guild_config.snapshot, guild_config.restore)
+warmer.cached('stats', services.cache, lambda: 'stats:globales', _load_stats_globales, ttl=API_STATS_CACHE_SECONDS)
+warmer.cached('planning', services.cache, _planning_key, _load_week_planning, ttl=PLANNING_CACHE_SECONDS)
+warmer.cached('chantiers', services.cache, lambda: 'chantiers:actifs', _load_chantiers, ttl=CHANTIERS_CACHE_SECONDS)
+
+# ================================================================
+# WEBHOOKS ENTRANTS
+# ================================================================
+
+WEBHOOK_COLORS = {
+    'info': discord.Color.blue(),
+    'success': discord.Color.green(),
+    'warning': discord.Color.orange(),
+    'critical': discord.Color.red(),
+}
+
+async def create_task(user_id: int, user_name: str, assignee_id: int, assignee_name: str,
+                      description: str, chantier: str = '') -> int:
+    """Insérer une tâche (API, webhooks) et programmer ses rappels"""
+    async with services.db.acquire() as conn:
+        task_id = await conn.fetchval('''
+            INSERT INTO tasks (user_id, user_name, assignee_id, assignee_name, description, chantier)
+            VALUES ($1, $2, $3, $4, $5, $6)
+            RETURNING id
+        ''', user_id, user_name, assignee_id, assignee_name, description, chantier)
+    
+    if REMINDERS_ENABLED:
+        reminders.notify('tasks', task_id)
+    return task_id
+
+async def handle_webhook(event: WebhookEvent):
+    """Événement entrant -> tâche ({"type": "task"}) ou message Discord (par défaut)
+    
+    ValueError : événement invalide, mis en lettres mortes sans nouvelle tentative.
+    """
+    data = event.payload
+    kind = data.get('type', 'message')
+    
+    if kind == 'task':
+        if not data.get('assignee_id') or not data.get('description'):
+            raise ValueError("assignee_id et description requis")
+        task_id = await create_task(
+            int(data.get('user_id') or bot.user.id),
+            data.get('user_name') or event.source,
+            int(data['assignee_id']),
+            data.get('assignee_name', 'Unknown'),
+            str(data['description'])[:2000],
+            data.get('chantier', '')
+        )
+        logger.info("webhook_task_created", source=event.source, task_id=task_id, entry_id=event.id)
+        return
+    
+    if kind != 'message':
+        raise ValueError(f"type inconnu : {kind}")
+    
+    source = INBOUND_SOURCES.get(event.source)
+    default = bot.get_channel(source.channel_id) if source and source.channel_id else None
+    channel_id = data.get('channel_id')
+    if not channel_id:
+        channel = default
+    elif default is None:
+        # Sans channel par défaut, pas de serveur de référence : destination imposée refusée
+        raise ValueError(f"channel_id non autorisé pour la source {event.source}")
+    else:
+        channel = bot.get_channel(int(channel_id))
+        # Channel choisi par l'émetteur : seulement dans le serveur du channel de la source
+        if channel is not None and getattr(channel, 'guild', None) != default.guild:
+            raise ValueError(f"channel hors du serveur de la source : {channel_id}")
+    if channel is None:
+        raise ValueError(f"channel introuvable : {channel_id or (source.channel_id if source else None)}")
+    
+    fields = data.get('fields') or {}
+    if not isinstance(fields, dict):
+        raise ValueError("fields : objet attendu")
+    
+    embed = discord.Embed(
+        title=str(data.get('title') or f"🔔 {event.source}")[:256],
+        description=str(data.get('text') or '')[:4000],
+        url=data.get('url'),
+        color=WEBHOOK_COLORS.get(data.get('level'), discord.Color.blue()),
+        timestamp=datetime.utcfromtimestamp(event.received_at)
+    )
+    for name, value in list(fields.items())[:25]:
+        embed.add_field(name=str(name)[:256], value=str(value)[:1024] or '-', inline=True)
+    embed.set_footer(text=f"{event.source} · {event.delivery or event.id}")
+    await channel.send(embed=embed)
+
+webhooks = WebhookQueue(
+    redis_getter=lambda: services.redis,
+    handler=handle_webhook,
+    sources=INBOUND_SOURCES,
+    workers=INBOUND_WORKERS,
+    max_attempts=INBOUND_MAX_ATTEMPTS,
+    retry_seconds=INBOUND_RETRY_SECONDS,
+    stream_maxlen=INBOUND_STREAM_MAXLEN,
+    max_bytes=INBOUND_MAX_BYTES,
+    tolerance=INBOUND_TOLERANCE_SECONDS,
+    metrics=metrics
+)
 
 # ================================================================
 # DATABASE FUNCTIONS
 # ================================================================
 
+def _metered(name: str, pool, max_size: Optional[int] = None, acquire_timeout: Optional[float] = DB_ACQUIRE_TIMEOUT) -> MeteredPool:
+    return MeteredPool(
+        name,
+        pool,
+        metrics=metrics,
+        max_size=max_size,
+        max_waiters=DB_POOL_MAX_WAITERS,
+        acquire_timeout=acquire_timeout
+    )
+
+async def _create_pool(min_size: int, max_size: int, command_timeout: float, dsn: Optional[str] = None):
+    """Pool asyncpg vers le primaire (ou le DSN fourni)"""
+    # setup : query logger ajouté à chaque acquire (idempotent)
+    setup = query_observer.attach if QUERY_LOG_ENABLED else None
+    if dsn:
+        return await asyncpg.create_pool(dsn, min_size=min_size, max_size=max_size, command_timeout=command_timeout, setup=setup)
+    return await asyncpg.create_pool(
+        host=DB_HOST,
+        port=DB_PORT,
+        user=DB_USER,
+        password=DB_PASS,
+        database=DB_NAME,
+        min_size=min_size,
+        max_size=max_size,
+        command_timeout=command_timeout,
+        setup=setup
+    )
+
 async def init_db():
-    """Initialize PostgreSQL connection pool"""
-    global db_pool
+    """Initialize PostgreSQL connection pools (write / read / batch)"""
+    
+    if USE_FAKE_BACKENDS:
+        pool = FakePool(
+            max_size=DB_WRITE_POOL_MAX + DB_READ_POOL_MAX + DB_BATCH_POOL_MAX,
+            setup=query_observer.attach if QUERY_LOG_ENABLED else None
+        )
+        services.db = _metered('write', pool, DB_WRITE_POOL_MAX)
+        services.db_read = _metered('read', pool, DB_READ_POOL_MAX)
+        services.db_batch = _metered('batch', pool, DB_BATCH_POOL_MAX, acquire_timeout=None)
+        logger.info("database_connected", host="fake", database=DB_NAME)
+        return True
     
     try:
-        db_pool = await asyncpg.create_pool(
-            host=DB_HOST,
-            port=DB_PORT,
-            user=DB_USER,
-            password=DB_PASS,
-            database=DB_NAME,
-            min_size=5,
-            max_size=20,
-            command_timeout=60
+        # Écritures courtes (on_message, commandes) : jamais bloquées par un agrégat
+        services.db = _metered('write', await _create_pool(2, DB_WRITE_POOL_MAX, DB_WRITE_TIMEOUT))
+        # Agrégats, exports, maintenance : pool dédié, timeout long
+        services.db_batch = _metered(
+            'batch',
+            await _create_pool(1, DB_BATCH_POOL_MAX, DB_BATCH_TIMEOUT),
+            acquire_timeout=None
         )
         logger.info("database_connected", host=DB_HOST, database=DB_NAME)
         
+        # Lectures interactives : réplica si configuré, sinon primaire
+        try:
+            services.db_read = _metered('read', await _create_pool(1, DB_READ_POOL_MAX, DB_READ_TIMEOUT, DB_READ_DSN))
+            if DB_READ_DSN:
+                logger.info("database_replica_connected")
+        except Exception as e:
+            if not DB_READ_DSN:
+                raise
+            logger.warning("database_replica_unavailable", error=str(e))
+            services.db_read = _metered('read', await _create_pool(1, DB_READ_POOL_MAX, DB_READ_TIMEOUT))
+        
         # Test connexion
-        async with db_pool.acquire() as conn:
+        async with services.db.acquire() as conn:
             version = await conn.fetchval('SELECT version()')
             logger.info("postgres_version", version=version)
         
-        if ENABLE_METRICS:
-            METRIC_DB_CONNECTIONS.set(db_pool.get_size())
+        metrics.db_connections.set(sum(pool.get_size() for pool in services.pools().values()))
         
         return True
     
@@ -186,18 +647,24 @@ async def init_db():
         return False
 
 async def close_db():
-    """Close PostgreSQL connection pool"""
-    global db_pool
-    if db_pool:
-        await db_pool.close()
+    """Close PostgreSQL connection pools"""
+    pools = services.pools()
+    for pool in pools.values():
+        await pool.close()
+    services.db = services.db_read = services.db_batch = None
+    if pools:
         logger.info("database_closed")
 
 async def init_redis():
     """Initialize Redis connection"""
-    global redis_client
+    
+    if USE_FAKE_BACKENDS:
+        services.redis = FakeRedis()
+        logger.info("redis_connected", host="fake")
+        return True
     
     try:
-        redis_client = await aioredis.from_url(
+        services.redis = await aioredis.from_url(
             f"redis://:{REDIS_PASS}@{REDIS_HOST}:{REDIS_PORT}",
             encoding="utf-8",
             decode_responses=True,
@@ -205,7 +672,7 @@ async def init_redis():
         )
         
         # Test connexion
-        await redis_client.ping()
+        await services.redis.ping()
         logger.info("redis_connected", host=REDIS_HOST)
         return True
     
@@ -215,15 +682,17 @@ async def init_redis():
 
 async def close_redis():
     """Close Redis connection"""
-    global redis_client
-    if redis_client:
-        await redis_client.close()
+    if services.redis:
+        await services.redis.close()
+        services.redis = None
         logger.info("redis_closed")
 
 # ================================================================
 # BOT EVENTS
 # ================================================================
 
+startup_announced = False
+
 @bot.event
 async def on_ready():
     """Bot démarré et connecté"""
@@ -235,17 +704,72 @@ async def on_ready():
         latency_ms=round(bot.latency * 1000, 2)
     )
     
-    # Init databases
-    await init_db()
-    await init_redis()
+    # Init databases (on_ready est rappelé après chaque reconnexion)
+    if services.db is None:
+        await init_db()
+    if services.redis is None:
+        await init_redis()
+    
+    # Préchargement (config serveurs, stats, planning, chantiers) avant les commandes
+    await warmer.start()
+    
+    # Configuration par serveur : rechargée si le préchargement a échoué ou expiré
+    # (instantané restauré : revalidé en arrière-plan par le préchargement)
+    warmed = warmer.stats['loaded'] + warmer.stats['restored']
+    await guild_config.start(load='guild_config' not in warmed)
+    
+    # Plans de requêtes connus (détection des changements)
+    if QUERY_LOG_ENABLED:
+        await query_observer.start()
     
-    # Load extensions
-    await load_extensions()
+    # Index des permissions (configuration PostgreSQL puis rôles de chaque serveur)
+    if not permissions.guilds:
+        await permissions.load()
+    permissions.build_all(bot.guilds)
     
-    # Start background tasks
-    update_stats_cache.start()
-    post_weekly_planning.start()
-    cleanup_old_data.start()
+    # Load extensions (une seule fois : on_ready est rappelé après reconnexion)
+    if not extension_manager.extensions:
+        await extension_manager.load_all()
+    if EXTENSIONS_HOT_RELOAD:
+        extension_manager.start_watching()
+    
+    # Modération automatique
+    if MODERATION_ENABLED:
+        await moderation.start()
+    
+    # Pièces jointes chantier
+    if MEDIA_ENABLED:
+        await media.start()
+    
+    # Modifications / suppressions
+    if TRACK_EDITS_ENABLED:
+        await tracker.start()
+    
+    # Rapports hebdomadaires
+    if REPORTS_ENABLED:
+        await reports.start()
+    
+    # Sauvegardes (journal des suppressions de messages)
+    if BACKUP_ENABLED:
+        await backups.start()
+    
+    # Webhooks entrants (événements reçus par l'API pendant le démarrage compris)
+    if INBOUND_ENABLED and INBOUND_SOURCES:
+        await webhooks.start()
+    
+    # Transfert des erreurs vers #logs-bot du serveur principal (si pas de webhook)
+    home_logs = guild_config.get(GUILD_ID or (bot.guilds[0].id if bot.guilds else 0)).logs_channel_id
+    if LOG_FORWARD_ENABLED and not WEBHOOK_LOGS_URL and home_logs:
+        channel = bot.get_channel(home_logs)
+        if channel:
+            log_sink.forward_to_channel(asyncio.get_running_loop(), channel.send)
+    
+    # Tâches planifiées (idempotent : on_ready est rappelé après reconnexion)
+    await scheduler.start()
+    
+    # Rappels d'échéances
+    if REMINDERS_ENABLED:
+        await reminders.start()
     
     # Update bot presence
     await bot.change_presence(
@@ -257,24 +781,36 @@ async def on_ready():
     )
     
     # Update metrics
-    if ENABLE_METRICS:
-        guild = bot.get_guild(GUILD_ID)
-        if guild:
-            METRIC_GUILD_MEMBERS.set(guild.member_count)
-    
-    # Log dans channel
-    if CHANNEL_LOGS_BOT:
-        channel = bot.get_channel(CHANNEL_LOGS_BOT)
+    for guild in bot.guilds:
+        metrics.guild_members.labels(guild=str(guild.id)).set(guild.member_count or 0)
+    
+    # Annonce de démarrage (une seule fois par processus, pas aux reconnexions)
+    global startup_announced
+    if STARTUP_EMBED == 'off' or startup_announced:
+        return
+    startup_announced = True
+    
+    embed = discord.Embed(
+        title="🤖 Bot Démarré",
+        description=f"**{BOT_NAME}** est maintenant en ligne !",
+        color=discord.Color.green(),
+        timestamp=datetime.utcnow()
+    )
+    embed.add_field(name="Latence", value=f"{round(bot.latency * 1000)}ms")
+    embed.add_field(name="Serveurs", value=len(bot.guilds))
+    embed.add_field(
+        name="Cache",
+        value=f"{len(warmer.stats['restored'])} restaurées, {len(warmer.stats['loaded'])} chargées ({warmer.stats['duration_ms']}ms)"
+    )
+    
+    async def _announce(guild: discord.Guild):
+        channel_id = guild_config.get(guild.id).logs_channel_id
+        channel = bot.get_channel(channel_id) if channel_id else None
         if channel:
-            embed = discord.Embed(
-                title="🤖 Bot Démarré",
-                description=f"**{BOT_NAME}** est maintenant en ligne !",
-                color=discord.Color.green(),
-                timestamp=datetime.utcnow()
-            )
-            embed.add_field(name="Latence", value=f"{round(bot.latency * 1000)}ms")
-            embed.add_field(name="Serveurs", value=len(bot.guilds))
             await channel.send(embed=embed)
+    
+    guilds = [g for g in bot.guilds if g.id == GUILD_ID] if STARTUP_EMBED == 'home' else bot.guilds
+    await for_each_guild(guilds, _announce, GUILD_JOB_CONCURRENCY, job='startup_embed')
 
 @bot.event
 async def on_message(message: discord.Message):
@@ -284,36 +820,95 @@ async def on_message(message: discord.Message):
     if message.author.bot:
         return
     
+    # Empreinte contenu : alimente modération + dédoublonnage insert
+    flood_result = await flood.observe(message.author.id, message.channel.id, message.content)
+    
+    # Modération : vérification asynchrone hors du chemin des commandes
+    if MODERATION_ENABLED:
+        moderation.submit(message, flood_result)
+    
+    # Pièces jointes : file bornée, téléchargées hors de la gateway
+    if MEDIA_ENABLED and message.attachments:
+        media.submit(message)
+    
     try:
-        # Log dans PostgreSQL
-        async with db_pool.acquire() as conn:
-            await conn.execute('''
-                INSERT INTO messages (
-                    message_id, user_id, user_name, channel_id, 
-                    channel_name, guild_id, content, is_bot, created_at
+        if FLOOD_SKIP_DUPLICATE_INSERTS and flood_result.duplicate_in_channel:
+            # Copier-coller identique déjà stocké dans ce channel : pas de nouvel insert
+            metrics.duplicates_skipped.inc()
+        else:
+            # Log dans PostgreSQL
+            async with services.db.acquire() as conn:
+                await conn.execute('''
+                    INSERT INTO messages (
+                        message_id, user_id, user_name, channel_id, 
+                        channel_name, guild_id, content, is_bot, created_at
+                    )
+                    VALUES ($1, $2, $3, $4, $5, $6, $7, $8, $9)
+                ''', 
+                    message.id,
+                    message.author.id,
+                    message.author.name,
+                    message.channel.id,
+                    getattr(message.channel, 'name', 'DM'),
+                    message.guild.id if message.guild else 0,
+                    message.content[:2000],  # Limit 2000 chars
+                    message.author.bot,
+                    message.created_at
                 )
-                VALUES ($1, $2, $3, $4, $5, $6, $7, $8, $9)
-            ''', 
-                message.id,
-                message.author.id,
-                message.author.name,
-                message.channel.id,
-                getattr(message.channel, 'name', 'DM'),
-                message.guild.id if message.guild else 0,
-                message.content[:2000],  # Limit 2000 chars
-                message.author.bot,
-                message.created_at
-            )
+            
+            metrics.messages_total.inc()
         
-        if ENABLE_METRICS:
-            METRIC_MESSAGES_TOTAL.inc()
+        metrics.moderation_queue.set(moderation.queue.qsize())
+        metrics.moderation_violations.set(moderation.stats.violations)
     
     except Exception as e:
         logger.error("message_logging_failed", error=str(e), message_id=message.id)
     
-    # Process commands
+    # Process commands (après le préchargement, au plus WARMUP_TIMEOUT_SECONDS)
+    await warmer.wait()
     await bot.process_commands(message)
 
+@bot.event
+async def on_raw_message_edit(payload: discord.RawMessageUpdateEvent):
+    """Modification (même hors cache) : fusionnée puis écrite par lot"""
+    if TRACK_EDITS_ENABLED:
+        tracker.on_raw_edit(payload)
+
+@bot.event
+async def on_raw_message_delete(payload: discord.RawMessageDeleteEvent):
+    if TRACK_EDITS_ENABLED:
+        tracker.delete([payload.message_id])
+
+@bot.event
+async def on_raw_bulk_message_delete(payload: discord.RawBulkMessageDeleteEvent):
+    if TRACK_EDITS_ENABLED:
+        tracker.delete(payload.message_ids)
+
+@bot.event
+async def on_guild_join(guild: discord.Guild):
+    """Nouveau serveur : indexer ses rôles"""
+    permissions.build(guild)
+
+@bot.event
+async def on_guild_role_create(role: discord.Role):
+    permissions.on_role_update(role)
+
+@bot.event
+async def on_guild_role_update(before: discord.Role, after: discord.Role):
+    permissions.on_role_update(after)
+
+@bot.event
+async def on_guild_role_delete(role: discord.Role):
+    permissions.on_role_update(role, deleted=True)
+
+@bot.event
+async def on_member_update(before: discord.Member, after: discord.Member):
+    permissions.on_member_update(before, after)
+
+@bot.event
+async def on_member_remove(member: discord.Member):
+    permissions.on_member_remove(member)
+
 @bot.event
 async def on_command_error(ctx: commands.Context, error):
     """Gestion globale erreurs commandes"""
@@ -343,32 +938,434 @@ async def on_command_error(ctx: commands.Context, error):
 # EXTENSIONS (COGS)
 # ================================================================
 
-async def load_extensions():
-    """Charger tous les modules cogs"""
-    extensions = [
-        'cogs.commands_equipe',    # !presence, !stats, !resume
-        'cogs.commands_tasks',      # !tache, !taches, !done
-        'cogs.commands_planning',   # !monplanning, !planifier
-        'cogs.commands_admin',      # !auditserveur, !creerchantier
-        'cogs.commands_moderation', # !warn, !timeout, !ban
-    ]
+@bot.command(name='extensions')
+@commands.has_permissions(administrator=True)
+async def extensions_status(ctx: commands.Context):
+    """État des cogs : chargement, commandes, temps DB"""
+    
+    embed = discord.Embed(
+        title="🧩 Extensions",
+        color=discord.Color.blue(),
+        timestamp=datetime.utcnow()
+    )
     
-    for ext in extensions:
+    icons = {'loaded': '✅', 'failed': '❌', 'skipped': '⏭️', 'discovered': '⏳'}
+    for name, stats in sorted(extension_manager.stats.items()):
+        value = (
+            f"Commandes : {stats.commands} ({stats.command_errors} erreurs, "
+            f"{stats.command_seconds:.2f}s)\n"
+            f"DB : {stats.db_acquires} acq., attente max {stats.db_wait_max * 1000:.0f}ms, "
+            f"tenue {stats.db_hold_seconds:.2f}s"
+        )
+        if stats.error:
+            value += f"\nErreur : `{stats.error[:200]}`"
+        embed.add_field(name=f"{icons.get(stats.status, '•')} {name}", value=value, inline=False)
+    
+    if not extension_manager.stats:
+        embed.description = "Aucune extension découverte."
+    
+    await ctx.send(embed=embed)
+
+@bot.command(name='reload')
+@commands.has_permissions(administrator=True)
+async def reload_extension(ctx: commands.Context, name: str):
+    """Recharger un cog (et ses dépendants) sans redémarrer"""
+    
+    if not name.startswith('cogs.'):
+        name = f"cogs.{name}"
+    
+    if await extension_manager.reload(name):
+        await ctx.send(f"✅ `{name}` rechargé.")
+    else:
+        stats = extension_manager.stats.get(name)
+        reason = stats.error if stats and stats.error else "extension inconnue"
+        await ctx.send(f"❌ Échec rechargement `{name}` : {reason}")
+
+# ================================================================
+# PERMISSIONS
+# ================================================================
+
+@bot.command(name='permissions', usage='[rôle] [capacités | aucune]')
+@commands.has_permissions(administrator=True)
+async def permissions_command(ctx: commands.Context, role: Optional[discord.Role] = None, *capabilities: str):
+    """Capacités par rôle : liste, ou configuration d'un rôle (manager, admin, moderator, planning)"""
+    
+    # !permissions <rôle> <capacités...> : enregistrer (par ID de rôle)
+    if role is not None and capabilities:
+        names = [] if capabilities[0].lower() == 'aucune' else [c for arg in capabilities for c in arg.split(',') if c]
         try:
-            await bot.load_extension(ext)
-            logger.info("extension_loaded", extension=ext)
+            value = parse_capabilities(names)
+        except ValueError as e:
+            await ctx.send(f"❌ {e}. Disponibles : {', '.join(c.name.lower() for c in Capability)}")
+            return
+        await permissions.set_rule(ctx.guild, str(role.id), value)
+        await ctx.send(f"✅ {role.mention} : {', '.join(capability_names(value)) or 'aucune capacité'}")
+        return
+    
+    rules = permissions.rules(ctx.guild)
+    index = permissions.guilds.get(ctx.guild.id) or permissions.build(ctx.guild)
+    
+    # !permissions <rôle> : capacités effectives d'un rôle
+    if role is not None:
+        mask = index.roles.get(role.id, 0)
+        await ctx.send(f"🔐 {role.mention} : {', '.join(capability_names(mask)) or 'aucune capacité'}")
+        return
+    
+    embed = discord.Embed(
+        title="🔐 Permissions",
+        color=discord.Color.blue(),
+        timestamp=datetime.utcnow()
+    )
+    lines = []
+    for role_id, mask in index.roles.items():
+        guild_role = ctx.guild.get_role(role_id)
+        name = guild_role.mention if guild_role else f"`{role_id}`"
+        lines.append(f"{name} : {', '.join(capability_names(mask))}")
+    embed.description = "\n".join(lines) or "Aucun rôle avec capacités."
+    embed.add_field(
+        name="Règles",
+        value="\n".join(f"`{key}` : {', '.join(capability_names(mask)) or 'aucune'}" for key, mask in rules.items())[:1024] or "-",
+        inline=False
+    )
+    embed.set_footer(text=f"{len(index.members)} membres en cache | {BOT_PREFIX}permissions <rôle> <capacités | aucune>")
+    await ctx.send(embed=embed)
+
+# ================================================================
+# CONFIGURATION SERVEUR
+# ================================================================
+
+CONFIG_KEYS = {
+    'planning': 'planning_channel_id',
+    'logs': 'logs_channel_id',
+    'annonces': 'announce_channel_id',
+    'rappels': 'reminders_channel_id',
+    'chantiers': 'chantiers',
+    'retention': 'retention_days',
+    'rapports': 'reports_channel_id',
+}
+
+@bot.command(name='config', usage='[planning|logs|annonces|rappels|chantiers|retention|rapports] [valeur | aucun]')
+@commands.has_permissions(administrator=True)
+async def config_command(ctx: commands.Context, key: Optional[str] = None, *, value: Optional[str] = None):
+    """Configuration du serveur : channels, chantiers du planning, rétention des messages"""
+    
+    if key is not None:
+        field_name = CONFIG_KEYS.get(key.lower())
+        if field_name is None or value is None:
+            await ctx.send(f"❌ Utilisation : `{BOT_PREFIX}config <{'|'.join(CONFIG_KEYS)}> <valeur | aucun>`")
+            return
+        
+        if value.lower() == 'aucun':
+            parsed = () if field_name == 'chantiers' else None
+        elif field_name == 'chantiers':
+            parsed = tuple(c.strip() for c in value.split(',') if c.strip())
+        else:
+            digits = value.strip('<#>')
+            if not digits.isdigit():
+                await ctx.send("❌ Valeur invalide (channel ou nombre attendu).")
+                return
+            parsed = int(digits)
+            if field_name.endswith('_channel_id') and not ctx.guild.get_channel(parsed):
+                await ctx.send("❌ Channel introuvable sur ce serveur.")
+                return
+        
+        await guild_config.update(ctx.guild.id, **{field_name: parsed})
+        await ctx.send(f"✅ `{key.lower()}` mis à jour.")
+        return
+    
+    settings = guild_config.get(ctx.guild.id)
+    embed = discord.Embed(
+        title=f"⚙️ Configuration {ctx.guild.name}",
+        color=discord.Color.blue(),
+        timestamp=datetime.utcnow()
+    )
+    for key, field_name in CONFIG_KEYS.items():
+        current = getattr(settings, field_name)
+        if field_name.endswith('_channel_id'):
+            display = f"<#{current}>" if current else "-"
+        elif field_name == 'chantiers':
+            display = ", ".join(current) if current else "tous"
+        else:
+            display = f"{current} jours" if current else "globale (365 jours)"
+        embed.add_field(name=key, value=display, inline=True)
+    embed.set_footer(text=f"{BOT_PREFIX}config <clé> <valeur | aucun>")
+    await ctx.send(embed=embed)
+
+# ================================================================
+# REQUÊTES SQL
+# ================================================================
+
+@bot.command(name='requetes', usage='[lentes | plans]')
+@commands.has_permissions(administrator=True)
+async def queries_command(ctx: commands.Context, view: Optional[str] = None):
+    """Requêtes SQL : plus coûteuses, plus lentes, changements de plan"""
+    
+    embed = discord.Embed(color=discord.Color.blue(), timestamp=datetime.utcnow())
+    
+    # !requetes plans : changements de plan enregistrés
+    if view == 'plans':
+        embed.title = "🧭 Changements de plan"
+        try:
+            changes = await query_observer.plan_changes(limit=10)
         except Exception as e:
-            logger.error("extension_load_failed", extension=ext, error=str(e))
+            await ctx.send(f"❌ Erreur : {e}")
+            return
+        for change in changes:
+            embed.add_field(
+                name=f"`{change['statement']}` ({change['max_ms']:.0f}ms)",
+                value=f"`{change['shape'][:1000]}`",
+                inline=False
+            )
+        if not changes:
+            embed.description = "Aucun changement de plan détecté."
+        await ctx.send(embed=embed)
+        return
+    
+    # !requetes [lentes] : tri par temps cumulé ou par nombre de requêtes lentes
+    key = 'slow' if view == 'lentes' else 'total'
+    embed.title = "🐢 Requêtes lentes" if key == 'slow' else "🗄️ Requêtes les plus coûteuses"
+    for stats in query_observer.top(10, key=key):
+        if not stats.calls:
+            continue
+        embed.add_field(
+            name=f"`{stats.statement}` · {stats.query_id}",
+            value=(
+                f"{stats.calls} appels, {stats.total:.1f}s cumulées\n"
+                f"moy. {stats.avg_ms:.1f}ms, max {stats.max * 1000:.0f}ms, "
+                f"{stats.slow} lentes, {stats.errors} erreurs\n"
+                f"`{stats.query[:150]}`"
+            ),
+            inline=False
+        )
+    if not embed.fields:
+        embed.description = "Aucune requête mesurée." if QUERY_LOG_ENABLED else "Mesure désactivée (QUERY_LOG_ENABLED=false)."
+    embed.set_footer(text=f"Seuil {SLOW_QUERY_MS:.0f}ms | EXPLAIN {EXPLAIN_SAMPLE_RATE:.0%} | {BOT_PREFIX}requetes [lentes | plans]")
+    await ctx.send(embed=embed)
+
+# ================================================================
+# SAUVEGARDES
+# ================================================================
+
+@bot.command(name='backup', usage='[run | full | verify [id] | list]')
+@commands.has_permissions(administrator=True)
+async def backup_command(ctx: commands.Context, action: Optional[str] = None, backup_id: Optional[str] = None):
+    """Sauvegardes : état, lancement (incrémentale / complète), vérification, liste"""
+    
+    if not BACKUP_ENABLED:
+        await ctx.send("❌ Sauvegardes désactivées (BACKUP_ENABLED=false).")
+        return
+    
+    # !backup run | full : sauvegarde immédiate
+    if action in ('run', 'full'):
+        await ctx.send(f"⏳ Sauvegarde {'complète' if action == 'full' else 'en cours'}...")
+        try:
+            manifest = await backups.run(full=True if action == 'full' else None)
+        except Exception as e:
+            await ctx.send(f"❌ Sauvegarde en échec : {e}")
+            return
+        await ctx.send(embed=_backup_embed(manifest))
+        return
+    
+    # !backup verify [id] : restauration dans la base de test
+    if action == 'verify':
+        async with ctx.typing():
+            try:
+                result = await backups.verify(backup_id)
+            except BackupError as e:
+                await ctx.send(f"❌ {e}")
+                return
+        if result['ok']:
+            await ctx.send(f"✅ `{result['id']}` restaurée et vérifiée ({result['duration_s']:.0f}s).")
+        else:
+            await ctx.send(f"❌ `{result['id']}` : " + "; ".join(result['errors'])[:1800])
+        return
+    
+    # !backup [list] : en cours + dernières sauvegardes
+    embed = discord.Embed(title="💾 Sauvegardes", color=discord.Color.blue(), timestamp=datetime.utcnow())
+    progress = backups.progress
+    if progress:
+        embed.add_field(
+            name=f"⏳ En cours : {progress['id']} ({progress['kind']})",
+            value=(
+                f"Étape : {progress['stage']} | tables {progress['tables_done']}/{progress['tables_total']}\n"
+                f"{progress['rows']} lignes, {progress['bytes'] / 1048576:.1f} Mo lus"
+            ),
+            inline=False
+        )
+    icons = {True: '✅', False: '❌', None: '•'}
+    for manifest in (await backups.list())[-10:][::-1]:
+        size = sum(f['bytes'] for f in manifest['files'].values())
+        verified = manifest.get('verified') or {}
+        embed.add_field(
+            name=f"{icons[verified.get('ok')]} {manifest['id']} ({manifest['kind']})",
+            value=(
+                f"{sum(t['rows'] for t in manifest['tables'].values())} lignes, {size / 1048576:.1f} Mo, "
+                f"{manifest['duration_s']:.0f}s | Redis : {manifest['redis'].get('status')}"
+            ),
+            inline=False
+        )
+    if not embed.fields:
+        embed.description = "Aucune sauvegarde."
+    embed.set_footer(text=f"Rétention {BACKUP_RETENTION_DAYS}j | {BOT_PREFIX}backup [run | full | verify [id] | list]")
+    await ctx.send(embed=embed)
+
+def _backup_embed(manifest: Dict[str, Any]) -> discord.Embed:
+    """Résumé d'une sauvegarde terminée"""
+    size = sum(f['bytes'] for f in manifest['files'].values())
+    embed = discord.Embed(
+        title=f"💾 Sauvegarde {manifest['id']} ({manifest['kind']})",
+        color=discord.Color.green(),
+        timestamp=datetime.utcnow()
+    )
+    embed.add_field(name="Tables", value=str(len(manifest['tables'])))
+    embed.add_field(name="Lignes", value=str(sum(t['rows'] for t in manifest['tables'].values())))
+    embed.add_field(name="Taille", value=f"{size / 1048576:.1f} Mo")
+    embed.add_field(name="Durée", value=f"{manifest['duration_s']:.0f}s")
+    embed.add_field(name="Redis", value=manifest['redis'].get('status', '-'))
+    if manifest['parent']:
+        embed.add_field(name="Parente", value=manifest['parent'])
+    return embed
+
+# ================================================================
+# WEBHOOKS ENTRANTS
+# ================================================================
+
+@bot.command(name='webhooks', usage='[replay <id | tout>]')
+@commands.has_permissions(administrator=True)
+async def webhooks_command(ctx: commands.Context, action: Optional[str] = None, entry_id: Optional[str] = None):
+    """Webhooks entrants : retard de la file, lettres mortes, relance"""
+    
+    if not INBOUND_ENABLED or not INBOUND_SOURCES:
+        await ctx.send("❌ Webhooks entrants désactivés (INBOUND_ENABLED / INBOUND_SOURCES).")
+        return
+    
+    # !webhooks replay <id | tout>
+    if action == 'replay':
+        if not entry_id:
+            await ctx.send(f"❌ Utilisation : `{BOT_PREFIX}webhooks replay <id | tout>`")
+            return
+        count = await webhooks.replay(None if entry_id == 'tout' else entry_id)
+        await ctx.send(f"🔁 {count} événement(s) remis en file." if count else "❌ Aucune lettre morte correspondante.")
+        return
+    
+    state = await webhooks.status()
+    embed = discord.Embed(
+        title="📥 Webhooks entrants",
+        description=f"Sources : {', '.join(f'`{name}`' for name in sorted(INBOUND_SOURCES))}",
+        color=discord.Color.red() if state['dead'] else discord.Color.blue(),
+        timestamp=datetime.utcnow()
+    )
+    embed.add_field(name="File", value=f"{state['length']} entrées | {state['lag']} non lues | {state['pending']} en cours", inline=False)
+    stats = state['stats']
+    embed.add_field(
+        name="Depuis le démarrage",
+        value=f"{stats['accepted']} reçus, {stats['rejected']} refusés | {stats['ok']} traités, "
+              f"{stats['duplicate']} doublons, {stats['retry']} échecs, {stats['dead']} abandonnés",
+        inline=False
+    )
+    for dead in state['recent_dead']:
+        failed_at = datetime.fromtimestamp(dead['failed_at']).strftime('%d/%m %H:%M')
+        embed.add_field(
+            name=f"💀 {dead['id']} ({dead['source']})",
+            value=f"{failed_at}, {dead['attempts']} tentative(s)\n`{(dead['error'] or '-')[:200]}`",
+            inline=False
+        )
+    embed.set_footer(text=f"{state['dead']} lettre(s) morte(s) | {BOT_PREFIX}webhooks replay <id | tout>")
+    await ctx.send(embed=embed)
+
+# ================================================================
+# RAPPORTS
+# ================================================================
+
+@bot.command(name='rapport', usage='<chantier> [AAAA-Wss]')
+@requires(Capability.MANAGER)
+async def report_command(ctx: commands.Context, chantier: Optional[str] = None, semaine: Optional[str] = None):
+    """Rapport hebdomadaire d'un chantier (CSV + HTML), par défaut la semaine passée"""
+    
+    if not REPORTS_ENABLED:
+        await ctx.send("❌ Rapports désactivés (REPORTS_ENABLED=false).")
+        return
+    
+    chantiers = {c['nom']: c for c in await active_chantiers()}
+    if chantier is None or chantier.lower() not in chantiers:
+        available = ", ".join(f"`{name}`" for name in chantiers) or "aucun"
+        await ctx.send(f"❌ Utilisation : `{BOT_PREFIX}rapport <chantier> [AAAA-Wss]`. Chantiers actifs : {available}")
+        return
+    
+    try:
+        year, week = parse_week(semaine)
+    except ValueError as e:
+        await ctx.send(f"❌ {e}")
+        return
+    
+    target = chantiers[chantier.lower()]
+    async with ctx.typing():
+        report = await reports.report(target['nom'], target['channel_id'], year, week)
+    await ctx.send(embed=_report_embed(report), files=_report_files(report))
+
+# ================================================================
+# TÂCHES PLANIFIÉES
+# ================================================================
+
+@bot.command(name='jobs', usage='[tâche | run <tâche>]')
+@commands.has_permissions(administrator=True)
+async def jobs_command(ctx: commands.Context, action: Optional[str] = None, name: Optional[str] = None):
+    """Tâches planifiées : état, historique d'une tâche, lancement manuel"""
+    
+    # !jobs run <tâche>
+    if action == 'run':
+        if name and await scheduler.trigger(name):
+            await ctx.send(f"▶️ `{name}` lancée.")
+        else:
+            await ctx.send(f"❌ Tâche inconnue. Disponibles : {', '.join(f'`{n}`' for n in scheduler.jobs)}")
+        return
+    
+    # !jobs <tâche> : dernières exécutions
+    if action:
+        if action not in scheduler.jobs:
+            await ctx.send(f"❌ Tâche `{action}` introuvable.")
+            return
+        runs = await scheduler.history(action, limit=10)
+        embed = discord.Embed(title=f"🕒 {action}", color=discord.Color.blue())
+        icons = {'ok': '✅', 'error': '❌', 'skipped': '⏭️'}
+        lines = [
+            f"{icons.get(r['status'], '•')} {r['started_at'].astimezone(scheduler.tz).strftime('%d/%m %H:%M')} "
+            f"({r['trigger']}, {r['duration_ms']}ms)" + (f" `{r['error'][:80]}`" if r['error'] else "")
+            for r in runs
+        ]
+        embed.description = "\n".join(lines) or "Aucune exécution enregistrée."
+        await ctx.send(embed=embed)
+        return
+    
+    embed = discord.Embed(
+        title="🕒 Tâches planifiées",
+        color=discord.Color.blue(),
+        timestamp=datetime.utcnow()
+    )
+    for job in scheduler.describe():
+        last = job['last_status'] or 'jamais'
+        if job['last_duration_ms'] is not None:
+            last += f" ({job['last_duration_ms']}ms)"
+        next_run = datetime.fromisoformat(job['next_run']).strftime('%d/%m %H:%M') if job['next_run'] else '-'
+        value = (
+            f"Cron : `{job['cron']}` ({job['misfire']})\n"
+            f"Prochaine : {next_run} | Dernière : {last}"
+            + (" | ⏳ en cours" if job['running'] else "")
+        )
+        embed.add_field(name=job['name'], value=value, inline=False)
+    
+    embed.set_footer(text=f"{BOT_PREFIX}jobs <tâche> : historique | {BOT_PREFIX}jobs run <tâche> : lancer")
+    await ctx.send(embed=embed)
 
 # ================================================================
 # BACKGROUND TASKS
 # ================================================================
 
-@tasks.loop(hours=1)
+@scheduler.job('0 * * * *', misfire='run_once', jitter=120)
 async def update_stats_cache():
     """Mise à jour cache stats toutes les heures"""
     try:
-        async with db_pool.acquire() as conn:
+        async with services.batch.acquire() as conn:
             # Update user_stats
             await conn.execute('''
                 INSERT INTO user_stats (user_id, user_name, total_messages, messages_7d, messages_30d, updated_at)
@@ -388,30 +1385,49 @@ async def update_stats_cache():
                     messages_30d = EXCLUDED.messages_30d,
                     updated_at = EXCLUDED.updated_at
             ''')
+            
+            # Messages 24h par serveur (une requête pour tous les serveurs)
+            rows = await conn.fetch('''
+                SELECT guild_id, COUNT(*) AS messages_24h
+                FROM messages
+                WHERE created_at > NOW() - INTERVAL '24 hours'
+                GROUP BY guild_id
+            ''')
+        
+        messages_24h = {row['guild_id']: row['messages_24h'] for row in rows}
+        
+        async def _guild_stats(guild: discord.Guild):
+            metrics.guild_members.labels(guild=str(guild.id)).set(guild.member_count or 0)
+            services.cache.set(f"guild_stats:{guild.id}", {
+                'members': guild.member_count or 0,
+                'messages_24h': messages_24h.get(guild.id, 0),
+            }, ttl=3600)
+        
+        errors = await for_each_guild(bot.guilds, _guild_stats, GUILD_JOB_CONCURRENCY, job='stats_cache')
+        if errors:
+            raise RuntimeError(f"{len(errors)} serveur(s) en échec")
         
-        logger.info("stats_cache_updated")
+        logger.info("stats_cache_updated", guilds=len(bot.guilds))
     
     except Exception as e:
         logger.error("stats_cache_update_failed", error=str(e))
+        raise
 
-@tasks.loop(time=time(6, 0))  # Lundi 6h00
+@scheduler.job('0 6 * * 1', misfire='run_once', misfire_grace=12 * 3600)  # Lundi 6h00
 async def post_weekly_planning():
-    """Post planning hebdomadaire chaque lundi"""
+    """Post planning hebdomadaire chaque lundi (channel planning de chaque serveur)"""
     
-    # Vérifier si aujourd'hui est lundi
-    if datetime.now().weekday() != 0:
-        return
-    
-    if not CHANNEL_PLANNING_HEBDO:
+    targets = [
+        (guild, settings)
+        for guild in bot.guilds
+        if (settings := guild_config.get(guild.id)).planning_channel_id
+    ]
+    if not targets:
         return
     
     try:
-        channel = bot.get_channel(CHANNEL_PLANNING_HEBDO)
-        if not channel:
-            return
-        
-        # Récupérer planning semaine
-        async with db_pool.acquire() as conn:
+        # Récupérer planning semaine (une requête, filtrée par serveur en mémoire)
+        async with services.reader.acquire() as conn:
             events = await conn.fetch('''
                 SELECT user_name, chantier, type, date_debut, date_fin, notes
                 FROM planning
@@ -420,51 +1436,184 @@ async def post_weekly_planning():
                 ORDER BY date_debut, user_name
             ''')
         
-        if not events:
-            await channel.send("📅 Aucun événement prévu cette semaine.")
-            return
-        
-        # Créer embed
-        embed = discord.Embed(
-            title=f"📅 Planning Semaine {datetime.now().strftime('%W')}",
-            description=f"Du {datetime.now().strftime('%d/%m')} au {(datetime.now() + timedelta(days=7)).strftime('%d/%m')}",
-            color=discord.Color.blue(),
-            timestamp=datetime.utcnow()
-        )
-        
-        # Grouper par jour
-        events_by_day = {}
-        for event in events:
-            day = event['date_debut'].strftime('%A %d/%m')
-            if day not in events_by_day:
-                events_by_day[day] = []
-            events_by_day[day].append(event)
+        settings_by_guild = dict((guild.id, settings) for guild, settings in targets)
         
-        # Ajouter fields
-        for day, day_events in events_by_day.items():
-            value = "\n".join([
-                f"• **{e['user_name']}** : {e['chantier']} ({e['type']})"
-                for e in day_events
-            ])
-            embed.add_field(name=day, value=value, inline=False)
+        async def _post(guild: discord.Guild):
+            settings = settings_by_guild[guild.id]
+            channel = bot.get_channel(settings.planning_channel_id)
+            if not channel:
+                return
+            
+            guild_events = [e for e in events if not settings.chantiers or e['chantier'] in settings.chantiers]
+            if not guild_events:
+                await channel.send("📅 Aucun événement prévu cette semaine.")
+                return
+            
+            # Créer embed
+            embed = discord.Embed(
+                title=f"📅 Planning Semaine {datetime.now().strftime('%W')}",
+                description=f"Du {datetime.now().strftime('%d/%m')} au {(datetime.now() + timedelta(days=7)).strftime('%d/%m')}",
+                color=discord.Color.blue(),
+                timestamp=datetime.utcnow()
+            )
+            
+            # Grouper par jour
+            events_by_day = {}
+            for event in guild_events:
+                day = event['date_debut'].strftime('%A %d/%m')
+                if day not in events_by_day:
+                    events_by_day[day] = []
+                events_by_day[day].append(event)
+            
+            # Ajouter fields
+            for day, day_events in events_by_day.items():
+                value = "\n".join([
+                    f"• **{e['user_name']}** : {e['chantier']} ({e['type']})"
+                    for e in day_events
+                ])
+                embed.add_field(name=day, value=value, inline=False)
+            
+            await channel.send(embed=embed)
+            logger.info("weekly_planning_posted", guild_id=guild.id, events_count=len(guild_events))
         
-        await channel.send(embed=embed)
-        logger.info("weekly_planning_posted", events_count=len(events))
+        errors = await for_each_guild([guild for guild, _ in targets], _post, GUILD_JOB_CONCURRENCY, job='weekly_planning')
+        if errors:
+            raise RuntimeError(f"{len(errors)} serveur(s) en échec")
     
     except Exception as e:
         logger.error("weekly_planning_post_failed", error=str(e))
+        raise
+
+def _report_embed(report: Report) -> discord.Embed:
+    """Résumé d'un rapport (fichiers CSV / HTML joints à côté)"""
+    summary = report.summary
+    tasks = summary['tasks']
+    embed = discord.Embed(
+        title=f"📊 {report.chantier} — semaine {report.label}",
+        description=f"Du {summary['start']} au {summary['end']}",
+        color=discord.Color.blue(),
+        timestamp=datetime.utcnow()
+    )
+    embed.add_field(name="💬 Messages", value=str(summary['messages']), inline=True)
+    embed.add_field(
+        name="📋 Tâches",
+        value=f"{tasks['open']} ouvertes · {tasks['created']} créées · {tasks['closed']} clôturées · {tasks['overdue']} en retard",
+        inline=False
+    )
+    events = summary['planning']
+    if events:
+        lines = [f"• {str(e['date_debut'])[:10]} **{e['user_name']}** ({e['type']})" for e in events[:8]]
+        if len(events) > 8:
+            lines.append(f"… +{len(events) - 8}")
+        embed.add_field(name=f"📅 Interventions ({len(events)})", value="\n".join(lines)[:1024], inline=False)
+    if summary['contributors']:
+        embed.add_field(
+            name="🏅 Contributeurs",
+            value="\n".join(f"{c['user_name']} : {c['messages']}" for c in summary['contributors'])[:1024],
+            inline=False
+        )
+    return embed
+
+def _report_files(report: Report) -> List[discord.File]:
+    return [
+        discord.File(report.files[fmt], filename=f"rapport-{slugify(report.chantier)}-{report.label}.{fmt}")
+        for fmt in REPORT_FORMATS
+        if fmt in report.files
+    ]
 
-@tasks.loop(hours=24)
+@scheduler.job('0 7 * * 1', misfire='run_once', misfire_grace=12 * 3600)  # Lundi 7h00
+async def weekly_reports():
+    """Rapports de la semaine passée par chantier (channel rapports, sinon planning, de chaque serveur)"""
+    if not REPORTS_ENABLED:
+        return
+    
+    year, week = previous_week()
+    
+    # Chantier -> serveur de son channel (filtre chantiers de la configuration du serveur)
+    by_guild: Dict[int, List[Dict[str, Any]]] = {}
+    for chantier in await reports.chantiers():
+        channel = bot.get_channel(chantier['channel_id']) if chantier['channel_id'] else None
+        if channel is None or not getattr(channel, 'guild', None):
+            continue
+        settings = guild_config.get(channel.guild.id)
+        if settings.chantiers and chantier['nom'] not in settings.chantiers:
+            continue
+        by_guild.setdefault(channel.guild.id, []).append(chantier)
+    
+    # Agrégats en parallèle (REPORTS_DB_CONCURRENCY connexions au plus), rendu hors boucle
+    generated, failed = await reports.generate_all(
+        [chantier for chantiers in by_guild.values() for chantier in chantiers], year, week
+    )
+    by_name = {report.chantier: report for report in generated}
+    
+    async def _post(guild: discord.Guild):
+        settings = guild_config.get(guild.id)
+        channel = bot.get_channel(settings.reports_channel_id or settings.planning_channel_id)
+        if not channel:
+            return
+        for chantier in by_guild[guild.id]:
+            report = by_name.get(chantier['nom'])
+            if report is not None:
+                await channel.send(embed=_report_embed(report), files=_report_files(report))
+        logger.info("weekly_reports_posted", guild_id=guild.id, reports=len(by_guild[guild.id]))
+    
+    errors = await for_each_guild(
+        [guild for guild in bot.guilds if guild.id in by_guild], _post, GUILD_JOB_CONCURRENCY, job='weekly_reports'
+    )
+    if failed or errors:
+        raise RuntimeError(f"{len(failed)} rapport(s), {len(errors)} serveur(s) en échec")
+
+@scheduler.job('*/15 * * * *', misfire='skip')
+async def reminders_resync():
+    """Recharger l'horizon des rappels (filet de sécurité des notifications PostgreSQL)"""
+    if REMINDERS_ENABLED:
+        await reminders.resync()
+
+@scheduler.job('0 3 * * *', misfire='run_once', misfire_grace=6 * 3600)
+async def nightly_backup():
+    """Sauvegarde (complète le jour BACKUP_FULL_WEEKDAY, incrémentale sinon), rétention, vérification"""
+    if not BACKUP_ENABLED:
+        return
+    manifest = await backups.run()
+    await backups.prune()
+    if RESTORE_CHECK_DSN:
+        result = await backups.verify(manifest['id'])
+        if not result['ok']:
+            raise BackupError(f"vérification en échec : {'; '.join(result['errors'])}")
+
+@scheduler.job('30 3 * * *', misfire='run_once', misfire_grace=6 * 3600, jitter=600)
 async def cleanup_old_data():
     """Nettoyage données anciennes (>1 an)"""
     try:
-        async with db_pool.acquire() as conn:
+        async with services.batch.acquire() as conn:
             # Nettoyer vieux messages
             deleted = await conn.fetchval('SELECT cleanup_old_messages(365)')
-            logger.info("old_data_cleaned", messages_deleted=deleted)
+            # Historique des tâches planifiées (90 jours)
+            await conn.execute("DELETE FROM job_runs WHERE started_at < NOW() - INTERVAL '90 days'")
+            await conn.execute("DELETE FROM reminder_deliveries WHERE fire_at < NOW() - INTERVAL '90 days'")
+            if BACKUP_ENABLED:
+                await conn.execute("DELETE FROM message_purges WHERE purged_at < NOW() - INTERVAL '90 days'")
+        
+        # Rétention plus courte configurée par serveur
+        async def _guild_cleanup(guild: discord.Guild):
+            days = guild_config.get(guild.id).retention_days
+            if not days or days >= 365:
+                return
+            async with services.batch.acquire() as conn:
+                status = await conn.execute(
+                    "DELETE FROM messages WHERE guild_id = $1 AND created_at < NOW() - make_interval(days => $2)",
+                    guild.id, days
+                )
+            logger.info("guild_messages_cleaned", guild_id=guild.id, retention_days=days, status=status)
+        
+        errors = await for_each_guild(bot.guilds, _guild_cleanup, GUILD_JOB_CONCURRENCY, job='cleanup')
+        logger.info("old_data_cleaned", messages_deleted=deleted)
+        if errors:
+            raise RuntimeError(f"{len(errors)} serveur(s) en échec")
     
     except Exception as e:
         logger.error("cleanup_failed", error=str(e))
+        raise
 
 # ================================================================
 # COMMANDES BASIQUES
@@ -527,8 +1676,8 @@ async def help_command(ctx: commands.Context, command_name: Optional[str] = None
         categories = {
             "👥 Équipe": ["presence", "stats", "resume"],
             "📋 Tâches": ["tache", "taches", "done"],
-            "📅 Planning": ["monplanning", "planifier", "modifierplanning"],
-            "🔧 Admin": ["auditserveur", "creerchantier", "archiverchantier"],
+            "📅 Planning": ["monplanning", "planifier", "modifierplanning", "rapport"],
+            "🔧 Admin": ["auditserveur", "creerchantier", "archiverchantier", "extensions", "reload", "jobs", "permissions", "config", "requetes", "backup", "webhooks"],
             "⚙️ Utilitaires": ["ping", "help", "info"]
         }
         
@@ -563,11 +1712,10 @@ async def info(ctx: commands.Context):
     
     # Stats DB
     try:
-        async with db_pool.acquire() as conn:
-            stats = await conn.fetchrow('SELECT * FROM stats_globales')
-            embed.add_field(name="Messages", value=f"{stats['total_messages']:,}", inline=True)
-            embed.add_field(name="Tâches actives", value=stats['tasks_todo'], inline=True)
-            embed.add_field(name="Chantiers", value=stats['chantiers_actifs'], inline=True)
+        stats = await stats_globales()
+        embed.add_field(name="Messages", value=f"{stats['total_messages']:,}", inline=True)
+        embed.add_field(name="Tâches actives", value=stats['tasks_todo'], inline=True)
+        embed.add_field(name="Chantiers", value=stats['chantiers_actifs'], inline=True)
     except:
         pass
     
@@ -575,24 +1723,100 @@ async def info(ctx: commands.Context):
     
     await ctx.send(embed=embed)
 
+# ================================================================
+# TÂCHES
+# ================================================================
+
+TASKS_PAGE_SQL = '''
+    SELECT id, description, chantier, status, due_date
+    FROM tasks
+    WHERE assignee_id = $1
+      AND status NOT IN ('done', 'cancelled')
+      AND ($2::int IS NULL OR id > $2)
+    ORDER BY id
+    LIMIT $3
+'''
+
+@bot.command(name='taches', usage='[@membre]')
+async def tasks_list(ctx: commands.Context, member: Optional[discord.Member] = None):
+    """Tâches ouvertes d'un membre (par défaut : les tiennes)"""
+    
+    member = member or ctx.author
+    
+    def _format(rows, page: int) -> discord.Embed:
+        embed = discord.Embed(
+            title=f"📋 Tâches de {member.display_name}",
+            color=discord.Color.blue()
+        )
+        for row in rows:
+            due = f" | Échéance {row['due_date'].strftime('%d/%m')}" if row['due_date'] else ""
+            embed.add_field(
+                name=f"#{row['id']} {row['chantier'] or ''}".strip(),
+                value=f"{row['description'][:200]}\n`{row['status']}`{due}",
+                inline=False
+            )
+        return embed
+    
+    source = KeysetPageSource(lambda: services.reader, TASKS_PAGE_SQL, _format, params=(member.id,), per_page=5)
+    await paginate(ctx, source)
+
+@bot.command(name='monplanning', usage='[@membre]')
+async def my_planning(ctx: commands.Context, member: Optional[discord.Member] = None):
+    """Planning de la semaine d'un membre (par défaut : le tien)"""
+    
+    member = member or ctx.author
+    try:
+        events = [e for e in await week_planning() if e['user_id'] == member.id]
+    except Exception as e:
+        logger.error("my_planning_failed", user_id=member.id, error=str(e))
+        await ctx.send("❌ Planning indisponible, réessaie dans un instant.")
+        return
+    
+    if not events:
+        await ctx.send(f"📅 Rien de prévu pour {member.display_name} cette semaine.")
+        return
+    
+    embed = discord.Embed(
+        title=f"📅 Planning de {member.display_name}",
+        description=f"Semaine {_planning_key().split('-W')[1]}",
+        color=discord.Color.blue()
+    )
+    for event in events[:25]:
+        start = datetime.fromisoformat(event['date_debut'])
+        end = datetime.fromisoformat(event['date_fin']) if event['date_fin'] else None
+        period = start.strftime('%A %d/%m') + (f" → {end.strftime('%A %d/%m')}" if end and end.date() != start.date() else "")
+        embed.add_field(
+            name=period,
+            value=f"{event['chantier']} ({event['type']})" + (f"\n{event['notes'][:200]}" if event['notes'] else ""),
+            inline=False
+        )
+    await ctx.send(embed=embed)
+
 # ================================================================
 # API REST
 # ================================================================
 
+API_ROOT = Payload({
+    "service": "GVBOT API",
+    "version": "2.0",
+    "status": "online",
+    "endpoints": [
+        "/health",
+        "/stats",
+        "/api/discord/*",
+        "/api/jobs",
+        "/api/chantiers/{channel_id}/media",
+        "/api/media/{sha256}",
+        "/api/reports/{chantier}",
+        "/api/webhooks/{source}",
+        *(["/metrics"] if ENABLE_METRICS else [])
+    ]
+})
+
 @api_app.get("/")
-async def api_root():
+async def api_root(request: Request):
     """Root API endpoint"""
-    return {
-        "service": "GVBOT API",
-        "version": "2.0",
-        "status": "online",
-        "endpoints": [
-            "/health",
-            "/stats",
-            "/api/discord/*",
-            "/metrics" if ENABLE_METRICS else None
-        ]
-    }
+    return json_response(request, API_ROOT, max_age=300)
 
 @api_app.get("/health")
 async def api_health():
@@ -604,7 +1828,7 @@ async def api_health():
     # Check DB
     db_ok = False
     try:
-        async with db_pool.acquire() as conn:
+        async with services.db.acquire(timeout=2) as conn:
             await conn.fetchval('SELECT 1')
         db_ok = True
     except:
@@ -613,14 +1837,14 @@ async def api_health():
     # Check Redis
     redis_ok = False
     try:
-        await redis_client.ping()
+        await services.redis.ping()
         redis_ok = True
     except:
         pass
     
     status_code = 200 if (bot_ok and db_ok and redis_ok) else 503
     
-    return JSONResponse(
+    return FastJSONResponse(
         status_code=status_code,
         content={
             "status": "healthy" if status_code == 200 else "unhealthy",
@@ -628,13 +1852,18 @@ async def api_health():
             "database": "ok" if db_ok else "error",
             "redis": "ok" if redis_ok else "error",
             "latency_ms": round(bot.latency * 1000, 2) if bot_ok else None,
+            "pools": {name: pool.stats() for name, pool in services.pools().items() if hasattr(pool, 'stats')},
+            "logs": {**log_sink.stats, "pending": log_sink.pending},
             "timestamp": datetime.utcnow().isoformat()
         }
     )
 
+async def _load_stats() -> Payload:
+    return Payload(await stats_globales())
+
 @api_app.get("/stats")
-async def api_stats(authorization: str = Header(None)):
-    """Stats globales serveur"""
+async def api_stats(request: Request, authorization: str = Header(None)):
+    """Stats globales serveur (cache court + ETag : 304 si inchangées)"""
     
     # Vérifier API key
     if not authorization or not authorization.startswith("Bearer "):
@@ -645,13 +1874,11 @@ async def api_stats(authorization: str = Header(None)):
         raise HTTPException(status_code=401, detail="Invalid API key")
     
     try:
-        async with db_pool.acquire() as conn:
-            stats = await conn.fetchrow('SELECT * FROM stats_globales')
-        
-        return dict(stats)
-    
+        payload = await services.cache.get_or_load('api:stats', _load_stats, ttl=API_STATS_CACHE_SECONDS)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+    
+    return json_response(request, payload, minimum_size=API_COMPRESS_MIN_BYTES)
 
 @api_app.post("/api/discord/task")
 async def api_create_task(request: Request, authorization: str = Header(None)):
@@ -680,25 +1907,180 @@ async def api_create_task(request: Request, authorization: str = Header(None)):
         raise HTTPException(status_code=400, detail="Missing required fields")
     
     try:
-        async with db_pool.acquire() as conn:
-            task_id = await conn.fetchval('''
-                INSERT INTO tasks (user_id, user_name, assignee_id, assignee_name, description, chantier)
-                VALUES ($1, $2, $3, $4, $5, $6)
-                RETURNING id
-            ''', 
-                int(user_id),
-                data.get('user_name', 'API'),
-                int(assignee_id),
-                data.get('assignee_name', 'Unknown'),
-                description,
-                chantier
-            )
-        
+        task_id = await create_task(
+            int(user_id),
+            data.get('user_name', 'API'),
+            int(assignee_id),
+            data.get('assignee_name', 'Unknown'),
+            description,
+            chantier
+        )
         return {"success": True, "task_id": task_id}
     
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@api_app.post("/api/webhooks/{source}", status_code=202)
+async def api_webhook(source: str, request: Request):
+    """Événement externe signé (HMAC) : mis en file, traité par les workers"""
+    
+    if not INBOUND_ENABLED:
+        raise HTTPException(status_code=503, detail="Webhooks disabled")
+    if int(request.headers.get('content-length') or 0) > INBOUND_MAX_BYTES:
+        raise HTTPException(status_code=413, detail="Payload too large")
+    
+    try:
+        entry_id = await webhooks.accept(source, await request.body(), request.headers)
+    except WebhookError as e:
+        raise HTTPException(status_code=e.status, detail=e.reason)
+    
+    return FastJSONResponse({"accepted": True, "id": entry_id}, status_code=202)
+
+@api_app.get("/api/webhooks")
+async def api_webhooks_status(authorization: str = Header(None)):
+    """File des webhooks : retard, en attente, lettres mortes"""
+    
+    if not authorization or not authorization.startswith("Bearer "):
+        raise HTTPException(status_code=401, detail="Unauthorized")
+    
+    token = authorization.replace("Bearer ", "")
+    if token != API_KEY:
+        raise HTTPException(status_code=401, detail="Invalid API key")
+    
+    try:
+        state = await webhooks.status(dead_limit=20)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    return {"sources": sorted(INBOUND_SOURCES), **state}
+
+@api_app.get("/api/jobs")
+async def api_jobs(request: Request, authorization: str = Header(None), job: Optional[str] = None, limit: int = 20):
+    """Tâches planifiées + dernières exécutions"""
+    
+    if not authorization or not authorization.startswith("Bearer "):
+        raise HTTPException(status_code=401, detail="Unauthorized")
+    
+    token = authorization.replace("Bearer ", "")
+    if token != API_KEY:
+        raise HTTPException(status_code=401, detail="Invalid API key")
+    
+    try:
+        runs = await scheduler.history(job, limit=min(limit, 200))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    
+    return json_response(request, {"jobs": scheduler.describe(), "runs": runs}, minimum_size=API_COMPRESS_MIN_BYTES)
+
+@api_app.post("/api/jobs/{name}/run")
+async def api_run_job(name: str, authorization: str = Header(None)):
+    """Lancer une tâche planifiée immédiatement"""
+    
+    if not authorization or not authorization.startswith("Bearer "):
+        raise HTTPException(status_code=401, detail="Unauthorized")
+    
+    token = authorization.replace("Bearer ", "")
+    if token != API_KEY:
+        raise HTTPException(status_code=401, detail="Invalid API key")
+    
+    if not await scheduler.trigger(name):
+        raise HTTPException(status_code=404, detail="Unknown job")
+    
+    return FastJSONResponse(status_code=202, content={"success": True, "job": name})
+
+@api_app.get("/api/chantiers/{channel_id}/media")
+async def api_chantier_media(request: Request, channel_id: int, authorization: str = Header(None), limit: int = 50, before: Optional[int] = None):
+    """Photos / documents d'un channel chantier (pagination : ?before=<attachment_id>)"""
+    
+    if not authorization or not authorization.startswith("Bearer "):
+        raise HTTPException(status_code=401, detail="Unauthorized")
+    
+    token = authorization.replace("Bearer ", "")
+    if token != API_KEY:
+        raise HTTPException(status_code=401, detail="Invalid API key")
+    
+    limit = max(1, min(limit, 200))
+    try:
+        items = await media.list_for_channel(services.reader, channel_id, limit=limit, before=before)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    
+    for item in items:
+        item['url'] = f"/api/media/{item['sha256']}"
+        item['thumbnail_url'] = f"/api/media/{item['sha256']}?thumbnail=true" if item['has_thumbnail'] else None
+    
+    return json_response(request, {
+        "channel_id": channel_id,
+        "media": items,
+        "next_before": items[-1]['attachment_id'] if len(items) == limit else None
+    }, minimum_size=API_COMPRESS_MIN_BYTES)
+
+@api_app.get("/api/reports/{chantier}")
+async def api_report(request: Request, chantier: str, authorization: str = Header(None), week: Optional[str] = None, format: str = 'json'):
+    """Rapport hebdomadaire d'un chantier (?week=2026-W41&format=json|csv|html, défaut : semaine passée)"""
+    
+    if not authorization or not authorization.startswith("Bearer "):
+        raise HTTPException(status_code=401, detail="Unauthorized")
+    
+    token = authorization.replace("Bearer ", "")
+    if token != API_KEY:
+        raise HTTPException(status_code=401, detail="Invalid API key")
+    
+    if not REPORTS_ENABLED:
+        raise HTTPException(status_code=503, detail="Reports disabled")
+    if format not in ('json',) + REPORT_FORMATS:
+        raise HTTPException(status_code=400, detail="Invalid format")
+    try:
+        year, week_number = parse_week(week)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    try:
+        target = next((c for c in await active_chantiers() if c['nom'] == chantier.lower()), None)
+        if target is None:
+            raise HTTPException(status_code=404, detail="Unknown chantier")
+        report = await reports.report(target['nom'], target['channel_id'], year, week_number)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    
+    if format == 'json':
+        return json_response(request, report.summary, minimum_size=API_COMPRESS_MIN_BYTES)
+    return FileResponse(
+        report.files[format],
+        media_type=REPORT_MEDIA_TYPES[format],
+        filename=f"rapport-{slugify(report.chantier)}-{report.label}.{format}"
+    )
+
+@api_app.get("/api/media/{sha256}")
+async def api_media_file(sha256: str, authorization: str = Header(None), thumbnail: bool = False):
+    """Fichier (ou miniature) par empreinte SHA-256"""
+    
+    if not authorization or not authorization.startswith("Bearer "):
+        raise HTTPException(status_code=401, detail="Unauthorized")
+    
+    token = authorization.replace("Bearer ", "")
+    if token != API_KEY:
+        raise HTTPException(status_code=401, detail="Invalid API key")
+    
+    if len(sha256) != 64 or any(c not in '0123456789abcdef' for c in sha256):
+        raise HTTPException(status_code=400, detail="Invalid hash")
+    
+    async with services.reader.acquire() as conn:
+        row = await conn.fetchrow('SELECT extension, content_type FROM media_files WHERE sha256 = $1', sha256)
+    if not row:
+        raise HTTPException(status_code=404, detail="Unknown media")
+    
+    if thumbnail:
+        path, media_type = media.thumbnail_for(sha256), 'image/jpeg'
+    else:
+        path, media_type = media.path_for(sha256, row['extension']), row['content_type']
+    if not os.path.exists(path):
+        raise HTTPException(status_code=404, detail="File missing")
+    
+    # Contenu adressé par empreinte : immuable
+    return FileResponse(path, media_type=media_type, headers={"Cache-Control": "private, max-age=31536000, immutable"})
+
 # Prometheus metrics endpoint
 if ENABLE_METRICS:
     @api_app.get("/metrics")
@@ -729,7 +2111,7 @@ async def main():
     """Point d'entrée principal"""
     
     # Vérifier variables
-    if not all([DISCORD_TOKEN, DB_PASS, REDIS_PASS, API_KEY]):
+    if not all([DISCORD_TOKEN, API_KEY]) or not (USE_FAKE_BACKENDS or all([DB_PASS, REDIS_PASS])):
         logger.error("missing_env_vars", message="DISCORD_TOKEN, DB_PASS, REDIS_PASS, API_KEY requis")
         sys.exit(1)
     
@@ -741,9 +2123,21 @@ async def main():
         async with bot:
             await bot.start(DISCORD_TOKEN)
     finally:
+        await extension_manager.stop_watching()
+        await scheduler.stop()
+        await reminders.stop()
+        await moderation.stop()
+        await media.stop()
+        await tracker.stop()
+        await reports.stop()
+        await guild_config.stop()
+        await warmer.stop()
+        await webhooks.stop()
+        await query_observer.stop()
         await close_db()
         await close_redis()
         api_task.cancel()
+        log_sink.close()
 
 if __name__ == "__main__":
     try:
@@ -2,7 +2,7 @@
 # -*- coding: utf-8 -*-
 """
 ================================================================
-ADMIN MIGRATION - Module administration serveur Discord
+COMMANDS ADMIN - Module administration serveur Discord
 ================================================================
 """
 
@@ -11,12 +11,19 @@ from discord.ext import commands
 from datetime import datetime
 import json
 from typing import Optional
+import structlog
+
+logger = structlog.get_logger(__name__)
+
+# Connexions DB max pour ce cog (voir extensions.py)
+DB_QUOTA = 2
 
 class AdminMigration(commands.Cog):
     """Module d'administration serveur Discord"""
     
     def __init__(self, bot):
         self.bot = bot
+        self.db = bot.extension_manager.pool_for(__name__)
     
     @commands.command(name='auditserveur')
     @commands.has_permissions(administrator=True)
@@ -136,15 +143,16 @@ class AdminMigration(commands.Cog):
             
             await ctx.send(embed=embed)
             
-            # Log dans PostgreSQL (si disponible)
+            # Log dans PostgreSQL
             try:
-                async with self.bot.db_pool.acquire() as conn:
-                    await conn.execute('''
+                async with self.db.unit_of_work() as uow:
+                    uow.execute('''
                         INSERT INTO chantiers (nom, channel_id, status, created_at)
                         VALUES ($1, $2, 'actif', NOW())
                     ''', nom.lower(), channel.id)
-            except:
-                pass
+                self.bot.services.cache.invalidate('chantiers:actifs')
+            except Exception as e:
+                logger.error("chantier_insert_failed", error=str(e), channel_id=channel.id)
         
         except Exception as e:
             await ctx.send(f"❌ Erreur création channel : {str(e)}")
@@ -194,14 +202,15 @@ class AdminMigration(commands.Cog):
             
             # Update DB
             try:
-                async with self.bot.db_pool.acquire() as conn:
-                    await conn.execute('''
+                async with self.db.unit_of_work() as uow:
+                    uow.execute('''
                         UPDATE chantiers 
                         SET status = 'archivé', archived_at = NOW()
                         WHERE channel_id = $1
                     ''', channel.id)
-            except:
-                pass
+                self.bot.services.cache.invalidate('chantiers:actifs')
+            except Exception as e:
+                logger.error("chantier_archive_update_failed", error=str(e), channel_id=channel.id)
         
         except Exception as e:
             await ctx.send(f"❌ Erreur archivage : {str(e)}")
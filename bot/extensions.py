@@ -0,0 +1,348 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+================================================================
+EXTENSIONS - Découverte, chargement et hot-reload des cogs
+================================================================
+Chaque module de cogs/ peut déclarer au niveau module :
+    DEPENDENCIES = ['cogs.commands_admin']   # chargées avant
+    DB_QUOTA = 3                             # connexions DB max
+Les déclarations sont lues par ast (sans importer le module),
+les cogs sont chargés par niveaux de dépendances en parallèle.
+================================================================
+"""
+
+import os
+import ast
+import time
+import asyncio
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from typing import Optional, List, Dict, Callable, Set
+
+from discord.ext import commands
+import structlog
+
+from services import UnitOfWork
+
+logger = structlog.get_logger(__name__)
+
+# ================================================================
+# BUDGETS PAR COG
+# ================================================================
+
+@dataclass
+class CogStats:
+    """Métriques d'un cog"""
+    status: str = 'discovered'      # discovered | loaded | failed | skipped
+    error: Optional[str] = None
+    load_seconds: float = 0.0
+    db_acquires: int = 0
+    db_wait_seconds: float = 0.0
+    db_wait_max: float = 0.0
+    db_hold_seconds: float = 0.0
+    commands: int = 0
+    command_errors: int = 0
+    command_seconds: float = 0.0
+
+class QuotaPool:
+    """Accès au pool partagé limité à `limit` connexions pour un cog"""
+
+    def __init__(self, name: str, pool_getter: Callable, limit: int, stats: CogStats, on_timing: Optional[Callable] = None):
+        self.name = name
+        self.pool_getter = pool_getter
+        self.limit = limit
+        self.stats = stats
+        self.on_timing = on_timing
+        self._semaphore = asyncio.Semaphore(limit)
+
+    @asynccontextmanager
+    async def acquire(self, timeout: Optional[float] = None):
+        """Acquérir une connexion dans la limite du quota du cog"""
+        start = time.perf_counter()
+        async with self._semaphore:
+            pool = self.pool_getter()
+            if pool is None:
+                raise RuntimeError("Base de données non initialisée")
+
+            async with pool.acquire(timeout=timeout) as conn:
+                waited = time.perf_counter() - start
+                self.stats.db_acquires += 1
+                self.stats.db_wait_seconds += waited
+                self.stats.db_wait_max = max(self.stats.db_wait_max, waited)
+                if self.on_timing:
+                    self.on_timing(self.name, 'db_wait', waited)
+
+                held_since = time.perf_counter()
+                try:
+                    yield conn
+                finally:
+                    held = time.perf_counter() - held_since
+                    self.stats.db_hold_seconds += held
+                    if self.on_timing:
+                        self.on_timing(self.name, 'db_hold', held)
+
+    def unit_of_work(self) -> UnitOfWork:
+        """Unit-of-work sur une connexion du quota"""
+        return UnitOfWork(self)
+
+# ================================================================
+# MANAGER
+# ================================================================
+
+@dataclass
+class ExtensionInfo:
+    """Extension découverte sur disque"""
+    name: str
+    path: str
+    mtime: float
+    dependencies: List[str] = field(default_factory=list)
+    db_quota: Optional[int] = None
+
+def _read_declarations(path: str) -> Dict[str, object]:
+    """Lire DEPENDENCIES / DB_QUOTA sans importer le module"""
+    with open(path, 'r', encoding='utf-8') as f:
+        tree = ast.parse(f.read(), filename=path)
+
+    declarations = {}
+    for node in tree.body:
+        if isinstance(node, ast.Assign) and len(node.targets) == 1 and isinstance(node.targets[0], ast.Name):
+            name = node.targets[0].id
+            if name in ('DEPENDENCIES', 'DB_QUOTA'):
+                try:
+                    declarations[name] = ast.literal_eval(node.value)
+                except ValueError:
+                    logger.error("extension_declaration_invalid", path=path, name=name)
+    return declarations
+
+class ExtensionManager:
+    """Chargement ordonné + hot-reload des cogs"""
+
+    def __init__(
+        self,
+        bot: commands.Bot,
+        pool_getter: Callable,
+        package: str = 'cogs',
+        directory: Optional[str] = None,
+        default_db_quota: int = 5,
+        on_timing: Optional[Callable] = None,
+    ):
+        self.bot = bot
+        self.pool_getter = pool_getter
+        self.package = package
+        self.directory = directory or os.path.join(os.path.dirname(os.path.abspath(__file__)), package)
+        self.default_db_quota = default_db_quota
+        self.on_timing = on_timing
+
+        self.extensions: Dict[str, ExtensionInfo] = {}
+        self.stats: Dict[str, CogStats] = {}
+        self._pools: Dict[str, QuotaPool] = {}
+        self._watch_task: Optional[asyncio.Task] = None
+
+        bot.add_listener(self._on_command, 'on_command')
+        bot.add_listener(self._on_command_completion, 'on_command_completion')
+        bot.add_listener(self._on_command_error, 'on_command_error')
+
+    # === Découverte ===
+
+    def discover(self) -> Dict[str, ExtensionInfo]:
+        """Scanner le dossier des cogs"""
+        found = {}
+        for entry in os.scandir(self.directory):
+            if not entry.is_file() or not entry.name.endswith('.py') or entry.name.startswith('_'):
+                continue
+
+            name = f"{self.package}.{entry.name[:-3]}"
+            try:
+                declarations = _read_declarations(entry.path)
+            except SyntaxError as e:
+                logger.error("extension_parse_failed", extension=name, error=str(e))
+                declarations = {}
+
+            found[name] = ExtensionInfo(
+                name=name,
+                path=entry.path,
+                mtime=entry.stat().st_mtime,
+                dependencies=list(declarations.get('DEPENDENCIES', [])),
+                db_quota=declarations.get('DB_QUOTA')
+            )
+        return found
+
+    def resolve(self, extensions: Dict[str, ExtensionInfo]) -> List[List[str]]:
+        """Tri topologique par niveaux (chaque niveau se charge en parallèle)"""
+        pending = {name: set(info.dependencies) for name, info in extensions.items()}
+        levels = []
+
+        # Dépendances inconnues : extension ignorée
+        for name, deps in list(pending.items()):
+            missing = deps - set(extensions)
+            if missing:
+                self._stat(name).status = 'skipped'
+                self._stat(name).error = f"dépendances manquantes : {', '.join(sorted(missing))}"
+                logger.error("extension_dependency_missing", extension=name, missing=sorted(missing))
+                del pending[name]
+
+        resolved: Set[str] = set()
+        while pending:
+            level = sorted(name for name, deps in pending.items() if deps <= resolved)
+            if not level:
+                for name in pending:
+                    self._stat(name).status = 'skipped'
+                    self._stat(name).error = "dépendance circulaire"
+                logger.error("extension_dependency_cycle", extensions=sorted(pending))
+                break
+            levels.append(level)
+            resolved.update(level)
+            for name in level:
+                del pending[name]
+        return levels
+
+    # === Chargement ===
+
+    async def load_all(self):
+        """Découvrir et charger toutes les extensions"""
+        self.extensions = self.discover()
+        failed: Set[str] = set()
+
+        for level in self.resolve(self.extensions):
+            runnable = []
+            for name in level:
+                blocked = set(self.extensions[name].dependencies) & failed
+                if blocked:
+                    failed.add(name)
+                    self._stat(name).status = 'skipped'
+                    self._stat(name).error = f"dépendance en échec : {', '.join(sorted(blocked))}"
+                else:
+                    runnable.append(name)
+
+            results = await asyncio.gather(*(self._load(name) for name in runnable))
+            failed.update(name for name, ok in zip(runnable, results) if not ok)
+
+    async def _load(self, name: str, reload: bool = False) -> bool:
+        """Charger (ou recharger) une extension"""
+        stats = self._stat(name)
+        start = time.perf_counter()
+        try:
+            if reload and name in self.bot.extensions:
+                await self.bot.reload_extension(name)
+            else:
+                await self.bot.load_extension(name)
+        except Exception as e:
+            stats.status = 'failed'
+            stats.error = str(e)
+            logger.error("extension_load_failed", extension=name, error=str(e))
+            return False
+
+        stats.load_seconds = time.perf_counter() - start
+        stats.status = 'loaded'
+        stats.error = None
+        logger.info("extension_loaded", extension=name, reload=reload, seconds=round(stats.load_seconds, 3))
+        return True
+
+    def dependents(self, name: str) -> List[str]:
+        """Extensions qui dépendent (transitivement) de `name`"""
+        result, stack = [], [name]
+        while stack:
+            current = stack.pop()
+            for other, info in self.extensions.items():
+                if current in info.dependencies and other not in result:
+                    result.append(other)
+                    stack.append(other)
+        return result
+
+    async def reload(self, name: str) -> bool:
+        """Recharger une extension puis ses dépendants"""
+        if name not in self.extensions:
+            return False
+        ok = await self._load(name, reload=True)
+        if ok:
+            for dependent in self.dependents(name):
+                await self._load(dependent, reload=True)
+        return ok
+
+    # === Hot-reload ===
+
+    def start_watching(self, interval: float = 2.0):
+        """Surveiller les fichiers des cogs (mtime)"""
+        if self._watch_task is None or self._watch_task.done():
+            self._watch_task = asyncio.create_task(self._watch(interval))
+
+    async def stop_watching(self):
+        if self._watch_task:
+            self._watch_task.cancel()
+            await asyncio.gather(self._watch_task, return_exceptions=True)
+            self._watch_task = None
+
+    async def _watch(self, interval: float):
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self.sync()
+            except Exception as e:
+                logger.error("extension_watch_failed", error=str(e))
+
+    async def sync(self):
+        """Appliquer les changements disque : nouveaux, modifiés, supprimés"""
+        current = self.discover()
+
+        for name in set(self.extensions) - set(current):
+            if name in self.bot.extensions:
+                await self.bot.unload_extension(name)
+            self.stats.pop(name, None)
+            self._pools.pop(name, None)
+            logger.info("extension_unloaded", extension=name)
+
+        changed = [
+            name for name, info in current.items()
+            if name not in self.extensions or info.mtime != self.extensions[name].mtime
+        ]
+        self.extensions = current
+
+        for name in changed:
+            quota = self._pools.get(name)
+            if quota and current[name].db_quota and current[name].db_quota != quota.limit:
+                del self._pools[name]  # Nouveau quota au prochain pool_for()
+            await self.reload(name)
+
+    # === Ressources ===
+
+    def pool_for(self, cog_or_module) -> QuotaPool:
+        """Pool DB à quota pour un cog (instance ou nom de module)"""
+        name = cog_or_module if isinstance(cog_or_module, str) else type(cog_or_module).__module__
+        pool = self._pools.get(name)
+        if pool is None:
+            info = self.extensions.get(name)
+            limit = (info.db_quota if info and info.db_quota else None) or self.default_db_quota
+            pool = self._pools[name] = QuotaPool(name, self.pool_getter, limit, self._stat(name), self.on_timing)
+        return pool
+
+    def _stat(self, name: str) -> CogStats:
+        stats = self.stats.get(name)
+        if stats is None:
+            stats = self.stats[name] = CogStats()
+        return stats
+
+    # === Timing commandes ===
+
+    async def _on_command(self, ctx: commands.Context):
+        ctx.started_at = time.perf_counter()
+
+    async def _on_command_completion(self, ctx: commands.Context):
+        self._record_command(ctx, error=False)
+
+    async def _on_command_error(self, ctx: commands.Context, error):
+        self._record_command(ctx, error=True)
+
+    def _record_command(self, ctx: commands.Context, error: bool):
+        started_at = getattr(ctx, 'started_at', None)
+        if ctx.cog is None or started_at is None:
+            return
+        name = type(ctx.cog).__module__
+        elapsed = time.perf_counter() - started_at
+        stats = self._stat(name)
+        stats.commands += 1
+        stats.command_seconds += elapsed
+        if error:
+            stats.command_errors += 1
+        if self.on_timing:
+            self.on_timing(name, 'command', elapsed)
@@ -0,0 +1,537 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+================================================================
+FAKES - PostgreSQL / Redis en mémoire (tests de charge, bench)
+================================================================
+Même surface que asyncpg.Pool et redis.asyncio.Redis pour ce que
+le bot utilise. Les requêtes SQL sont enregistrées ; les réponses
+se programment par motif : pool.on('FROM stats_globales', {...}).
+================================================================
+"""
+
+import re
+import time
+import asyncio
+import fnmatch
+from collections import deque, defaultdict, namedtuple
+from contextlib import asynccontextmanager
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple, Union
+
+WHITESPACE_RE = re.compile(r'\s+')
+
+def _normalize(query: str) -> str:
+    return WHITESPACE_RE.sub(' ', query).strip()
+
+# Même champs que asyncpg.LoggedQuery
+LoggedQuery = namedtuple('LoggedQuery', 'query args timeout elapsed exception conn_addr conn_params')
+
+# ================================================================
+# POSTGRESQL
+# ================================================================
+
+class FakeTransaction:
+    """Transaction no-op"""
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        return False
+
+class FakeConnection:
+    """Connexion asyncpg simulée"""
+
+    def __init__(self, pool: "FakePool"):
+        self.pool = pool
+
+    async def _run(self, kind: str, query: str, args: Tuple, logged_args: Any = None) -> Any:
+        start = time.monotonic()
+        exception = None
+        try:
+            if self.pool.latency:
+                await asyncio.sleep(self.pool.latency)
+            return self.pool._respond(kind, query, args)
+        except BaseException as e:
+            exception = e
+            raise
+        finally:
+            if self.pool.query_loggers:
+                record = LoggedQuery(query, args if logged_args is None else logged_args, None,
+                                     time.monotonic() - start, exception, None, None)
+                loop = asyncio.get_running_loop()
+                for callback in self.pool.query_loggers:
+                    loop.call_soon(callback, record)
+
+    async def execute(self, query: str, *args, timeout: Optional[float] = None) -> str:
+        result = await self._run('execute', query, args)
+        return result if isinstance(result, str) else 'OK'
+
+    async def executemany(self, query: str, args, timeout: Optional[float] = None):
+        rows = list(args)
+        await self._run('executemany', query, tuple(rows), logged_args=rows)
+
+    async def fetch(self, query: str, *args, timeout: Optional[float] = None) -> List[Dict]:
+        result = await self._run('fetch', query, args)
+        return list(result) if result else []
+
+    async def fetchrow(self, query: str, *args, timeout: Optional[float] = None) -> Optional[Dict]:
+        result = await self._run('fetchrow', query, args)
+        if isinstance(result, list):
+            return result[0] if result else None
+        return result
+
+    async def fetchval(self, query: str, *args, column: int = 0, timeout: Optional[float] = None) -> Any:
+        result = await self._run('fetchval', query, args)
+        if isinstance(result, dict):
+            return list(result.values())[column]
+        return result
+
+    async def copy_from_query(self, query: str, *args, output, format: Optional[str] = None,
+                              timeout: Optional[float] = None) -> str:
+        """Réponse programmée : bytes ou liste de lignes (bytes), écrite dans output"""
+        result = await self._run('copy', query, args)
+        lines = result if isinstance(result, list) else ([result] if result else [])
+        data = b''.join(line if line.endswith(b'\n') else line + b'\n' for line in lines)
+        if callable(output):
+            for i in range(0, len(data), 65536):
+                await output(data[i:i + 65536])
+        else:
+            output.write(data)
+        return f'COPY {len(lines)}'
+
+    async def copy_to_table(self, table_name: str, *, source, columns: Optional[List[str]] = None,
+                            schema_name: Optional[str] = None, format: Optional[str] = None,
+                            timeout: Optional[float] = None) -> str:
+        """Données lues (source : bytes, fichier ou itérable asynchrone) et enregistrées"""
+        if hasattr(source, '__aiter__'):
+            data = b''.join([chunk async for chunk in source])
+        elif hasattr(source, 'read'):
+            data = source.read()
+        else:
+            data = bytes(source)
+        table = f'{schema_name}.{table_name}' if schema_name else table_name
+        await self._run('copy', f"COPY {table} ({', '.join(columns or [])}) FROM STDIN", (data,))
+        return f'COPY {len(data.splitlines())}'
+
+    def transaction(self, **kwargs) -> FakeTransaction:
+        return FakeTransaction()
+
+    async def close(self):
+        pass
+
+    def add_query_logger(self, callback: Callable):
+        # Connexions simulées sans état propre : loggers partagés par le pool
+        self.pool.query_loggers.add(callback)
+
+    def remove_query_logger(self, callback: Callable):
+        self.pool.query_loggers.discard(callback)
+
+class FakePool:
+    """Pool asyncpg simulé : enregistre les requêtes, réponses programmables"""
+
+    def __init__(self, max_size: int = 20, latency: float = 0.0, history: int = 10000,
+                 setup: Optional[Callable[[FakeConnection], Awaitable]] = None):
+        self.max_size = max_size
+        self.latency = latency
+        self.setup = setup                  # Comme asyncpg.create_pool(setup=...)
+        self.query_loggers: set = set()
+        self.statements: deque = deque(maxlen=history)
+        self.counts: Dict[str, int] = defaultdict(int)
+        self.closed = False
+
+        self._semaphore = asyncio.Semaphore(max_size)
+        self._in_use = 0
+        self._handlers: List[Tuple[str, Union[Any, Callable]]] = []
+
+        # Réponses par défaut
+        self.on('SELECT version()', 'PostgreSQL (fake)')
+        self.on('SELECT 1', 1)
+        self.on('UPDATE scheduled_jobs SET last_scheduled_at', lambda kind, query, args: args[0])
+        self.on('pg_try_advisory_lock', True)
+        self.on('FROM stats_globales', {
+            'total_messages': 0,
+            'tasks_todo': 0,
+            'chantiers_actifs': 0,
+        })
+
+    def on(self, pattern: str, response: Union[Any, Callable]):
+        """Réponse pour les requêtes contenant `pattern` (dernière déclarée prioritaire)
+
+        response peut être une valeur ou un callable(kind, query, args).
+        """
+        self._handlers.insert(0, (pattern, response))
+
+    def _respond(self, kind: str, query: str, args: Tuple) -> Any:
+        normalized = _normalize(query)
+        self.statements.append((kind, normalized, args))
+        self.counts[normalized.split(' ', 1)[0].upper()] += 1
+
+        for pattern, response in self._handlers:
+            if pattern in normalized:
+                return response(kind, normalized, args) if callable(response) else response
+        return None
+
+    @asynccontextmanager
+    async def acquire(self, timeout: Optional[float] = None):
+        if self.closed:
+            raise RuntimeError("pool is closed")
+        async with self._semaphore:
+            self._in_use += 1
+            try:
+                conn = FakeConnection(self)
+                if self.setup is not None:
+                    await self.setup(conn)
+                yield conn
+            finally:
+                self._in_use -= 1
+
+    async def connect(self) -> FakeConnection:
+        """Connexion hors pool (comme asyncpg.connect)"""
+        conn = FakeConnection(self)
+        if self.setup is not None:
+            await self.setup(conn)
+        return conn
+
+    def get_size(self) -> int:
+        return self.max_size
+
+    def get_max_size(self) -> int:
+        return self.max_size
+
+    def get_idle_size(self) -> int:
+        return self.max_size - self._in_use
+
+    async def execute(self, query: str, *args, timeout: Optional[float] = None) -> str:
+        async with self.acquire() as conn:
+            return await conn.execute(query, *args)
+
+    async def fetch(self, query: str, *args, timeout: Optional[float] = None):
+        async with self.acquire() as conn:
+            return await conn.fetch(query, *args)
+
+    async def fetchrow(self, query: str, *args, timeout: Optional[float] = None):
+        async with self.acquire() as conn:
+            return await conn.fetchrow(query, *args)
+
+    async def fetchval(self, query: str, *args, timeout: Optional[float] = None):
+        async with self.acquire() as conn:
+            return await conn.fetchval(query, *args)
+
+    async def close(self):
+        self.closed = True
+
+# ================================================================
+# REDIS
+# ================================================================
+
+class FakePipeline:
+    """Pipeline Redis simulé (commandes exécutées à execute())"""
+
+    def __init__(self, redis: "FakeRedis"):
+        self._redis = redis
+        self._calls: List[Tuple[str, Tuple, Dict]] = []
+
+    def __getattr__(self, name: str):
+        if not hasattr(self._redis, name):
+            raise AttributeError(name)
+
+        def _queue(*args, **kwargs):
+            self._calls.append((name, args, kwargs))
+            return self
+        return _queue
+
+    async def execute(self) -> List[Any]:
+        calls, self._calls = self._calls, []
+        return [await getattr(self._redis, name)(*args, **kwargs) for name, args, kwargs in calls]
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        return False
+
+class FakeRedis:
+    """Client Redis en mémoire (decode_responses=True)"""
+
+    def __init__(self):
+        self._data: Dict[str, Any] = {}
+        self._expires: Dict[str, float] = {}
+        self._last_save = 0
+        self._stream_added = asyncio.Event()   # Réveil des XREADGROUP bloquants
+
+    def _alive(self, key: str) -> bool:
+        expires = self._expires.get(key)
+        if expires is not None and expires <= time.monotonic():
+            self._data.pop(key, None)
+            self._expires.pop(key, None)
+        return key in self._data
+
+    def _ttl(self, key: str, ex: Optional[float] = None, px: Optional[float] = None):
+        if ex is not None:
+            self._expires[key] = time.monotonic() + ex
+        elif px is not None:
+            self._expires[key] = time.monotonic() + px / 1000
+        else:
+            self._expires.pop(key, None)
+
+    # === Connexion ===
+
+    async def ping(self) -> bool:
+        return True
+
+    async def close(self):
+        pass
+
+    async def bgsave(self, schedule: bool = True) -> bool:
+        self._last_save = int(time.time())
+        return True
+
+    async def info(self, section: Optional[str] = None) -> Dict[str, Any]:
+        return {
+            'rdb_bgsave_in_progress': 0,
+            'rdb_last_save_time': self._last_save,
+            'rdb_last_bgsave_status': 'ok',
+        }
+
+    def pipeline(self, transaction: bool = True) -> FakePipeline:
+        return FakePipeline(self)
+
+    # === Clés ===
+
+    async def get(self, key: str) -> Optional[str]:
+        return self._data.get(key) if self._alive(key) else None
+
+    async def set(self, key: str, value: Any, ex: Optional[float] = None, px: Optional[float] = None,
+                  nx: bool = False, xx: bool = False) -> Optional[bool]:
+        exists = self._alive(key)
+        if (nx and exists) or (xx and not exists):
+            return None
+        self._data[key] = str(value)
+        self._ttl(key, ex, px)
+        return True
+
+    async def delete(self, *keys: str) -> int:
+        deleted = 0
+        for key in keys:
+            if self._alive(key):
+                del self._data[key]
+                self._expires.pop(key, None)
+                deleted += 1
+        return deleted
+
+    async def exists(self, *keys: str) -> int:
+        return sum(1 for key in keys if self._alive(key))
+
+    async def expire(self, key: str, seconds: float) -> bool:
+        if not self._alive(key):
+            return False
+        self._ttl(key, ex=seconds)
+        return True
+
+    async def pexpire(self, key: str, milliseconds: float) -> bool:
+        if not self._alive(key):
+            return False
+        self._ttl(key, px=milliseconds)
+        return True
+
+    async def keys(self, pattern: str = '*') -> List[str]:
+        return [key for key in list(self._data) if self._alive(key) and fnmatch.fnmatchcase(key, pattern)]
+
+    async def incr(self, key: str, amount: int = 1) -> int:
+        value = int(self._data.get(key, 0) if self._alive(key) else 0) + amount
+        self._data[key] = str(value)
+        return value
+
+    # === Sets ===
+
+    async def sadd(self, key: str, *members: Any) -> int:
+        if not self._alive(key):
+            self._data[key] = set()
+        current = self._data[key]
+        before = len(current)
+        current.update(str(m) for m in members)
+        return len(current) - before
+
+    async def scard(self, key: str) -> int:
+        return len(self._data[key]) if self._alive(key) else 0
+
+    async def smembers(self, key: str) -> set:
+        return set(self._data[key]) if self._alive(key) else set()
+
+    # === Hashes ===
+
+    async def hset(self, key: str, field: Optional[str] = None, value: Any = None, mapping: Optional[Dict] = None) -> int:
+        if not self._alive(key):
+            self._data[key] = {}
+        current = self._data[key]
+        items = dict(mapping or {})
+        if field is not None:
+            items[field] = value
+        added = sum(1 for f in items if f not in current)
+        current.update({str(f): str(v) for f, v in items.items()})
+        return added
+
+    async def hgetall(self, key: str) -> Dict[str, str]:
+        return dict(self._data[key]) if self._alive(key) else {}
+
+    # === Streams ===
+
+    def _stream(self, key: str, create: bool = False) -> Optional["FakeStream"]:
+        if not self._alive(key):
+            if not create:
+                return None
+            self._data[key] = FakeStream()
+        return self._data[key]
+
+    async def xadd(self, name: str, fields: Dict[str, Any], id: str = '*', maxlen: Optional[int] = None,
+                   approximate: bool = True) -> str:
+        stream = self._stream(name, create=True)
+        entry_id = stream.add({str(k): str(v) for k, v in fields.items()})
+        if maxlen is not None and len(stream.entries) > maxlen:
+            del stream.entries[:len(stream.entries) - maxlen]
+        self._stream_added.set()
+        self._stream_added = asyncio.Event()
+        return entry_id
+
+    async def xlen(self, name: str) -> int:
+        stream = self._stream(name)
+        return len(stream.entries) if stream else 0
+
+    async def xdel(self, name: str, *ids: str) -> int:
+        stream = self._stream(name)
+        if stream is None:
+            return 0
+        before = len(stream.entries)
+        stream.entries = [(entry_id, fields) for entry_id, fields in stream.entries if entry_id not in ids]
+        return before - len(stream.entries)
+
+    async def xrange(self, name: str, min: str = '-', max: str = '+', count: Optional[int] = None) -> List[Tuple[str, Dict]]:
+        stream = self._stream(name)
+        entries = stream.between(min, max) if stream else []
+        return [(entry_id, dict(fields)) for entry_id, fields in entries[:count]]
+
+    async def xrevrange(self, name: str, max: str = '+', min: str = '-', count: Optional[int] = None) -> List[Tuple[str, Dict]]:
+        stream = self._stream(name)
+        entries = list(reversed(stream.between(min, max))) if stream else []
+        return [(entry_id, dict(fields)) for entry_id, fields in entries[:count]]
+
+    async def xgroup_create(self, name: str, groupname: str, id: str = '$', mkstream: bool = False) -> bool:
+        stream = self._stream(name, create=mkstream)
+        if stream is None:
+            raise RuntimeError("ERR The XGROUP subcommand requires the key to exist")
+        if groupname in stream.groups:
+            raise RuntimeError("BUSYGROUP Consumer Group name already exists")
+        last = stream.last if id == '$' else FakeStream.parse(id)
+        stream.groups[groupname] = {'last': last, 'pending': {}}
+        return True
+
+    async def xreadgroup(self, groupname: str, consumername: str, streams: Dict[str, str], count: Optional[int] = None,
+                         block: Optional[int] = None, noack: bool = False) -> List[Tuple[str, List]]:
+        deadline = time.monotonic() + (block or 0) / 1000
+        while True:
+            response = []
+            for name in streams:
+                stream = self._stream(name)
+                group = stream.groups.get(groupname) if stream else None
+                if group is None:
+                    raise RuntimeError(f"NOGROUP No such key '{name}' or consumer group '{groupname}'")
+                entries = [(i, f) for i, f in stream.entries if FakeStream.parse(i) > group['last']][:count]
+                for entry_id, _ in entries:
+                    group['last'] = FakeStream.parse(entry_id)
+                    if not noack:
+                        group['pending'][entry_id] = [consumername, time.monotonic(), 1]
+                if entries:
+                    response.append((name, [(i, dict(f)) for i, f in entries]))
+            remaining = deadline - time.monotonic()
+            if response or block is None or remaining <= 0:
+                return response
+            try:
+                await asyncio.wait_for(self._stream_added.wait(), remaining)
+            except asyncio.TimeoutError:
+                pass
+
+    async def xack(self, name: str, groupname: str, *ids: str) -> int:
+        stream = self._stream(name)
+        group = stream.groups.get(groupname) if stream else None
+        if group is None:
+            return 0
+        return sum(1 for entry_id in ids if group['pending'].pop(entry_id, None) is not None)
+
+    async def xpending_range(self, name: str, groupname: str, min: str, max: str, count: int,
+                             consumername: Optional[str] = None, idle: Optional[int] = None) -> List[Dict[str, Any]]:
+        stream = self._stream(name)
+        group = stream.groups.get(groupname) if stream else None
+        if group is None:
+            return []
+        now = time.monotonic()
+        low, high = FakeStream.bound(min, 0), FakeStream.bound(max, float('inf'))
+        items = []
+        for entry_id, (consumer, delivered_at, deliveries) in sorted(group['pending'].items(), key=lambda i: FakeStream.parse(i[0])):
+            idle_ms = int((now - delivered_at) * 1000)
+            if not low <= FakeStream.parse(entry_id) <= high:
+                continue
+            if (consumername and consumer != consumername) or (idle is not None and idle_ms < idle):
+                continue
+            items.append({'message_id': entry_id, 'consumer': consumer,
+                          'time_since_delivered': idle_ms, 'times_delivered': deliveries})
+        return items[:count]
+
+    async def xclaim(self, name: str, groupname: str, consumername: str, min_idle_time: int,
+                     message_ids: List[str]) -> List[Tuple[str, Dict]]:
+        stream = self._stream(name)
+        group = stream.groups.get(groupname) if stream else None
+        if group is None:
+            return []
+        now = time.monotonic()
+        entries = dict(stream.entries)
+        claimed = []
+        for entry_id in message_ids:
+            item = group['pending'].get(entry_id)
+            if item is None or (now - item[1]) * 1000 < min_idle_time:
+                continue
+            if entry_id not in entries:
+                del group['pending'][entry_id]  # Supprimée du stream (Redis 7)
+                continue
+            group['pending'][entry_id] = [consumername, now, item[2] + 1]
+            claimed.append((entry_id, dict(entries[entry_id])))
+        return claimed
+
+    async def xinfo_groups(self, name: str) -> List[Dict[str, Any]]:
+        stream = self._stream(name)
+        if stream is None:
+            raise RuntimeError("ERR no such key")
+        return [
+            {'name': groupname, 'consumers': len({item[0] for item in group['pending'].values()}),
+             'pending': len(group['pending']), 'last-delivered-id': '%d-%d' % group['last'],
+             'lag': sum(1 for entry_id, _ in stream.entries if FakeStream.parse(entry_id) > group['last'])}
+            for groupname, group in stream.groups.items()
+        ]
+
+class FakeStream:
+    """Stream Redis : entrées ordonnées + groupes (dernier lu, entrées en attente)"""
+
+    def __init__(self):
+        self.entries: List[Tuple[str, Dict[str, str]]] = []
+        self.last: Tuple[int, int] = (0, 0)
+        self.groups: Dict[str, Dict[str, Any]] = {}
+
+    @staticmethod
+    def parse(entry_id: str) -> Tuple[int, int]:
+        ms, _, seq = entry_id.partition('-')
+        return int(ms), int(seq or 0)
+
+    @staticmethod
+    def bound(value: str, default: float):
+        return (default, default) if value in ('-', '+') else FakeStream.parse(value)
+
+    def add(self, fields: Dict[str, str]) -> str:
+        ms = int(time.time() * 1000)
+        self.last = (self.last[0], self.last[1] + 1) if ms <= self.last[0] else (ms, 0)
+        entry_id = '%d-%d' % self.last
+        self.entries.append((entry_id, fields))
+        return entry_id
+
+    def between(self, low: str, high: str) -> List[Tuple[str, Dict[str, str]]]:
+        start, end = self.bound(low, 0), self.bound(high, float('inf'))
+        return [(i, f) for i, f in self.entries if start <= self.parse(i) <= end]
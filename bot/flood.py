@@ -0,0 +1,208 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+================================================================
+FLOOD - Détection doublons / copier-coller multi-channels
+================================================================
+Index borné et fenêtré des empreintes de contenu par utilisateur :
+- empreinte exacte (blake2b 64 bits) -> lookup dict O(1)
+- SimHash 64 bits -> quasi-doublons (distance de Hamming)
+Mémoire fixe : max_users utilisateurs (LRU) x max_entries empreintes.
+Partage optionnel entre réplicas via Redis (empreintes exactes).
+================================================================
+"""
+
+import re
+import time
+import heapq
+import hashlib
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Optional, Callable, Set
+
+import structlog
+
+logger = structlog.get_logger(__name__)
+
+WORD_RE = re.compile(r'\w+', re.UNICODE)
+
+MASK_64 = (1 << 64) - 1
+SIMHASH_SAMPLE = 32
+
+# ================================================================
+# EMPREINTES
+# ================================================================
+
+def normalize(content: str) -> str:
+    """Normaliser avant hash (casse, espaces)"""
+    return ' '.join(content.lower().split())
+
+def fingerprint(normalized: str) -> int:
+    """Empreinte exacte 64 bits"""
+    return int.from_bytes(hashlib.blake2b(normalized.encode('utf-8'), digest_size=8).digest(), 'big')
+
+def simhash(normalized: str) -> int:
+    """SimHash 64 bits sur les mots (bigrammes si assez de mots)
+
+    Échantillon bottom-k des hash de tokens : coût borné quelle que
+    soit la longueur du message. hash() suffit, les SimHash ne sont
+    comparés qu'au sein du process.
+    """
+    words = WORD_RE.findall(normalized)
+    if len(words) > 3:
+        tokens = {f'{a} {b}' for a, b in zip(words, words[1:])}
+    else:
+        tokens = set(words)
+    if not tokens:
+        return 0
+
+    sample = heapq.nsmallest(SIMHASH_SAMPLE, (hash(token) & MASK_64 for token in tokens))
+    majority = len(sample) / 2
+
+    # Colonnes de bits : col[i] = bit 63-i de chaque hash
+    columns = zip(*(format(h, '064b') for h in sample))
+    value = 0
+    for col in columns:
+        value = (value << 1) | (col.count('1') > majority)
+    return value
+
+# ================================================================
+# INDEX
+# ================================================================
+
+@dataclass(frozen=True)
+class FloodResult:
+    """Résultat d'observation d'un message"""
+    count: int = 1              # Occurrences du contenu (ou voisin) dans la fenêtre
+    channels: int = 1           # Channels distincts concernés
+    near: bool = False          # Rapproché par SimHash, pas identique
+    same_channel: bool = False  # Déjà vu dans ce channel
+
+    @property
+    def duplicate(self) -> bool:
+        """Contenu identique déjà vu dans la fenêtre"""
+        return self.count > 1 and not self.near
+
+    @property
+    def duplicate_in_channel(self) -> bool:
+        """Contenu identique déjà vu dans la fenêtre, dans le même channel"""
+        return self.duplicate and self.same_channel
+
+class _Entry:
+    """Empreinte d'un contenu récent"""
+    __slots__ = ('last_seen', 'count', 'channels', 'simhash')
+
+    def __init__(self, now: float, channel_id: int, sim: int):
+        self.last_seen = now
+        self.count = 1
+        self.channels: Set[int] = {channel_id}
+        self.simhash = sim
+
+class FloodDetector:
+    """Index fenêtré des contenus récents par utilisateur"""
+
+    def __init__(
+        self,
+        window: float = 300.0,
+        max_users: int = 5000,
+        max_entries: int = 32,
+        max_channels: int = 16,
+        near_distance: int = 8,
+        min_length: int = 10,
+        redis_getter: Optional[Callable] = None,
+    ):
+        self.window = window
+        self.max_users = max_users
+        self.max_entries = max_entries
+        self.max_channels = max_channels
+        self.near_distance = near_distance
+        self.min_length = min_length
+        self.redis_getter = redis_getter
+
+        self._users: "OrderedDict[int, OrderedDict[int, _Entry]]" = OrderedDict()
+        self.evicted = 0
+
+    def observe_local(self, user_id: int, channel_id: int, content: str, now: Optional[float] = None) -> FloodResult:
+        """Enregistrer un message et retourner ses occurrences (local)"""
+        now = time.monotonic() if now is None else now
+        normalized = normalize(content or '')
+        if len(normalized) < self.min_length:
+            return FloodResult()
+
+        digest = fingerprint(normalized)
+
+        entries = self._users.get(user_id)
+        if entries is None:
+            entries = self._users[user_id] = OrderedDict()
+            if len(self._users) > self.max_users:
+                self._users.popitem(last=False)
+                self.evicted += 1
+        else:
+            self._users.move_to_end(user_id)
+
+        # Expiration : les entrées sont triées par dernière vue
+        while entries:
+            oldest = next(iter(entries.values()))
+            if now - oldest.last_seen <= self.window:
+                break
+            entries.popitem(last=False)
+
+        entry = entries.get(digest)
+        near = False
+        if entry is None:
+            # Quasi-doublon : comparaison SimHash sur max_entries au plus
+            sim = simhash(normalized)
+            match = next(
+                ((key, other) for key, other in entries.items()
+                 if (other.simhash ^ sim).bit_count() <= self.near_distance),
+                None
+            )
+            if match is None:
+                entries[digest] = _Entry(now, channel_id, sim)
+                if len(entries) > self.max_entries:
+                    entries.popitem(last=False)
+                    self.evicted += 1
+                return FloodResult()
+            digest, entry = match
+            near = True
+
+        entry.last_seen = now
+        entry.count += 1
+        same_channel = channel_id in entry.channels
+        if len(entry.channels) < self.max_channels:
+            entry.channels.add(channel_id)
+        entries.move_to_end(digest)
+        return FloodResult(count=entry.count, channels=len(entry.channels), near=near, same_channel=same_channel)
+
+    async def observe(self, user_id: int, channel_id: int, content: str, now: Optional[float] = None) -> FloodResult:
+        """Observer un message, compteurs partagés via Redis si disponible"""
+        result = self.observe_local(user_id, channel_id, content, now)
+
+        redis = self.redis_getter() if self.redis_getter else None
+        normalized = normalize(content or '')
+        if redis is None or result.near or len(normalized) < self.min_length:
+            return result
+
+        key = f"flood:{user_id}:{fingerprint(normalized):016x}"
+        ttl = int(self.window)
+        try:
+            pipe = redis.pipeline(transaction=False)
+            pipe.incr(f"{key}:n")
+            pipe.expire(f"{key}:n", ttl)
+            pipe.sadd(f"{key}:c", channel_id)
+            pipe.expire(f"{key}:c", ttl)
+            pipe.scard(f"{key}:c")
+            count, _, added, _, channels = await pipe.execute()
+        except Exception as e:
+            logger.error("flood_redis_failed", error=str(e))
+            return result
+
+        return FloodResult(
+            count=max(result.count, int(count)),
+            channels=max(result.channels, int(channels)),
+            near=result.near,
+            same_channel=result.same_channel or not int(added)
+        )
+
+    def __len__(self) -> int:
+        return sum(len(entries) for entries in self._users.values())
@@ -0,0 +1,256 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+================================================================
+GUILD CONFIG - Configuration par serveur (multi-agences)
+================================================================
+Channels et réglages de chaque serveur dans PostgreSQL
+(guild_settings), gardés en mémoire : une lecture par événement
+est un accès dict. Une écriture remplace l'entrée du cache et
+notifie les autres instances (NOTIFY guild_config). Les variables
+d'environnement (CHANNEL_*) restent la configuration par défaut
+du serveur GUILD_ID (ou de tous si GUILD_ID n'est pas défini).
+================================================================
+"""
+
+import asyncio
+import dataclasses
+from dataclasses import dataclass, field
+from typing import Optional, Dict, List, Set, Tuple, Callable, Awaitable, Iterable, Any
+
+import structlog
+
+from services import listen
+
+logger = structlog.get_logger(__name__)
+
+# ================================================================
+# SCHÉMA
+# ================================================================
+
+SCHEMA_SQL = '''
+CREATE TABLE IF NOT EXISTS guild_settings (
+    guild_id BIGINT PRIMARY KEY,
+    planning_channel_id BIGINT,
+    logs_channel_id BIGINT,
+    announce_channel_id BIGINT,
+    reminders_channel_id BIGINT,
+    chantiers TEXT[] NOT NULL DEFAULT '{}',     -- Filtre du planning hebdo (vide = tous)
+    retention_days INTEGER,                     -- Rétention messages plus courte que la globale
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+
+ALTER TABLE guild_settings ADD COLUMN IF NOT EXISTS reports_channel_id BIGINT;  -- Rapports hebdo (défaut : planning)
+'''
+
+NOTIFY_CHANNEL = 'guild_config'
+
+@dataclass(frozen=True)
+class GuildSettings:
+    """Réglages d'un serveur (immuable : remplacé en bloc dans le cache)"""
+    guild_id: int
+    planning_channel_id: Optional[int] = None
+    logs_channel_id: Optional[int] = None
+    announce_channel_id: Optional[int] = None
+    reminders_channel_id: Optional[int] = None
+    chantiers: Tuple[str, ...] = field(default_factory=tuple)
+    retention_days: Optional[int] = None
+    reports_channel_id: Optional[int] = None
+
+    @classmethod
+    def from_row(cls, row) -> 'GuildSettings':
+        return cls(**{name: row[name] for name in SETTINGS_FIELDS}, guild_id=row['guild_id']).normalized()
+
+    def normalized(self) -> 'GuildSettings':
+        return dataclasses.replace(self, chantiers=tuple(self.chantiers or ()))
+
+SETTINGS_FIELDS = [f.name for f in dataclasses.fields(GuildSettings) if f.name != 'guild_id']
+
+# ================================================================
+# CACHE
+# ================================================================
+
+class GuildConfigStore:
+    """Cache mémoire des réglages, rechargé à l'écriture"""
+
+    def __init__(
+        self,
+        pool_getter: Callable,
+        listen_connect: Optional[Callable[[], Awaitable]] = None,
+        defaults: Optional[Dict[str, Any]] = None,
+        default_guild_id: Optional[int] = None,
+    ):
+        self.pool_getter = pool_getter
+        self.listen_connect = listen_connect  # Connexion dédiée au LISTEN (hors pools)
+        self.defaults = defaults or {}
+        self.default_guild_id = default_guild_id or None
+        self._cache: Dict[int, GuildSettings] = {}
+        self._tasks: List[asyncio.Task] = []
+        self._refreshing: Set[asyncio.Task] = set()
+
+    # === Lecture ===
+
+    def get(self, guild_id: int) -> GuildSettings:
+        """Réglages d'un serveur (O(1), jamais d'accès base)"""
+        settings = self._cache.get(guild_id)
+        if settings is None:
+            settings = self._default(guild_id)
+            self._cache[guild_id] = settings
+        return settings
+
+    def _default(self, guild_id: int) -> GuildSettings:
+        if self.default_guild_id is None or guild_id == self.default_guild_id:
+            return GuildSettings(guild_id=guild_id, **self.defaults).normalized()
+        return GuildSettings(guild_id=guild_id)
+
+    def __len__(self):
+        return len(self._cache)
+
+    # === Cycle de vie ===
+
+    async def start(self, load: bool = True):
+        """Créer le schéma, charger tous les serveurs, écouter les modifications (idempotent)
+
+        load=False : réglages déjà chargés (préchargement, instantané).
+        """
+        if self._tasks:
+            return
+
+        if load:
+            try:
+                await self.load()
+            except Exception:
+                pass  # Journalisé par load() ; réglages par défaut en attendant
+        self._tasks.append(asyncio.create_task(self._listen()))
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks.clear()
+
+    async def load(self):
+        """Charger tous les serveurs (exception propagée : l'appelant sait que rien n'est chargé)"""
+        pool = self.pool_getter()
+        if pool is None:
+            raise RuntimeError("Base de données non initialisée")
+
+        try:
+            async with pool.acquire() as conn:
+                await conn.execute(SCHEMA_SQL)
+                rows = await conn.fetch('SELECT * FROM guild_settings')
+            cache = {row['guild_id']: GuildSettings.from_row(row) for row in rows}
+        except Exception as e:
+            logger.error("guild_config_load_failed", error=str(e))
+            raise
+
+        self._cache = cache
+        logger.info("guild_config_loaded", guilds=len(rows))
+
+    def snapshot(self) -> List[Dict[str, Any]]:
+        """Réglages enregistrés (hors défauts) : instantané de démarrage"""
+        return [
+            {**dataclasses.asdict(settings), 'chantiers': list(settings.chantiers)}
+            for settings in self._cache.values()
+            if settings != self._default(settings.guild_id)
+        ]
+
+    def restore(self, rows: Iterable[Dict[str, Any]]) -> bool:
+        """Charger un instantané (remplacé par load() dès que PostgreSQL répond)"""
+        self._cache = {row['guild_id']: GuildSettings.from_row(row) for row in rows}
+        return True
+
+    async def refresh(self, guild_id: int):
+        """Recharger un serveur depuis PostgreSQL (notification d'une autre instance)"""
+        pool = self.pool_getter()
+        if pool is None:
+            return
+
+        try:
+            async with pool.acquire() as conn:
+                row = await conn.fetchrow('SELECT * FROM guild_settings WHERE guild_id = $1', guild_id)
+        except Exception as e:
+            logger.error("guild_config_refresh_failed", guild_id=guild_id, error=str(e))
+            return
+
+        if row:
+            self._cache[guild_id] = GuildSettings.from_row(row)
+        else:
+            self._cache.pop(guild_id, None)
+
+    # === Écriture ===
+
+    async def update(self, guild_id: int, **changes) -> GuildSettings:
+        """Modifier des réglages : écriture PostgreSQL puis remplacement de l'entrée en cache"""
+        unknown = set(changes) - set(SETTINGS_FIELDS)
+        if unknown:
+            raise ValueError(f"réglage inconnu : {', '.join(sorted(unknown))}")
+
+        pool = self.pool_getter()
+        if pool is None:
+            raise RuntimeError("Base de données non initialisée")
+
+        settings = dataclasses.replace(self.get(guild_id), **changes).normalized()
+        values = [getattr(settings, name) for name in SETTINGS_FIELDS]
+        values[SETTINGS_FIELDS.index('chantiers')] = list(settings.chantiers)
+
+        columns = ', '.join(SETTINGS_FIELDS)
+        placeholders = ', '.join(f'${i + 2}' for i in range(len(SETTINGS_FIELDS)))
+        assignments = ', '.join(f'{name} = EXCLUDED.{name}' for name in SETTINGS_FIELDS)
+
+        async with pool.acquire() as conn:
+            await conn.execute(f'''
+                INSERT INTO guild_settings (guild_id, {columns})
+                VALUES ($1, {placeholders})
+                ON CONFLICT (guild_id) DO UPDATE SET {assignments}, updated_at = NOW()
+            ''', guild_id, *values)
+            await conn.execute('SELECT pg_notify($1, $2)', NOTIFY_CHANNEL, str(guild_id))
+
+        self._cache[guild_id] = settings
+        logger.info("guild_config_updated", guild_id=guild_id, fields=sorted(changes))
+        return settings
+
+    async def _listen(self):
+        """LISTEN guild_config sur une connexion dédiée (sinon : cache local seul)
+
+        Après une reconnexion, rechargement complet : notifications manquées.
+        """
+        if self.listen_connect is None:
+            return
+
+        def _on_notify(connection, pid, channel, payload: str):
+            if payload.isdigit():
+                task = asyncio.create_task(self.refresh(int(payload)))
+                self._refreshing.add(task)
+                task.add_done_callback(self._refreshing.discard)
+
+        await listen(self.listen_connect, NOTIFY_CHANNEL, _on_notify, on_reconnect=self.load)
+
+# ================================================================
+# TÂCHES PAR SERVEUR
+# ================================================================
+
+async def for_each_guild(
+    guilds: Iterable,
+    func: Callable[[Any], Awaitable],
+    concurrency: int = 4,
+    job: str = 'guild_job',
+) -> Dict[int, BaseException]:
+    """Exécuter func(guild) sur tous les serveurs, au plus `concurrency` à la fois
+
+    Un échec n'interrompt pas les autres serveurs ; les erreurs sont
+    journalisées puis renvoyées par guild_id.
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+    errors: Dict[int, BaseException] = {}
+
+    async def _run(guild):
+        async with semaphore:
+            try:
+                await func(guild)
+            except Exception as e:
+                errors[guild.id] = e
+                logger.error("guild_job_failed", job=job, guild_id=guild.id, error=str(e))
+
+    await asyncio.gather(*(_run(guild) for guild in guilds))
+    return errors
@@ -0,0 +1,238 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+================================================================
+LOGSINK - Sortie de logs non bloquante (structlog)
+================================================================
+Dernier processeur structlog : l'événement est échantillonné puis
+déposé dans une file bornée. Un thread dédié encode (orjson),
+écrit sur stdout par lots et transfère les événements graves vers
+un webhook Discord ou un channel. La boucle asyncio n'écrit jamais.
+================================================================
+"""
+
+import sys
+import time
+import queue
+import asyncio
+import logging
+import threading
+from datetime import datetime, timezone
+from typing import Optional, Dict, List, Tuple, Callable, Awaitable, Any
+
+import structlog
+
+try:
+    import orjson
+
+    def _dumps(event: Dict[str, Any]) -> bytes:
+        return orjson.dumps(event, default=str)
+except ImportError:  # pragma: no cover
+    import json
+
+    def _dumps(event: Dict[str, Any]) -> bytes:
+        return json.dumps(event, default=str, ensure_ascii=False).encode('utf-8')
+
+LEVELS = {
+    'debug': logging.DEBUG,
+    'info': logging.INFO,
+    'warning': logging.WARNING,
+    'error': logging.ERROR,
+    'critical': logging.CRITICAL,
+}
+
+DISCORD_MESSAGE_LIMIT = 2000
+
+_STOP = object()
+
+class LogSink:
+    """Processeur structlog final : échantillonnage + file + thread d'écriture
+
+    structlog.configure(processors=[add_log_level, sink])
+    """
+
+    def __init__(
+        self,
+        queue_size: int = 10000,
+        sample_burst: int = 20,
+        sample_window: float = 10.0,
+        batch_size: int = 100,
+        flush_interval: float = 2.0,
+        stream=None,
+        forward_level: str = 'error',
+        webhook_url: Optional[str] = None,
+    ):
+        self.sample_burst = sample_burst
+        self.sample_window = sample_window
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.stream = stream or sys.stdout.buffer
+        self.forward_level = LEVELS.get(forward_level.lower(), logging.ERROR)
+        self.webhook_url = webhook_url
+
+        self._queue: queue.Queue = queue.Queue(maxsize=queue_size)
+        self._windows: Dict[Tuple[str, str], List] = {}
+        self._thread: Optional[threading.Thread] = None
+        self._channel_sender: Optional[Callable[[str], Awaitable]] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._http = None
+
+        # Compteurs (lus par /health et les métriques)
+        self.stats: Dict[str, int] = {
+            'written': 0,
+            'dropped_queue_full': 0,
+            'dropped_sampled': 0,
+            'forwarded': 0,
+            'forward_failed': 0,
+        }
+        self.on_drop: Optional[Callable[[str, int], None]] = None
+
+    # === Côté appelant (boucle asyncio ou autre thread) ===
+
+    def __call__(self, logger, method_name: str, event_dict: Dict[str, Any]):
+        event_dict.setdefault('timestamp', time.time())
+        level = event_dict.get('level', method_name)
+
+        suppressed = self._admit(level, str(event_dict.get('event')))
+        if suppressed is None:
+            self._drop('sampled')
+            raise structlog.DropEvent
+        if suppressed:
+            event_dict['sampled_out'] = suppressed
+
+        self.start()
+        try:
+            self._queue.put_nowait(event_dict)
+        except queue.Full:
+            self._drop('queue_full')
+        raise structlog.DropEvent
+
+    def _admit(self, level: str, event: str) -> Optional[int]:
+        """None si échantillonné, sinon nombre d'événements supprimés depuis le dernier émis"""
+        now = time.monotonic()
+        key = (level, event)
+        window = self._windows.get(key)
+
+        if window is None or now - window[0] >= self.sample_window:
+            suppressed = window[2] if window else 0
+            if len(self._windows) >= 10000:
+                self._windows.clear()
+            self._windows[key] = [now, 1, 0]
+            return suppressed
+
+        window[1] += 1
+        if window[1] <= self.sample_burst:
+            return 0
+        window[2] += 1
+        return None
+
+    def _drop(self, reason: str):
+        self.stats[f'dropped_{reason}'] += 1
+        if self.on_drop:
+            self.on_drop(reason, 1)
+
+    # === Cycle de vie ===
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='logsink', daemon=True)
+            self._thread.start()
+
+    def close(self, timeout: float = 5.0):
+        """Vider la file puis arrêter le thread"""
+        if self._thread is None:
+            return
+        try:
+            self._queue.put(_STOP, timeout=timeout)
+        except queue.Full:
+            pass
+        self._thread.join(timeout)
+        self._thread = None
+        if self._http is not None:
+            self._http.close()
+            self._http = None
+
+    def forward_to_channel(self, loop: asyncio.AbstractEventLoop, sender: Callable[[str], Awaitable]):
+        """Transfert vers un channel Discord (sender exécuté sur la boucle du bot)"""
+        self._loop = loop
+        self._channel_sender = sender
+
+    @property
+    def pending(self) -> int:
+        return self._queue.qsize()
+
+    # === Thread d'écriture ===
+
+    def _run(self):
+        forward: List[Dict[str, Any]] = []
+        last_forward = time.monotonic()
+        running = True
+
+        while running:
+            batch = []
+            try:
+                batch.append(self._queue.get(timeout=self.flush_interval))
+                while len(batch) < self.batch_size:
+                    batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                pass
+
+            if any(event is _STOP for event in batch):
+                batch = [event for event in batch if event is not _STOP]
+                running = False
+
+            if batch:
+                self._write(batch)
+                forward.extend(e for e in batch if LEVELS.get(e.get('level'), 0) >= self.forward_level)
+
+            if forward and (len(forward) >= self.batch_size or not running
+                            or time.monotonic() - last_forward >= self.flush_interval):
+                self._forward(forward)
+                forward = []
+                last_forward = time.monotonic()
+
+    def _write(self, batch: List[Dict[str, Any]]):
+        lines = []
+        for event in batch:
+            timestamp = event.get('timestamp')
+            if isinstance(timestamp, float):
+                event['timestamp'] = datetime.fromtimestamp(timestamp, timezone.utc).isoformat().replace('+00:00', 'Z')
+            lines.append(_dumps(event))
+        try:
+            self.stream.write(b'\n'.join(lines) + b'\n')
+            self.stream.flush()
+            self.stats['written'] += len(lines)
+        except Exception:
+            pass
+
+    def _forward(self, events: List[Dict[str, Any]]):
+        """Envoyer les événements graves par blocs de 2000 caractères"""
+        if not self.webhook_url and not self._channel_sender:
+            return
+
+        for content in self._chunks(events):
+            try:
+                if self.webhook_url:
+                    if self._http is None:
+                        import httpx
+                        self._http = httpx.Client(timeout=5.0)
+                    self._http.post(self.webhook_url, json={'content': content}).raise_for_status()
+                else:
+                    asyncio.run_coroutine_threadsafe(self._channel_sender(content), self._loop).result(timeout=5.0)
+                self.stats['forwarded'] += 1
+            except Exception:
+                self.stats['forward_failed'] += 1
+
+    @staticmethod
+    def _chunks(events: List[Dict[str, Any]]) -> List[str]:
+        limit = DISCORD_MESSAGE_LIMIT - len("```json\n\n```")
+        chunks, current = [], ''
+        for event in events:
+            line = _dumps(event).decode('utf-8')[:limit]
+            if current and len(current) + len(line) + 1 > limit:
+                chunks.append(current)
+                current = ''
+            current = f"{current}\n{line}" if current else line
+        if current:
+            chunks.append(current)
+        return [f"```json\n{chunk}\n```" for chunk in chunks]
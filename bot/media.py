@@ -0,0 +1,373 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+================================================================
+MEDIA - Pièces jointes des channels chantier
+================================================================
+on_message dépose les pièces jointes dans une file bornée (jamais
+d'attente sur la gateway). Des workers en nombre fixe téléchargent
+en flux vers un stockage adressé par contenu (data/media, SHA-256,
+dédoublonné), puis miniatures et EXIF sont calculés dans un
+ProcessPoolExecutor. Les métadonnées sont indexées dans PostgreSQL
+(media_files, media_attachments) par channel chantier.
+================================================================
+"""
+
+import os
+import json
+import uuid
+import asyncio
+import hashlib
+import multiprocessing
+from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass
+from typing import Optional, List, Dict, Any, Callable
+
+import structlog
+
+from services import Metrics
+
+logger = structlog.get_logger(__name__)
+
+# ================================================================
+# SCHÉMA
+# ================================================================
+
+SCHEMA_SQL = '''
+CREATE TABLE IF NOT EXISTS media_files (
+    sha256 TEXT PRIMARY KEY,
+    size BIGINT NOT NULL,
+    content_type TEXT,
+    extension TEXT NOT NULL,
+    width INTEGER,
+    height INTEGER,
+    has_thumbnail BOOLEAN NOT NULL DEFAULT FALSE,
+    taken_at TIMESTAMP,                     -- EXIF DateTimeOriginal (heure locale de l'appareil)
+    exif JSONB,
+    created_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+
+CREATE TABLE IF NOT EXISTS media_attachments (
+    attachment_id BIGINT PRIMARY KEY,
+    sha256 TEXT NOT NULL REFERENCES media_files(sha256),
+    message_id BIGINT NOT NULL,
+    channel_id BIGINT NOT NULL,
+    channel_name TEXT,
+    guild_id BIGINT NOT NULL,
+    user_id BIGINT NOT NULL,
+    filename TEXT NOT NULL,
+    created_at TIMESTAMPTZ NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS idx_media_attachments_channel
+    ON media_attachments (channel_id, attachment_id DESC);
+'''
+
+IMAGE_TYPES = ('image/jpeg', 'image/png', 'image/webp', 'image/heic', 'image/gif')
+DOCUMENT_TYPES = ('application/pdf',)
+
+CHUNK_SIZE = 64 * 1024
+
+# ================================================================
+# TRAITEMENT IMAGE (processus séparé)
+# ================================================================
+
+# Tags EXIF conservés (le reste : makernotes, miniatures embarquées...)
+EXIF_KEEP = (
+    'Make', 'Model', 'DateTime', 'DateTimeOriginal', 'Orientation',
+    'ExposureTime', 'FNumber', 'ISOSpeedRatings', 'FocalLength', 'LensModel',
+)
+
+def process_image(source: str, thumbnail: str, max_size: int) -> Dict[str, Any]:
+    """Dimensions, EXIF et miniature JPEG (exécuté dans le pool de processus)"""
+    from PIL import Image, ImageOps, ExifTags
+
+    with Image.open(source) as image:
+        width, height = image.size
+        raw = image.getexif()
+        tags = {ExifTags.TAGS.get(key, str(key)): value for key, value in raw.items()}
+        tags.update({
+            ExifTags.TAGS.get(key, str(key)): value
+            for key, value in raw.get_ifd(ExifTags.IFD.Exif).items()
+        })
+        exif = {name: str(tags[name])[:200] for name in EXIF_KEEP if name in tags}
+
+        gps = raw.get_ifd(ExifTags.IFD.GPSInfo)
+        if gps:
+            exif['GPS'] = {ExifTags.GPSTAGS.get(key, str(key)): str(value)[:100] for key, value in gps.items()}
+
+        image = ImageOps.exif_transpose(image)
+        image.thumbnail((max_size, max_size))
+        os.makedirs(os.path.dirname(thumbnail), exist_ok=True)
+        image.convert('RGB').save(thumbnail, 'JPEG', quality=80, optimize=True)
+
+    taken_at = None
+    stamp = exif.get('DateTimeOriginal') or exif.get('DateTime')
+    if stamp:
+        try:
+            taken_at = datetime.strptime(stamp, '%Y:%m:%d %H:%M:%S').isoformat()
+        except ValueError:
+            pass
+
+    return {'width': width, 'height': height, 'exif': exif, 'taken_at': taken_at}
+
+# ================================================================
+# PIPELINE
+# ================================================================
+
+@dataclass
+class MediaJob:
+    attachment_id: int
+    url: str
+    filename: str
+    content_type: str
+    size: int
+    message_id: int
+    channel_id: int
+    channel_name: str
+    guild_id: int
+    user_id: int
+    created_at: datetime
+
+class MediaPipeline:
+    """File bornée + workers de téléchargement + pool de processus pour les images"""
+
+    def __init__(
+        self,
+        pool_getter: Callable,
+        root: str,
+        downloads: int = 4,
+        process_workers: int = 2,
+        queue_size: int = 1000,
+        max_bytes: int = 25 * 1024 * 1024,
+        thumbnail_size: int = 320,
+        channel_filter: Optional[Callable[[Any], bool]] = None,
+        metrics: Optional[Metrics] = None,
+    ):
+        self.pool_getter = pool_getter
+        self.root = root
+        self.downloads = downloads
+        self.process_workers = process_workers
+        self.max_bytes = max_bytes
+        self.thumbnail_size = thumbnail_size
+        self.channel_filter = channel_filter
+        self.metrics = metrics or Metrics(False)
+
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self.stats: Dict[str, int] = {'stored': 0, 'duplicate': 0, 'skipped': 0, 'dropped': 0, 'failed': 0}
+
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._http = None
+        self._tasks: List[asyncio.Task] = []
+
+    # === Chemins (adressage par contenu) ===
+
+    def path_for(self, sha256: str, extension: str) -> str:
+        return os.path.join(self.root, sha256[:2], sha256[2:4], f"{sha256}{extension}")
+
+    def thumbnail_for(self, sha256: str) -> str:
+        return os.path.join(self.root, 'thumbs', sha256[:2], f"{sha256}.jpg")
+
+    # === Cycle de vie ===
+
+    async def start(self):
+        """Créer schéma et dossiers, démarrer les workers (idempotent)"""
+        if self._tasks:
+            return
+
+        import httpx
+
+        os.makedirs(os.path.join(self.root, 'tmp'), exist_ok=True)
+        pool = self.pool_getter()
+        if pool is not None:
+            try:
+                async with pool.acquire() as conn:
+                    await conn.execute(SCHEMA_SQL)
+            except Exception as e:
+                logger.error("media_schema_failed", error=str(e))
+
+        self._executor = self._new_executor()
+        self._http = httpx.AsyncClient(timeout=httpx.Timeout(30.0, connect=10.0), follow_redirects=True)
+        self._tasks = [asyncio.create_task(self._worker(i)) for i in range(self.downloads)]
+        logger.info("media_started", root=self.root, downloads=self.downloads)
+
+    def _new_executor(self) -> ProcessPoolExecutor:
+        # spawn : pas de fork d'un processus multi-thread (sink de logs, boucle asyncio)
+        return ProcessPoolExecutor(self.process_workers, mp_context=multiprocessing.get_context('spawn'))
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks.clear()
+        if self._http is not None:
+            await self._http.aclose()
+            self._http = None
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    # === Entrée (gateway) ===
+
+    def submit(self, message) -> int:
+        """Mettre en file les pièces jointes d'un message (non bloquant)"""
+        if not message.attachments or not self._tasks:
+            return 0
+        if self.channel_filter and not self.channel_filter(message.channel):
+            return 0
+
+        queued = 0
+        for attachment in message.attachments:
+            content_type = (attachment.content_type or '').split(';')[0]
+            if content_type not in IMAGE_TYPES and content_type not in DOCUMENT_TYPES:
+                self._count('skipped')
+                continue
+            if attachment.size > self.max_bytes:
+                self._count('skipped')
+                continue
+
+            job = MediaJob(
+                attachment_id=attachment.id,
+                url=attachment.url,
+                filename=attachment.filename,
+                content_type=content_type,
+                size=attachment.size,
+                message_id=message.id,
+                channel_id=message.channel.id,
+                channel_name=getattr(message.channel, 'name', ''),
+                guild_id=message.guild.id if message.guild else 0,
+                user_id=message.author.id,
+                created_at=message.created_at,
+            )
+            try:
+                self.queue.put_nowait(job)
+                queued += 1
+            except asyncio.QueueFull:
+                self._count('dropped')
+                logger.warning("media_queue_full", attachment_id=attachment.id)
+
+        self.metrics.media_queue.set(self.queue.qsize())
+        return queued
+
+    def _count(self, status: str):
+        self.stats[status] += 1
+        self.metrics.media_files_total.labels(status=status).inc()
+
+    # === Workers ===
+
+    async def _worker(self, worker_id: int):
+        while True:
+            job = await self.queue.get()
+            try:
+                await self._ingest(job)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self._count('failed')
+                logger.error("media_ingest_failed", attachment_id=job.attachment_id, error=str(e))
+            finally:
+                self.queue.task_done()
+                self.metrics.media_queue.set(self.queue.qsize())
+
+    async def _ingest(self, job: MediaJob):
+        extension = os.path.splitext(job.filename)[1].lower()[:10] or '.bin'
+        sha256, size, temp = await self._download(job)
+
+        loop = asyncio.get_running_loop()
+        final = self.path_for(sha256, extension)
+        if await loop.run_in_executor(None, os.path.exists, final):
+            await loop.run_in_executor(None, os.remove, temp)
+            await self._index(job, sha256, size, extension, None)
+            self._count('duplicate')
+            return
+
+        def _store():
+            os.makedirs(os.path.dirname(final), exist_ok=True)
+            os.replace(temp, final)  # Atomique : jamais de fichier partiel à l'adresse finale
+        await loop.run_in_executor(None, _store)
+
+        info = None
+        if job.content_type in IMAGE_TYPES:
+            try:
+                info = await loop.run_in_executor(
+                    self._executor, process_image, final, self.thumbnail_for(sha256), self.thumbnail_size
+                )
+            except BrokenProcessPool as e:
+                # Processus tué (mémoire, image piégée) : pool recréé pour les suivantes
+                logger.error("media_process_pool_broken", sha256=sha256, error=str(e))
+                self._executor.shutdown(wait=False)
+                self._executor = self._new_executor()
+            except Exception as e:
+                logger.warning("media_thumbnail_failed", sha256=sha256, error=str(e))
+
+        await self._index(job, sha256, size, extension, info)
+        self._count('stored')
+        logger.info("media_stored", sha256=sha256, size=size, channel_id=job.channel_id)
+
+    async def _download(self, job: MediaJob):
+        """Téléchargement en flux : hash calculé au fil de l'eau, taille plafonnée"""
+        loop = asyncio.get_running_loop()
+        temp = os.path.join(self.root, 'tmp', uuid.uuid4().hex)
+        digest = hashlib.sha256()
+        size = 0
+
+        handle = await loop.run_in_executor(None, open, temp, 'wb')
+        try:
+            async with self._http.stream('GET', job.url) as response:
+                response.raise_for_status()
+                async for chunk in response.aiter_bytes(CHUNK_SIZE):
+                    size += len(chunk)
+                    if size > self.max_bytes:
+                        raise ValueError(f"fichier > {self.max_bytes} octets")
+                    digest.update(chunk)
+                    await loop.run_in_executor(None, handle.write, chunk)
+        except BaseException:
+            await loop.run_in_executor(None, handle.close)
+            await loop.run_in_executor(None, os.remove, temp)
+            raise
+        await loop.run_in_executor(None, handle.close)
+        return digest.hexdigest(), size, temp
+
+    async def _index(self, job: MediaJob, sha256: str, size: int, extension: str, info: Optional[Dict[str, Any]]):
+        pool = self.pool_getter()
+        if pool is None:
+            return
+
+        info = info or {}
+        taken_at = datetime.fromisoformat(info['taken_at']) if info.get('taken_at') else None
+        async with pool.acquire() as conn:
+            async with conn.transaction():
+                await conn.execute('''
+                    INSERT INTO media_files (sha256, size, content_type, extension, width, height, has_thumbnail, taken_at, exif)
+                    VALUES ($1, $2, $3, $4, $5, $6, $7, $8, $9)
+                    ON CONFLICT (sha256) DO NOTHING
+                ''', sha256, size, job.content_type, extension, info.get('width'), info.get('height'),
+                    bool(info), taken_at, json.dumps(info['exif']) if info.get('exif') else None)
+                await conn.execute('''
+                    INSERT INTO media_attachments (
+                        attachment_id, sha256, message_id, channel_id, channel_name,
+                        guild_id, user_id, filename, created_at
+                    )
+                    VALUES ($1, $2, $3, $4, $5, $6, $7, $8, $9)
+                    ON CONFLICT (attachment_id) DO NOTHING
+                ''', job.attachment_id, sha256, job.message_id, job.channel_id, job.channel_name,
+                    job.guild_id, job.user_id, job.filename[:255], job.created_at)
+
+    # === Lecture (API) ===
+
+    async def list_for_channel(self, pool, channel_id: int, limit: int = 50, before: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Médias d'un channel chantier, du plus récent au plus ancien (pagination par attachment_id)"""
+        async with pool.acquire() as conn:
+            rows = await conn.fetch('''
+                SELECT a.attachment_id, a.sha256, a.filename, a.user_id, a.message_id, a.created_at,
+                       f.size, f.content_type, f.extension, f.width, f.height, f.has_thumbnail, f.taken_at
+                FROM media_attachments a
+                JOIN media_files f USING (sha256)
+                WHERE a.channel_id = $1
+                  AND ($2::bigint IS NULL OR a.attachment_id < $2)
+                ORDER BY a.attachment_id DESC
+                LIMIT $3
+            ''', channel_id, before, limit)
+        return [dict(row) for row in rows]
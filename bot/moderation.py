@@ -0,0 +1,488 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+================================================================
+MODÉRATION - Pipeline de modération automatique
+================================================================
+Les règles (regex, mots-clés, liens autorisés) sont compilées en
+un seul matcher. Les messages passent par une file asyncio vidée
+par un pool de workers : on_message ne fait qu'un put_nowait().
+================================================================
+"""
+
+import re
+import time
+import bisect
+import asyncio
+from collections import defaultdict, deque
+from dataclasses import dataclass, field
+from typing import Optional, List, Dict, Callable, Deque, Tuple
+
+import discord
+import structlog
+
+from flood import FloodResult
+
+logger = structlog.get_logger(__name__)
+
+# ================================================================
+# SCHÉMA
+# ================================================================
+
+SCHEMA_SQL = '''
+CREATE TABLE IF NOT EXISTS moderation_rules (
+    id SERIAL PRIMARY KEY,
+    kind VARCHAR(20) NOT NULL,              -- regex | keyword | link_allow
+    pattern TEXT NOT NULL,
+    action VARCHAR(20) NOT NULL DEFAULT 'delete',  -- delete | warn | log
+    reason TEXT,
+    enabled BOOLEAN NOT NULL DEFAULT TRUE,
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+
+CREATE TABLE IF NOT EXISTS moderation_events (
+    id BIGSERIAL PRIMARY KEY,
+    message_id BIGINT NOT NULL,
+    user_id BIGINT NOT NULL,
+    channel_id BIGINT NOT NULL,
+    guild_id BIGINT NOT NULL,
+    rule VARCHAR(50) NOT NULL,
+    action VARCHAR(20) NOT NULL,
+    excerpt TEXT,
+    created_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+
+CREATE INDEX IF NOT EXISTS idx_moderation_events_user
+    ON moderation_events (user_id, created_at DESC);
+'''
+
+ACTIONS = ('delete', 'warn', 'log')
+
+URL_RE = re.compile(r'https?://([^/\s:>]+)', re.IGNORECASE)
+
+# Drapeaux globaux en tête de règle : (?i)abc -> (?i:abc) une fois combinée
+GLOBAL_FLAGS_RE = re.compile(r'^\(\?([aiLmsux]+)\)')
+# Références arrière : \1, (?P=nom) (numéros décalés dans la regex combinée)
+BACKREF_RE = re.compile(r'(?<!\\)(?:\\\\)*\\[1-9]|\(\?P=')
+
+# ================================================================
+# RÈGLES
+# ================================================================
+
+def _rule_pattern(pattern: str) -> str:
+    """Regex d'une règle, utilisable dans l'alternation combinée (re.error sinon)"""
+    compiled = re.compile(pattern)
+    if compiled.groupindex:
+        raise re.error("groupes nommés interdits")
+    if BACKREF_RE.search(pattern):
+        raise re.error("références arrière interdites")
+
+    flags = GLOBAL_FLAGS_RE.match(pattern)
+    if flags:
+        pattern = f'(?{flags.group(1)}:{pattern[flags.end():]})'
+        re.compile(pattern)
+    return pattern
+
+def _trie_pattern(words) -> str:
+    """Regex factorisée par préfixes : ['abc', 'abd'] -> 'ab(?:c|d)'"""
+    trie: Dict = {}
+    for word in words:
+        node = trie
+        for char in word:
+            node = node.setdefault(char, {})
+        node[''] = {}
+
+    def _build(node: Dict) -> str:
+        end = '' in node
+        branches = [re.escape(char) + _build(child) for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ''
+        body = branches[0] if len(branches) == 1 else '(?:' + '|'.join(branches) + ')'
+        if end:
+            # Mot complet possible ici : suite optionnelle (plus long d'abord)
+            body = f'(?:{body})?'
+        return body
+
+    return _build(trie)
+
+@dataclass(frozen=True)
+class Rule:
+    """Règle de modération (ligne de moderation_rules)"""
+    id: int
+    kind: str
+    pattern: str
+    action: str = 'delete'
+    reason: Optional[str] = None
+
+@dataclass(frozen=True)
+class Violation:
+    """Résultat d'une vérification positive"""
+    rule: str
+    action: str
+    reason: str
+    excerpt: str = ''
+
+class RuleSet:
+    """Règles compilées : une regex combinée + allowlist de domaines"""
+
+    def __init__(self, rules: List[Rule]):
+        self.rules = {rule.id: rule for rule in rules}
+        self.allowed_domains = frozenset(
+            rule.pattern.lower().lstrip('.')
+            for rule in rules if rule.kind == 'link_allow'
+        )
+        self.matcher = self._compile(rules)
+
+    def _compile(self, rules: List[Rule]) -> Optional[re.Pattern]:
+        """Compiler regex + mots-clés en une seule alternation nommée"""
+        parts = []
+
+        # Mots-clés : trie factorisé en un seul groupe (pas d'alternation
+        # de N branches testées une par une à chaque position)
+        keywords = [rule for rule in rules if rule.kind == 'keyword' and rule.pattern.strip()]
+        self.keywords = {rule.pattern.strip().lower(): rule for rule in keywords}
+        if self.keywords:
+            # Pas de \b : "c++" ou "#tag" commencent / finissent hors \w
+            parts.append(rf'(?<!\w)(?P<kw>{_trie_pattern(self.keywords)})(?!\w)')
+
+        for rule in rules:
+            if rule.kind != 'regex':
+                continue
+
+            # Valider chaque règle seule : une regex invalide ne doit
+            # pas invalider tout le matcher
+            try:
+                pattern = _rule_pattern(rule.pattern)
+            except re.error as e:
+                logger.error("moderation_rule_invalid", rule_id=rule.id, error=str(e))
+                continue
+
+            parts.append(f'(?P<r{rule.id}>{pattern})')
+
+        if not parts:
+            return None
+        return re.compile('|'.join(parts), re.IGNORECASE)  # re.error : RuleSet non construit
+
+    def match(self, content: str) -> Optional[Tuple[Rule, str]]:
+        """Première règle qui matche, avec l'extrait concerné"""
+        if self.matcher is None:
+            return None
+        m = self.matcher.search(content)
+        if not m:
+            return None
+        if m.lastgroup == 'kw':
+            return self.keywords[m.group(0).lower()], m.group(0)
+        return self.rules[int(m.lastgroup[1:])], m.group(0)
+
+    def forbidden_link(self, content: str) -> Optional[str]:
+        """Premier domaine hors allowlist (None si allowlist vide)"""
+        if not self.allowed_domains:
+            return None
+        for m in URL_RE.finditer(content):
+            host = m.group(1).lower()
+            labels = host.split('.')
+            # Suffixes : www.google.com -> google.com -> com
+            if not any('.'.join(labels[i:]) in self.allowed_domains for i in range(len(labels))):
+                return host
+        return None
+
+# ================================================================
+# MOTEUR
+# ================================================================
+
+class ModerationEngine:
+    """Vérification synchrone d'un message (regex, liens, spam, doublons)"""
+
+    def __init__(
+        self,
+        spam_max_messages: int = 6,
+        spam_window: float = 5.0,
+        duplicate_max: int = 3,
+        cross_post_max: int = 3,
+    ):
+        self.ruleset = RuleSet([])
+        self.spam_max_messages = spam_max_messages
+        self.spam_window = spam_window
+        self.duplicate_max = duplicate_max
+        self.cross_post_max = cross_post_max
+
+        self._recent: Dict[int, Deque[float]] = defaultdict(deque)
+
+    def load(self, rules: List[Rule]):
+        """Remplacer atomiquement le jeu de règles"""
+        self.ruleset = RuleSet(rules)
+
+    def check(
+        self,
+        user_id: int,
+        content: str,
+        now: Optional[float] = None,
+        flood: Optional[FloodResult] = None
+    ) -> Optional[Violation]:
+        """Vérifier un message, None si conforme
+
+        now : heure d'envoi (epoch) ; flood : résultat FloodDetector.
+        """
+        now = time.time() if now is None else now
+
+        # Spam : trop de messages dans la fenêtre (heures d'envoi, pas de traitement :
+        # une file en retard ne fait pas passer des messages espacés pour du spam)
+        recent = self._recent[user_id]
+        bisect.insort(recent, now)      # Workers parallèles : ordre d'arrivée non garanti
+        while recent[-1] - recent[0] > self.spam_window:
+            recent.popleft()
+        if len(recent) > self.spam_max_messages:
+            return Violation('spam_rate', 'delete', "Trop de messages en peu de temps")
+
+        if not content:
+            return None
+
+        # Doublons : même contenu (ou quasi) répété / collé dans plusieurs channels
+        if flood is not None:
+            if flood.channels >= self.cross_post_max:
+                return Violation('cross_post', 'delete', "Même message dans plusieurs channels")
+            if flood.count > self.duplicate_max:
+                return Violation('duplicate', 'delete', "Message répété")
+
+        # Regex + mots-clés (une seule passe)
+        ruleset = self.ruleset
+        hit = ruleset.match(content)
+        if hit:
+            rule, excerpt = hit
+            return Violation(f'rule_{rule.id}', rule.action, rule.reason or "Contenu interdit", excerpt[:100])
+
+        host = ruleset.forbidden_link(content)
+        if host:
+            return Violation('link', 'delete', "Lien non autorisé", host)
+
+        return None
+
+    def prune(self, now: Optional[float] = None):
+        """Libérer les utilisateurs inactifs"""
+        now = time.time() if now is None else now
+        for uid in [u for u, e in self._recent.items() if not e or now - e[-1] > self.spam_window]:
+            del self._recent[uid]
+
+# ================================================================
+# PIPELINE ASYNC
+# ================================================================
+
+@dataclass
+class PipelineStats:
+    """Compteurs pipeline"""
+    checked: int = 0
+    violations: int = 0
+    dropped: int = 0
+    errors: int = 0
+    by_rule: Dict[str, int] = field(default_factory=lambda: defaultdict(int))
+
+class ModerationPipeline:
+    """File asyncio + workers + rechargement des règles depuis PostgreSQL"""
+
+    def __init__(
+        self,
+        bot,
+        pool_getter: Callable,
+        engine: Optional[ModerationEngine] = None,
+        workers: int = 4,
+        queue_size: int = 10000,
+        reload_interval: float = 60.0,
+        logs_channel_id: Optional[int] = None,
+        logs_channel_for: Optional[Callable[[int], Optional[int]]] = None,
+    ):
+        self.bot = bot
+        self.pool_getter = pool_getter
+        self.engine = engine or ModerationEngine()
+        self.workers = workers
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self.reload_interval = reload_interval
+        self.logs_channel_id = logs_channel_id
+        self.logs_channel_for = logs_channel_for  # guild_id -> channel (multi-serveurs)
+        self.stats = PipelineStats()
+
+        self._tasks: List[asyncio.Task] = []
+        self._rules_version = None
+
+    # === Cycle de vie ===
+
+    async def start(self):
+        """Charger les règles et démarrer les workers"""
+        if self._tasks:
+            return  # on_ready peut être rappelé après reconnexion
+
+        pool = self.pool_getter()
+        if pool:
+            async with pool.acquire() as conn:
+                await conn.execute(SCHEMA_SQL)
+        await self.reload()
+
+        for i in range(self.workers):
+            self._tasks.append(asyncio.create_task(self._worker(i)))
+        self._tasks.append(asyncio.create_task(self._reload_loop()))
+        logger.info("moderation_started", workers=self.workers, rules=len(self.engine.ruleset.rules))
+
+    async def stop(self):
+        """Arrêter workers et rechargement"""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks.clear()
+
+    def submit(self, message: discord.Message, flood: Optional[FloodResult] = None) -> bool:
+        """Enfiler un message sans bloquer (False si file pleine)"""
+        try:
+            self.queue.put_nowait((message, flood))
+            return True
+        except asyncio.QueueFull:
+            self.stats.dropped += 1
+            return False
+
+    # === Règles ===
+
+    async def reload(self, force: bool = False) -> bool:
+        """Recharger les règles si la table a changé
+
+        Empreinte calculée sur le contenu des règles actives : un UPDATE
+        en place (motif, action, activation) est détecté sans updated_at.
+        """
+        pool = self.pool_getter()
+        if not pool:
+            return False
+
+        try:
+            async with pool.acquire() as conn:
+                version = await conn.fetchrow('''
+                    SELECT COUNT(*) AS n,
+                           md5(string_agg(id || ':' || kind || ':' || action || ':' || pattern || ':' || coalesce(reason, ''),
+                                          E'\\n' ORDER BY id)) AS fingerprint
+                    FROM moderation_rules
+                    WHERE enabled
+                ''')
+                version = (version['n'], version['fingerprint'])
+                if not force and version == self._rules_version:
+                    return False
+
+                rows = await conn.fetch('''
+                    SELECT id, kind, pattern, action, reason
+                    FROM moderation_rules
+                    WHERE enabled
+                    ORDER BY id
+                ''')
+        except Exception as e:
+            logger.error("moderation_rules_load_failed", error=str(e))
+            return False
+
+        rules = [
+            Rule(r['id'], r['kind'], r['pattern'], r['action'] if r['action'] in ACTIONS else 'delete', r['reason'])
+            for r in rows
+        ]
+        try:
+            self.engine.load(rules)
+        except re.error as e:
+            # Règles précédentes conservées ; nouvel essai à la prochaine modification
+            logger.error("moderation_rules_compile_failed", rules=len(rules), error=str(e))
+            self._rules_version = version
+            return False
+        self._rules_version = version
+        logger.info("moderation_rules_loaded", rules=len(rules))
+        return True
+
+    async def _reload_loop(self):
+        while True:
+            await asyncio.sleep(self.reload_interval)
+            await self.reload()
+            self.engine.prune()
+
+    # === Workers ===
+
+    async def _worker(self, worker_id: int):
+        while True:
+            message, flood = await self.queue.get()
+            try:
+                await self.process(message, flood)
+            except Exception as e:
+                self.stats.errors += 1
+                logger.error("moderation_worker_error", worker=worker_id, error=str(e), message_id=message.id)
+            finally:
+                self.queue.task_done()
+
+    async def process(self, message: discord.Message, flood: Optional[FloodResult] = None) -> Optional[Violation]:
+        """Vérifier un message et appliquer l'action"""
+        author = message.author
+        if message.guild is None or getattr(author, 'bot', False):
+            return None
+
+        # Staff exempté
+        perms = getattr(author, 'guild_permissions', None)
+        if perms and perms.manage_messages:
+            return None
+
+        self.stats.checked += 1
+        violation = self.engine.check(author.id, message.content, now=message.created_at.timestamp(), flood=flood)
+        if violation is None:
+            return None
+
+        self.stats.violations += 1
+        self.stats.by_rule[violation.rule] += 1
+        await self._apply(message, violation)
+        return violation
+
+    async def _apply(self, message: discord.Message, violation: Violation):
+        """Appliquer l'action et tracer l'événement"""
+        logger.info(
+            "moderation_violation",
+            rule=violation.rule,
+            action=violation.action,
+            user_id=message.author.id,
+            channel_id=message.channel.id
+        )
+
+        try:
+            if violation.action == 'delete':
+                await message.delete()
+            if violation.action in ('delete', 'warn'):
+                await message.channel.send(
+                    f"⚠️ {message.author.mention} : {violation.reason}.",
+                    delete_after=10
+                )
+        except discord.HTTPException as e:
+            logger.error("moderation_action_failed", error=str(e), message_id=message.id)
+
+        pool = self.pool_getter()
+        if pool:
+            try:
+                async with pool.acquire() as conn:
+                    await conn.execute('''
+                        INSERT INTO moderation_events (
+                            message_id, user_id, channel_id, guild_id, rule, action, excerpt
+                        )
+                        VALUES ($1, $2, $3, $4, $5, $6, $7)
+                    ''',
+                        message.id,
+                        message.author.id,
+                        message.channel.id,
+                        message.guild.id,
+                        violation.rule,
+                        violation.action,
+                        violation.excerpt
+                    )
+            except Exception as e:
+                logger.error("moderation_event_log_failed", error=str(e), message_id=message.id)
+
+        logs_channel_id = self.logs_channel_for(message.guild.id) if self.logs_channel_for else self.logs_channel_id
+        if logs_channel_id:
+            channel = self.bot.get_channel(logs_channel_id)
+            if channel:
+                embed = discord.Embed(
+                    title="🛡️ Modération automatique",
+                    description=f"{message.author.mention} dans {message.channel.mention}",
+                    color=discord.Color.orange()
+                )
+                embed.add_field(name="Règle", value=violation.rule, inline=True)
+                embed.add_field(name="Action", value=violation.action, inline=True)
+                if violation.excerpt:
+                    embed.add_field(name="Extrait", value=f"`{violation.excerpt}`", inline=False)
+                try:
+                    await channel.send(embed=embed)
+                except discord.HTTPException:
+                    pass
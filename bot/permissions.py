@@ -0,0 +1,227 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+================================================================
+PERMISSIONS - Index rôles -> capacités par serveur
+================================================================
+Chaque rôle est associé à un masque de capacités (bits), d'après
+la table guild_role_capabilities (par ID ou nom de rôle), qui
+complète les noms historiques (Manager, Admin, Administrateur).
+Un contrôle de permission devient un OU des masques des rôles du
+membre puis un ET binaire. L'index est mis à jour sur les
+événements de rôles et de membres, sans rescanner le serveur.
+================================================================
+"""
+
+import enum
+from typing import Optional, Dict, List, Callable, Iterable
+
+import discord
+from discord.ext import commands
+import structlog
+
+logger = structlog.get_logger(__name__)
+
+# ================================================================
+# SCHÉMA
+# ================================================================
+
+SCHEMA_SQL = '''
+CREATE TABLE IF NOT EXISTS guild_role_capabilities (
+    guild_id BIGINT NOT NULL,
+    role TEXT NOT NULL,                     -- ID du rôle ou nom exact
+    capabilities TEXT[] NOT NULL,           -- manager, admin, moderator, planning
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    PRIMARY KEY (guild_id, role)
+);
+'''
+
+# ================================================================
+# CAPACITÉS
+# ================================================================
+
+class Capability(enum.IntFlag):
+    """Capacités accordées par les rôles"""
+    MANAGER = 1
+    ADMIN = 2
+    MODERATOR = 4
+    PLANNING = 8
+
+ALL_CAPABILITIES = Capability.MANAGER | Capability.ADMIN | Capability.MODERATOR | Capability.PLANNING
+
+# Comportement historique de utils.is_manager / utils.is_admin
+DEFAULT_ROLES: Dict[str, Capability] = {
+    'Manager': Capability.MANAGER,
+    'Admin': Capability.ADMIN | Capability.MANAGER,
+    'Administrateur': Capability.ADMIN | Capability.MANAGER,
+}
+
+def parse_capabilities(names: Iterable[str]) -> Capability:
+    """['manager', 'admin'] -> Capability.MANAGER | Capability.ADMIN"""
+    value = Capability(0)
+    for name in names:
+        try:
+            value |= Capability[name.strip().upper()]
+        except KeyError:
+            raise ValueError(f"capacité inconnue : {name}")
+    return value
+
+def capability_names(value: int) -> List[str]:
+    return [cap.name.lower() for cap in Capability if value & cap]
+
+# ================================================================
+# INDEX
+# ================================================================
+
+class GuildIndex:
+    """Masques d'un serveur : par rôle (ID) et par membre (cache)"""
+
+    __slots__ = ('rules', 'roles', 'members')
+
+    def __init__(self, rules: Dict[str, int]):
+        self.rules = rules                      # clé (ID en texte ou nom) -> masque
+        self.roles: Dict[int, int] = {}         # role_id -> masque
+        self.members: Dict[int, int] = {}       # member_id -> masque
+
+    def role_mask(self, role: discord.Role) -> int:
+        return self.rules.get(str(role.id), self.rules.get(role.name, 0))
+
+class PermissionIndex:
+    """Index des capacités, construit une fois puis mis à jour par événements"""
+
+    def __init__(self, pool_getter: Optional[Callable] = None, administrator_is_admin: bool = True):
+        self.pool_getter = pool_getter
+        self.administrator_is_admin = administrator_is_admin
+        self.guilds: Dict[int, GuildIndex] = {}
+        self._rules: Dict[int, Dict[str, int]] = {}   # Configuration PostgreSQL par serveur
+
+    # === Construction ===
+
+    async def load(self):
+        """Lire la configuration par serveur depuis PostgreSQL"""
+        pool = self.pool_getter() if self.pool_getter else None
+        if pool is None:
+            return
+
+        try:
+            async with pool.acquire() as conn:
+                await conn.execute(SCHEMA_SQL)
+                rows = await conn.fetch('SELECT guild_id, role, capabilities FROM guild_role_capabilities')
+        except Exception as e:
+            logger.error("permissions_load_failed", error=str(e))
+            return
+
+        rules: Dict[int, Dict[str, int]] = {}
+        for row in rows:
+            try:
+                rules.setdefault(row['guild_id'], {})[row['role']] = int(parse_capabilities(row['capabilities']))
+            except ValueError as e:
+                logger.warning("permissions_rule_invalid", guild_id=row['guild_id'], role=row['role'], error=str(e))
+        self._rules = rules
+        logger.info("permissions_loaded", guilds=len(rules), rules=len(rows))
+
+    def build(self, guild: discord.Guild) -> GuildIndex:
+        """(Re)construire l'index d'un serveur"""
+        index = GuildIndex(self.rules(guild))
+        for role in guild.roles:
+            mask = index.role_mask(role)
+            if mask:
+                index.roles[role.id] = mask
+        self.guilds[guild.id] = index
+        return index
+
+    def build_all(self, guilds: Iterable[discord.Guild]):
+        for guild in guilds:
+            self.build(guild)
+
+    # === Contrôles ===
+
+    def mask(self, member: discord.Member) -> int:
+        """Masque de capacités d'un membre"""
+        guild = getattr(member, 'guild', None)
+        if guild is None:
+            return 0
+
+        index = self.guilds.get(guild.id) or self.build(guild)
+        mask = index.members.get(member.id)
+        if mask is None:
+            mask = self._compute(index, member)
+            index.members[member.id] = mask
+        return mask
+
+    def _compute(self, index: GuildIndex, member: discord.Member) -> int:
+        # member._roles : IDs bruts (évite la liste triée d'objets Role de member.roles)
+        role_ids = getattr(member, '_roles', None)
+        if role_ids is None:
+            role_ids = [role.id for role in member.roles]
+
+        mask = 0
+        roles = index.roles
+        for role_id in role_ids:
+            mask |= roles.get(role_id, 0)
+
+        if self.administrator_is_admin and member.guild_permissions.administrator:
+            mask |= ALL_CAPABILITIES
+        return mask
+
+    def has(self, member: discord.Member, capability: Capability) -> bool:
+        # _value_ : entier brut (l'opérateur & d'IntFlag crée un nouveau membre d'enum)
+        return self.mask(member) & capability._value_ != 0
+
+    # === Mises à jour incrémentales ===
+
+    def on_member_update(self, before: discord.Member, after: discord.Member):
+        index = self.guilds.get(after.guild.id)
+        if index is not None and (before.roles != after.roles or before.guild_permissions != after.guild_permissions):
+            index.members[after.id] = self._compute(index, after)
+
+    def on_member_remove(self, member: discord.Member):
+        index = self.guilds.get(member.guild.id)
+        if index is not None:
+            index.members.pop(member.id, None)
+
+    def on_role_update(self, role: discord.Role, deleted: bool = False):
+        """Rôle créé / renommé / modifié / supprimé"""
+        index = self.guilds.get(role.guild.id)
+        if index is None:
+            return
+
+        mask = 0 if deleted else index.role_mask(role)
+        if mask:
+            index.roles[role.id] = mask
+        else:
+            index.roles.pop(role.id, None)
+        # Masque ou permission administrateur modifié : recalcul paresseux des membres
+        index.members.clear()
+
+    # === Configuration ===
+
+    async def set_rule(self, guild: discord.Guild, role: str, capabilities: Capability):
+        """Enregistrer la règle d'un rôle (vide : retire aussi les droits par défaut)"""
+        pool = self.pool_getter() if self.pool_getter else None
+        if pool is None:
+            raise RuntimeError("Base de données non initialisée")
+
+        async with pool.acquire() as conn:
+            await conn.execute('''
+                INSERT INTO guild_role_capabilities (guild_id, role, capabilities)
+                VALUES ($1, $2, $3)
+                ON CONFLICT (guild_id, role) DO UPDATE
+                SET capabilities = EXCLUDED.capabilities, updated_at = NOW()
+            ''', guild.id, role, capability_names(capabilities))
+
+        self._rules.setdefault(guild.id, {})[role] = int(capabilities)
+        self.build(guild)
+
+    def rules(self, guild: discord.Guild) -> Dict[str, int]:
+        """Règles effectives d'un serveur : noms par défaut complétés par PostgreSQL"""
+        return {**{name: int(cap) for name, cap in DEFAULT_ROLES.items()}, **self._rules.get(guild.id, {})}
+
+def requires(capability: Capability):
+    """Check de commande : @requires(Capability.MANAGER)"""
+    async def predicate(ctx: commands.Context) -> bool:
+        index: PermissionIndex = ctx.bot.permissions
+        if ctx.guild is None or not index.has(ctx.author, capability):
+            raise commands.CheckFailure(f"Capacité requise : {capability.name.lower()}")
+        return True
+    return commands.check(predicate)
@@ -0,0 +1,381 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+================================================================
+QUERIES - Observabilité des requêtes PostgreSQL
+================================================================
+Chaque connexion du pool reçoit un query logger asyncpg
+(add_query_logger) : latence par instruction (histogramme
+Prometheus, agrégats mémoire), journalisation au-delà d'un
+seuil. Une partie des requêtes lentes est rejouée sous
+EXPLAIN (ANALYZE, BUFFERS) dans une transaction annulée ; la
+forme du plan (nœuds, relations, index) est hachée et stockée
+dans query_plans, et un changement de plan pour la même
+requête est signalé.
+================================================================
+"""
+
+import re
+import time
+import random
+import asyncio
+import hashlib
+from collections import deque
+from dataclasses import dataclass
+from typing import Optional, Dict, List, Set, Tuple, Callable, Any
+
+import orjson
+import structlog
+
+from services import Metrics
+
+logger = structlog.get_logger(__name__)
+
+# ================================================================
+# SCHÉMA
+# ================================================================
+
+# Requêtes de l'observateur lui-même : jamais mesurées ni expliquées
+MARKER = '/* query_observer */'
+
+SCHEMA_SQL = MARKER + '''
+CREATE TABLE IF NOT EXISTS query_plans (
+    query_id TEXT NOT NULL,                     -- Empreinte du texte normalisé
+    plan_hash TEXT NOT NULL,                    -- Empreinte de la forme du plan
+    statement TEXT NOT NULL,                    -- Libellé court (verbe + table)
+    query TEXT NOT NULL,
+    shape TEXT NOT NULL,                        -- Nœuds du plan, lisible
+    plan JSONB NOT NULL,                        -- Dernier EXPLAIN (ANALYZE, BUFFERS) complet
+    previous_plan_hash TEXT,                    -- Plan remplacé (changement signalé)
+    samples INTEGER NOT NULL DEFAULT 1,
+    max_ms DOUBLE PRECISION NOT NULL,
+    first_seen TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    last_seen TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    PRIMARY KEY (query_id, plan_hash)
+);
+
+CREATE INDEX IF NOT EXISTS idx_query_plans_changes ON query_plans (first_seen DESC) WHERE previous_plan_hash IS NOT NULL;
+'''
+
+UPSERT_PLAN_SQL = MARKER + '''
+INSERT INTO query_plans (query_id, plan_hash, statement, query, shape, plan, previous_plan_hash, max_ms)
+VALUES ($1, $2, $3, $4, $5, $6::jsonb, $7, $8)
+ON CONFLICT (query_id, plan_hash) DO UPDATE
+SET plan = EXCLUDED.plan,
+    samples = query_plans.samples + 1,
+    max_ms = GREATEST(query_plans.max_ms, EXCLUDED.max_ms),
+    last_seen = NOW()
+'''
+
+LATEST_PLANS_SQL = MARKER + '''
+SELECT DISTINCT ON (query_id) query_id, plan_hash
+FROM query_plans
+ORDER BY query_id, last_seen DESC
+'''
+
+PLAN_CHANGES_SQL = MARKER + '''
+SELECT statement, shape, previous_plan_hash, plan_hash, max_ms, first_seen
+FROM query_plans
+WHERE previous_plan_hash IS NOT NULL
+ORDER BY first_seen DESC
+LIMIT $1
+'''
+
+# ================================================================
+# NORMALISATION
+# ================================================================
+
+WHITESPACE_RE = re.compile(r'\s+')
+LITERAL_RE = re.compile(r"'(?:[^']|'')*'|(?<![$\w])\d+(?:\.\d+)?\b")
+VERB_RE = re.compile(r'^\s*(?:/\*.*?\*/\s*)?(\w+)', re.S)
+TABLE_RE = re.compile(r'\b(?:FROM|INTO|UPDATE|JOIN)\s+([a-z_][\w.]*)\b(?!\s*\()', re.I)
+
+# Effets hors transaction (verrous de session, séquences) : pas de rejeu
+NO_EXPLAIN_RE = re.compile(r'advisory|nextval|setval|pg_notify|\bLISTEN\b|\bCOPY\b|\bVACUUM\b|\bANALYZE\b', re.I)
+EXPLAINABLE = {'select', 'insert', 'update', 'delete', 'with'}
+# Écritures (y compris CTE et verrous de lignes) : plan seul, jamais exécutées une seconde fois
+WRITE_RE = re.compile(r'\b(?:INSERT|UPDATE|DELETE|MERGE)\b|\bFOR\s+(?:NO\s+KEY\s+)?(?:UPDATE|SHARE|KEY\s+SHARE)\b', re.I)
+
+def normalize(query: str) -> str:
+    """Texte comparable : espaces réduits, littéraux remplacés par ?"""
+    return LITERAL_RE.sub('?', WHITESPACE_RE.sub(' ', query).strip())
+
+def statement_label(query: str) -> str:
+    """'select messages' : libellé borné pour les métriques"""
+    verb = VERB_RE.match(query)
+    table = TABLE_RE.search(query)
+    label = verb.group(1).lower() if verb else '?'
+    return f"{label} {table.group(1).lower()}" if table else label
+
+def plan_shape(plan: Dict[str, Any]) -> Tuple[List[Tuple], str]:
+    """Nœuds du plan sans coûts ni timings -> (clé hachable, résumé lisible)"""
+    nodes: List[Tuple] = []
+    parts: List[str] = []
+
+    def _walk(node: Dict[str, Any], depth: int):
+        key = (depth, node.get('Node Type'), node.get('Relation Name'), node.get('Index Name'),
+               node.get('Join Type'), node.get('Strategy'))
+        nodes.append(key)
+        text = node.get('Node Type', '?')
+        if node.get('Index Name'):
+            text += f" {node['Index Name']}"
+        elif node.get('Relation Name'):
+            text += f" {node['Relation Name']}"
+        parts.append(text)
+        for child in node.get('Plans', ()):
+            _walk(child, depth + 1)
+
+    _walk(plan, 0)
+    return nodes, ' > '.join(parts)
+
+# ================================================================
+# AGRÉGATS
+# ================================================================
+
+@dataclass
+class QueryStats:
+    """Agrégats d'une requête normalisée depuis le démarrage"""
+    query_id: str
+    statement: str
+    query: str
+    explainable: bool
+    read_only: bool = False             # EXPLAIN ANALYZE permis (sinon EXPLAIN seul)
+    calls: int = 0
+    errors: int = 0
+    slow: int = 0
+    total: float = 0.0
+    max: float = 0.0
+    last_explain: float = 0.0
+
+    @property
+    def avg_ms(self) -> float:
+        return self.total / self.calls * 1000 if self.calls else 0.0
+
+class _Rollback(Exception):
+    """Annule la transaction de l'EXPLAIN ANALYZE"""
+
+# ================================================================
+# OBSERVATEUR
+# ================================================================
+
+class QueryObserver:
+    """Query logger asyncpg : latences, requêtes lentes, plans"""
+
+    def __init__(
+        self,
+        pool_getter: Callable,
+        slow_ms: float = 200.0,
+        sample_rate: float = 0.1,
+        explain_interval: float = 600.0,
+        explain_timeout_ms: int = 30000,
+        max_queries: int = 2000,
+        metrics: Optional[Metrics] = None,
+    ):
+        self.pool_getter = pool_getter
+        self.slow = slow_ms / 1000
+        self.sample_rate = sample_rate
+        self.explain_interval = explain_interval
+        self.explain_timeout_ms = explain_timeout_ms
+        self.max_queries = max_queries
+        self.metrics = metrics or Metrics(False)
+
+        self.queries: Dict[str, QueryStats] = {}       # Texte brut -> agrégats (partagés par query_id)
+        self._by_id: Dict[str, QueryStats] = {}
+        self._plans: Dict[str, str] = {}                # query_id -> dernier plan_hash connu
+        self.changes: deque = deque(maxlen=50)          # Changements de plan depuis le démarrage
+        self._explaining: Set[asyncio.Task] = set()
+        self._explain_lock = asyncio.Lock()
+        self.untracked = 0
+
+    # === Cycle de vie ===
+
+    async def start(self):
+        """Créer le schéma et charger les derniers plans connus"""
+        pool = self.pool_getter()
+        if pool is None:
+            return
+
+        try:
+            async with pool.acquire() as conn:
+                await conn.execute(SCHEMA_SQL)
+                rows = await conn.fetch(LATEST_PLANS_SQL)
+        except Exception as e:
+            logger.error("query_plans_load_failed", error=str(e))
+            return
+
+        self._plans = {row['query_id']: row['plan_hash'] for row in rows or ()}
+        logger.info("query_plans_loaded", queries=len(self._plans))
+
+    async def stop(self):
+        for task in list(self._explaining):
+            task.cancel()
+        await asyncio.gather(*self._explaining, return_exceptions=True)
+
+    async def attach(self, conn):
+        """setup= du pool : appelé à chaque acquire (ensemble de callbacks : idempotent)"""
+        if hasattr(conn, 'add_query_logger'):
+            conn.add_query_logger(self.on_query)
+
+    # === Mesure ===
+
+    def on_query(self, record):
+        """asyncpg.LoggedQuery : query, args, elapsed, exception"""
+        stats = self.queries.get(record.query)
+        if stats is None:
+            if MARKER in record.query:
+                return
+            stats = self._register(record.query)
+            if stats is None:
+                return
+
+        elapsed = record.elapsed
+        stats.calls += 1
+        stats.total += elapsed
+        if elapsed > stats.max:
+            stats.max = elapsed
+        self.metrics.db_query_duration.labels(statement=stats.statement).observe(elapsed)
+
+        if record.exception is not None:
+            stats.errors += 1
+            return
+        if elapsed < self.slow:
+            return
+
+        stats.slow += 1
+        self.metrics.db_slow_queries.labels(statement=stats.statement).inc()
+        logger.warning(
+            "slow_query",
+            query_id=stats.query_id,
+            statement=stats.statement,
+            duration_ms=round(elapsed * 1000, 1),
+            query=stats.query[:500],
+        )
+
+        # executemany : args = liste de lignes, pas de rejeu possible
+        if isinstance(record.args, tuple) and self._should_explain(stats):
+            stats.last_explain = time.monotonic()
+            task = asyncio.get_running_loop().create_task(self._explain(stats, record.query, record.args, elapsed))
+            self._explaining.add(task)
+            task.add_done_callback(self._explaining.discard)
+
+    def _register(self, query: str) -> Optional[QueryStats]:
+        normalized = normalize(query)
+        query_id = hashlib.blake2b(normalized.encode(), digest_size=8).hexdigest()
+        stats = self._by_id.get(query_id)
+        if stats is None:
+            if len(self._by_id) >= self.max_queries:
+                self.untracked += 1
+                return None
+            label = statement_label(normalized)
+            stats = QueryStats(
+                query_id=query_id,
+                statement=label,
+                query=normalized,
+                explainable=label.split(' ', 1)[0] in EXPLAINABLE and not NO_EXPLAIN_RE.search(normalized),
+                read_only=label.split(' ', 1)[0] in ('select', 'with') and not WRITE_RE.search(normalized),
+            )
+            self._by_id[query_id] = stats
+        if len(self.queries) < self.max_queries * 4:
+            self.queries[query] = stats
+        return stats
+
+    def _should_explain(self, stats: QueryStats) -> bool:
+        return (
+            stats.explainable
+            and self.sample_rate > 0
+            and random.random() < self.sample_rate
+            and time.monotonic() - stats.last_explain >= self.explain_interval
+            and not self._explain_lock.locked()
+        )
+
+    # === Plans ===
+
+    async def _explain(self, stats: QueryStats, query: str, args, elapsed: float):
+        """Rejouer sous EXPLAIN ANALYZE (un à la fois, transaction annulée)
+
+        Écritures : EXPLAIN sans ANALYZE (forme du plan seule) ; les rejouer
+        prendrait des verrous, déclencherait les triggers et écrirait du WAL.
+        """
+        pool = self.pool_getter()
+        if pool is None:
+            return
+        options = 'ANALYZE, BUFFERS, FORMAT JSON' if stats.read_only else 'FORMAT JSON'
+
+        raw = None
+        try:
+            async with self._explain_lock:
+                async with pool.acquire() as conn:
+                    try:
+                        async with conn.transaction():
+                            await conn.execute(f"{MARKER} SET LOCAL statement_timeout = {int(self.explain_timeout_ms)}")
+                            raw = await conn.fetchval(
+                                f"{MARKER} EXPLAIN ({options}) {query}", *args
+                            )
+                            raise _Rollback()
+                    except _Rollback:
+                        pass
+        except Exception as e:
+            logger.warning("explain_failed", query_id=stats.query_id, statement=stats.statement, error=str(e))
+            return
+
+        if not raw:
+            return
+        await self._record_plan(stats, raw, elapsed)
+
+    async def _record_plan(self, stats: QueryStats, raw, elapsed: float):
+        document = orjson.loads(raw) if isinstance(raw, (str, bytes)) else raw
+        explain = document[0] if isinstance(document, list) else document
+        nodes, shape = plan_shape(explain['Plan'])
+        plan_hash = hashlib.blake2b(orjson.dumps(nodes), digest_size=8).hexdigest()
+
+        top = explain['Plan']
+        logger.warning(
+            "slow_query_plan",
+            query_id=stats.query_id,
+            statement=stats.statement,
+            duration_ms=round(elapsed * 1000, 1),
+            execution_ms=explain.get('Execution Time'),
+            shared_hit=top.get('Shared Hit Blocks'),
+            shared_read=top.get('Shared Read Blocks'),
+            plan=shape,
+        )
+
+        previous = self._plans.get(stats.query_id)
+        changed = previous is not None and previous != plan_hash
+        self._plans[stats.query_id] = plan_hash
+        if changed:
+            self.changes.appendleft({
+                'statement': stats.statement,
+                'query_id': stats.query_id,
+                'shape': shape,
+                'max_ms': round(elapsed * 1000, 2),
+            })
+            self.metrics.db_plan_changes.labels(statement=stats.statement).inc()
+            logger.warning("query_plan_changed", query_id=stats.query_id, statement=stats.statement,
+                           previous=previous, plan_hash=plan_hash, plan=shape)
+
+        pool = self.pool_getter()
+        try:
+            async with pool.acquire() as conn:
+                await conn.execute(
+                    UPSERT_PLAN_SQL,
+                    stats.query_id, plan_hash, stats.statement, stats.query[:10000], shape,
+                    orjson.dumps(explain).decode(), previous if changed else None, round(elapsed * 1000, 2),
+                )
+        except Exception as e:
+            logger.error("query_plan_store_failed", query_id=stats.query_id, error=str(e))
+
+    async def plan_changes(self, limit: int = 10) -> List[Dict[str, Any]]:
+        """Changements de plan enregistrés (toutes instances)"""
+        pool = self.pool_getter()
+        if pool is None:
+            return list(self.changes)[:limit]
+        async with pool.acquire() as conn:
+            rows = await conn.fetch(PLAN_CHANGES_SQL, limit)
+        return [dict(row) for row in rows or ()]
+
+    # === Lecture ===
+
+    def top(self, limit: int = 10, key: str = 'total') -> List[QueryStats]:
+        """Requêtes les plus coûteuses (temps cumulé, max ou nombre de lentes)"""
+        return sorted(self._by_id.values(), key=lambda s: getattr(s, key), reverse=True)[:limit]
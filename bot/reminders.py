@@ -0,0 +1,444 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+================================================================
+REMINDERS - Rappels d'échéances (tâches, planning)
+================================================================
+Les rappels des prochaines heures (horizon) sont gardés dans un
+tas trié par date : une seule tâche dort jusqu'au prochain rappel,
+aucune requête par minute. PostgreSQL notifie les modifications de
+tasks / planning (LISTEN/NOTIFY) pour un rafraîchissement ciblé ;
+une resynchronisation périodique recharge l'horizon. Les envois
+sont réclamés dans reminder_deliveries : pas de doublon après un
+redémarrage ni entre instances.
+================================================================
+"""
+
+import time
+import heapq
+import asyncio
+import itertools
+from datetime import datetime, timedelta, timezone
+from zoneinfo import ZoneInfo
+from typing import Optional, List, Dict, Tuple, Set, Callable, Awaitable, Iterable
+
+import discord
+import structlog
+
+from services import Metrics, listen
+
+logger = structlog.get_logger(__name__)
+
+# ================================================================
+# SCHÉMA
+# ================================================================
+
+SCHEMA_SQL = '''
+CREATE TABLE IF NOT EXISTS reminder_deliveries (
+    source VARCHAR(20) NOT NULL,            -- tasks | planning
+    source_id BIGINT NOT NULL,
+    fire_at TIMESTAMPTZ NOT NULL,
+    user_id BIGINT NOT NULL,
+    status VARCHAR(20) NOT NULL DEFAULT 'pending',  -- pending | dm | channel | failed
+    created_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    sent_at TIMESTAMPTZ,
+    PRIMARY KEY (source, source_id, fire_at)
+);
+'''
+
+# Notifications des modifications (rafraîchissement ciblé)
+TRIGGERS_SQL = '''
+CREATE OR REPLACE FUNCTION notify_reminders() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'DELETE' THEN
+        PERFORM pg_notify('reminders', TG_TABLE_NAME || ':' || OLD.id);
+    ELSE
+        PERFORM pg_notify('reminders', TG_TABLE_NAME || ':' || NEW.id);
+    END IF;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS tasks_reminders ON tasks;
+CREATE TRIGGER tasks_reminders AFTER INSERT OR UPDATE OR DELETE ON tasks
+    FOR EACH ROW EXECUTE FUNCTION notify_reminders();
+
+DROP TRIGGER IF EXISTS planning_reminders ON planning;
+CREATE TRIGGER planning_reminders AFTER INSERT OR UPDATE OR DELETE ON planning
+    FOR EACH ROW EXECUTE FUNCTION notify_reminders();
+'''
+
+# Lignes sources : échéance + destinataire (colonnes communes aux deux tables).
+# Dates locales interprétées dans le fuseau du bot ($3), pas celui du serveur
+SOURCE_QUERIES = {
+    'tasks': '''
+        SELECT id, assignee_id AS user_id, description AS title, chantier,
+               due_date::timestamp AT TIME ZONE $3 AS due
+        FROM tasks
+        WHERE due_date IS NOT NULL
+          AND status NOT IN ('done', 'cancelled')
+          AND due_date::timestamp AT TIME ZONE $3 BETWEEN $1 AND $2
+    ''',
+    'planning': '''
+        SELECT id, user_id, type AS title, chantier,
+               date_debut::timestamp AT TIME ZONE $3 AS due
+        FROM planning
+        WHERE date_debut::timestamp AT TIME ZONE $3 BETWEEN $1 AND $2
+    ''',
+}
+
+NOTIFY_CHANNEL = 'reminders'
+
+# ================================================================
+# FILE DE RAPPELS
+# ================================================================
+
+class Reminder:
+    """Rappel planifié (compact : plusieurs dizaines de milliers en mémoire)"""
+
+    __slots__ = ('source', 'source_id', 'fire_at', 'due', 'user_id', 'title', 'chantier')
+
+    def __init__(self, source: str, source_id: int, fire_at: int, due: int,
+                 user_id: int, title: str, chantier: Optional[str]):
+        self.source = source
+        self.source_id = source_id
+        self.fire_at = fire_at
+        self.due = due
+        self.user_id = user_id
+        self.title = title
+        self.chantier = chantier
+
+    @property
+    def key(self) -> Tuple[str, int, int]:
+        return (self.source, self.source_id, self.fire_at)
+
+class ReminderQueue:
+    """Tas min par date + index par élément source (suppression paresseuse)"""
+
+    def __init__(self):
+        self._heap: List[Tuple[int, int, Reminder]] = []
+        self._by_item: Dict[Tuple[str, int], List[Reminder]] = {}
+        self._seq = itertools.count()
+        self._count = 0
+
+    def __len__(self) -> int:
+        return self._count
+
+    def replace(self, source: str, source_id: int, reminders: Iterable[Reminder]):
+        """Remplacer tous les rappels d'une ligne source"""
+        reminders = list(reminders)
+        self._count += len(reminders) - len(self._by_item.get((source, source_id), ()))
+        if reminders:
+            self._by_item[(source, source_id)] = reminders
+            for reminder in reminders:
+                heapq.heappush(self._heap, (reminder.fire_at, next(self._seq), reminder))
+        else:
+            self._by_item.pop((source, source_id), None)
+
+    def items(self) -> Set[Tuple[str, int]]:
+        return set(self._by_item)
+
+    def _live(self, reminder: Reminder) -> bool:
+        current = self._by_item.get((reminder.source, reminder.source_id))
+        return current is not None and any(r is reminder for r in current)
+
+    def next_deadline(self) -> Optional[float]:
+        while self._heap and not self._live(self._heap[0][2]):
+            heapq.heappop(self._heap)
+        return self._heap[0][0] if self._heap else None
+
+    def pop_due(self, now: float) -> List[Reminder]:
+        due = []
+        while self._heap and self._heap[0][0] <= now:
+            _, _, reminder = heapq.heappop(self._heap)
+            if not self._live(reminder):
+                continue
+            due.append(reminder)
+            self._count -= 1
+            remaining = [r for r in self._by_item[(reminder.source, reminder.source_id)] if r is not reminder]
+            if remaining:
+                self._by_item[(reminder.source, reminder.source_id)] = remaining
+            else:
+                del self._by_item[(reminder.source, reminder.source_id)]
+
+        # Compacter si trop d'entrées mortes
+        if len(self._heap) > 2 * len(self) + 1024:
+            self._heap = [entry for entry in self._heap if self._live(entry[2])]
+            heapq.heapify(self._heap)
+        return due
+
+# ================================================================
+# MOTEUR
+# ================================================================
+
+class ReminderEngine:
+    """Chargement par horizon, rafraîchissement ciblé, envoi DM / channel"""
+
+    def __init__(
+        self,
+        bot,
+        pool_getter: Callable,
+        listen_connect: Optional[Callable[[], Awaitable]] = None,
+        leads: Optional[Dict[str, List[int]]] = None,
+        horizon: float = 48 * 3600,
+        grace: float = 3600,
+        fallback_channel_id: Optional[int] = None,
+        fallback_channel_for: Optional[Callable[[int], Optional[int]]] = None,
+        concurrency: int = 5,
+        tz: str = 'UTC',
+        metrics: Optional[Metrics] = None,
+    ):
+        self.bot = bot
+        self.pool_getter = pool_getter
+        self.listen_connect = listen_connect  # Connexion dédiée au LISTEN (hors pools)
+        self.leads = leads or {'tasks': [1440, 60], 'planning': [720]}  # minutes avant l'échéance
+        self.horizon = horizon
+        self.grace = grace
+        self.fallback_channel_id = fallback_channel_id
+        self.fallback_channel_for = fallback_channel_for  # user_id -> channel (multi-serveurs)
+        self.tz = tz                        # Fuseau des échéances (colonnes DATE / TIMESTAMP)
+        self.zone = ZoneInfo(tz)            # Même fuseau pour l'affichage
+        self.metrics = metrics or Metrics(False)
+
+        self.queue = ReminderQueue()
+        self.sent = 0
+        self.failed = 0
+
+        self._delivered: Set[Tuple[str, int, int]] = set()
+        self._changed = asyncio.Event()
+        self._sending = asyncio.Semaphore(concurrency)
+        self._pending_refresh: Dict[str, Set[int]] = {}
+        self._tasks: List[asyncio.Task] = []
+        self._inflight: Set[asyncio.Task] = set()    # Rafraîchissements et envois en cours
+        self._flush_handle: Optional[asyncio.TimerHandle] = None
+
+    # === Cycle de vie ===
+
+    async def start(self):
+        """Créer le schéma, charger l'horizon, écouter les modifications (idempotent)"""
+        if self._tasks:
+            return
+
+        pool = self.pool_getter()
+        if pool is None:
+            logger.warning("reminders_no_database")
+            return
+
+        try:
+            async with pool.acquire() as conn:
+                await conn.execute(SCHEMA_SQL)
+                try:
+                    await conn.execute(TRIGGERS_SQL)
+                except Exception as e:
+                    logger.warning("reminders_triggers_failed", error=str(e))
+        except Exception as e:
+            logger.error("reminders_schema_failed", error=str(e))
+
+        await self.resync()
+        self._tasks.append(asyncio.create_task(self._run()))
+        self._tasks.append(asyncio.create_task(self._listen()))
+        logger.info("reminders_started", pending=len(self.queue))
+
+    async def stop(self):
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        self._pending_refresh.clear()
+        tasks = self._tasks + list(self._inflight)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._tasks.clear()
+        self._inflight.clear()
+
+    def _spawn(self, coro):
+        """Tâche gardée en référence (sinon collectable en cours d'exécution) et annulée par stop()"""
+        task = asyncio.create_task(coro)
+        self._inflight.add(task)
+        task.add_done_callback(self._inflight.discard)
+
+    # === Chargement ===
+
+    def _build(self, source: str, row) -> List[Reminder]:
+        """Rappels d'une ligne dans la fenêtre [maintenant - grâce, maintenant + horizon]"""
+        if row['due'] is None or row['user_id'] is None:
+            return []
+        now = time.time()
+        due = round(row['due'].timestamp())
+        reminders = []
+        for lead in self.leads.get(source, []):
+            fire_at = due - lead * 60
+            if now - self.grace <= fire_at <= now + self.horizon and (source, row['id'], fire_at) not in self._delivered:
+                reminders.append(Reminder(source, row['id'], fire_at, due, row['user_id'], row['title'] or '', row['chantier']))
+        return reminders
+
+    def _window(self, source: str) -> Tuple[datetime, datetime]:
+        """Échéances dont au moins un rappel tombe dans la fenêtre"""
+        now = datetime.now(timezone.utc)
+        leads = self.leads.get(source) or [0]
+        return (
+            now - timedelta(seconds=self.grace) + timedelta(minutes=min(leads)),
+            now + timedelta(seconds=self.horizon) + timedelta(minutes=max(leads)),
+        )
+
+    async def resync(self):
+        """Recharger tout l'horizon (démarrage, puis périodiquement)"""
+        pool = self.pool_getter()
+        if pool is None:
+            return
+
+        since = datetime.now(timezone.utc) - timedelta(seconds=self.grace)
+        try:
+            async with pool.acquire() as conn:
+                delivered = await conn.fetch(
+                    'SELECT source, source_id, fire_at FROM reminder_deliveries WHERE fire_at >= $1', since
+                )
+                self._delivered = {(r['source'], r['source_id'], round(r['fire_at'].timestamp())) for r in delivered}
+
+                loaded: Set[Tuple[str, int]] = set()
+                for source, query in SOURCE_QUERIES.items():
+                    rows = await conn.fetch(query, *self._window(source), self.tz)
+                    for row in rows:
+                        self.queue.replace(source, row['id'], self._build(source, row))
+                        loaded.add((source, row['id']))
+        except Exception as e:
+            logger.error("reminders_resync_failed", error=str(e))
+            return
+
+        # Lignes disparues de l'horizon (terminées, supprimées, déplacées)
+        for source, source_id in self.queue.items() - loaded:
+            self.queue.replace(source, source_id, [])
+
+        self._changed.set()
+        self.metrics.reminders_pending.set(len(self.queue))
+        logger.info("reminders_resynced", pending=len(self.queue))
+
+    async def refresh(self, source: str, ids: Iterable[int]):
+        """Recharger uniquement les lignes modifiées"""
+        ids = list(ids)
+        pool = self.pool_getter()
+        if pool is None or source not in SOURCE_QUERIES or not ids:
+            return
+
+        query = SOURCE_QUERIES[source].replace('WHERE', 'WHERE id = ANY($4::bigint[]) AND', 1)
+        try:
+            async with pool.acquire() as conn:
+                rows = await conn.fetch(query, *self._window(source), self.tz, ids)
+        except Exception as e:
+            logger.error("reminders_refresh_failed", source=source, error=str(e))
+            return
+
+        found = {row['id']: row for row in rows}
+        for source_id in ids:
+            row = found.get(source_id)
+            self.queue.replace(source, source_id, self._build(source, row) if row else [])
+
+        self._changed.set()
+        self.metrics.reminders_pending.set(len(self.queue))
+
+    def notify(self, source: str, source_id: int):
+        """Signaler une modification (regroupée puis rafraîchie)"""
+        first = not self._pending_refresh
+        self._pending_refresh.setdefault(source, set()).add(int(source_id))
+        if first:
+            self._flush_handle = asyncio.get_running_loop().call_later(1.0, self._flush_refresh)
+
+    def _flush_refresh(self):
+        self._flush_handle = None
+        pending, self._pending_refresh = self._pending_refresh, {}
+        for source, ids in pending.items():
+            self._spawn(self.refresh(source, ids))
+
+    async def _listen(self):
+        """LISTEN reminders sur une connexion dédiée (sinon : resynchro périodique seule)"""
+        if self.listen_connect is None:
+            return
+
+        def _on_notify(connection, pid, channel, payload: str):
+            source, _, source_id = payload.partition(':')
+            if source_id.isdigit():
+                self.notify(source, int(source_id))
+
+        await listen(self.listen_connect, NOTIFY_CHANNEL, _on_notify, on_reconnect=self.resync)
+
+    # === Envoi ===
+
+    async def _run(self):
+        while True:
+            deadline = self.queue.next_deadline()
+            delay = 300.0 if deadline is None else min(300.0, max(0.0, deadline - time.time()))
+
+            self._changed.clear()
+            try:
+                async with asyncio.timeout(delay):
+                    await self._changed.wait()
+            except TimeoutError:
+                pass
+
+            for reminder in self.queue.pop_due(time.time()):
+                self._spawn(self._deliver(reminder))
+            self.metrics.reminders_pending.set(len(self.queue))
+
+    async def _deliver(self, reminder: Reminder):
+        async with self._sending:
+            pool = self.pool_getter()
+            if pool is None:
+                return
+            fire_at = datetime.fromtimestamp(reminder.fire_at, timezone.utc)
+            try:
+                async with pool.acquire() as conn:
+                    claimed = await conn.fetchval('''
+                        INSERT INTO reminder_deliveries (source, source_id, fire_at, user_id)
+                        VALUES ($1, $2, $3, $4)
+                        ON CONFLICT DO NOTHING
+                        RETURNING source_id
+                    ''', reminder.source, reminder.source_id, fire_at, reminder.user_id)
+            except Exception as e:
+                logger.error("reminder_claim_failed", source=reminder.source, source_id=reminder.source_id, error=str(e))
+                return
+            self._delivered.add(reminder.key)
+            if claimed is None:
+                return  # Déjà envoyé (autre instance ou avant redémarrage)
+
+            status = await self._send(reminder)
+            if status == 'failed':
+                self.failed += 1
+            else:
+                self.sent += 1
+            self.metrics.reminders_sent.labels(status=status).inc()
+
+            try:
+                async with pool.acquire() as conn:
+                    await conn.execute('''
+                        UPDATE reminder_deliveries SET status = $4, sent_at = NOW()
+                        WHERE source = $1 AND source_id = $2 AND fire_at = $3
+                    ''', reminder.source, reminder.source_id, fire_at, status)
+            except Exception as e:
+                logger.error("reminder_status_failed", source=reminder.source, source_id=reminder.source_id, error=str(e))
+
+    def _format(self, reminder: Reminder) -> str:
+        due = datetime.fromtimestamp(reminder.due, self.zone).strftime('%d/%m %H:%M')
+        where = f" ({reminder.chantier})" if reminder.chantier else ""
+        if reminder.source == 'tasks':
+            return f"⏰ Rappel tâche #{reminder.source_id}{where} : {reminder.title[:300]}\nÉchéance : **{due}**"
+        return f"📅 Rappel planning{where} : {reminder.title[:300]}\nDébut : **{due}**"
+
+    async def _send(self, reminder: Reminder) -> str:
+        """DM, sinon mention dans le channel de repli"""
+        content = self._format(reminder)
+        try:
+            user = self.bot.get_user(reminder.user_id) or await self.bot.fetch_user(reminder.user_id)
+            await user.send(content)
+            return 'dm'
+        except Exception as e:
+            logger.warning("reminder_dm_failed", user_id=reminder.user_id, error=str(e))
+
+        channel_id = self.fallback_channel_for(reminder.user_id) if self.fallback_channel_for else self.fallback_channel_id
+        channel = self.bot.get_channel(channel_id) if channel_id else None
+        if channel:
+            try:
+                await channel.send(f"<@{reminder.user_id}> {content}")
+                return 'channel'
+            except discord.HTTPException as e:
+                logger.error("reminder_channel_failed", channel_id=channel_id, error=str(e))
+        return 'failed'
@@ -0,0 +1,452 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+================================================================
+REPORTS - Rapports hebdomadaires par chantier
+================================================================
+Pour une semaine ISO : volume de messages du channel chantier,
+tâches ouvertes / créées / clôturées, interventions planifiées,
+principaux contributeurs. Les agrégats de chaque chantier sont
+lus en parallèle (sémaphore : au plus N connexions du pool
+batch), puis le rendu CSV / HTML est fait dans un
+ProcessPoolExecutor. Les rapports sont gardés par (chantier,
+semaine ISO) : en mémoire, et sur disque pour les semaines
+terminées (data/reports/2026-W41/<chantier>.*).
+================================================================
+"""
+
+import io
+import os
+import re
+import csv
+import html
+import time
+import asyncio
+import multiprocessing
+from datetime import date, datetime, timedelta
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass, field
+from typing import Optional, List, Dict, Tuple, Any, Callable, Iterable
+
+import orjson
+import structlog
+
+from services import Metrics, Cache
+
+logger = structlog.get_logger(__name__)
+
+# ================================================================
+# SCHÉMA
+# ================================================================
+
+# Date de clôture des tâches (tâches clôturées dans la semaine)
+SCHEMA_SQL = '''
+ALTER TABLE tasks ADD COLUMN IF NOT EXISTS closed_at TIMESTAMPTZ;
+
+CREATE OR REPLACE FUNCTION tasks_closed_at() RETURNS trigger AS $$
+BEGIN
+    IF NEW.status IN ('done', 'cancelled') THEN
+        IF TG_OP = 'INSERT' OR OLD.status NOT IN ('done', 'cancelled') THEN
+            NEW.closed_at := COALESCE(NEW.closed_at, NOW());
+        END IF;
+    ELSE
+        NEW.closed_at := NULL;
+    END IF;
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS tasks_closed_at ON tasks;
+CREATE TRIGGER tasks_closed_at BEFORE INSERT OR UPDATE OF status ON tasks
+    FOR EACH ROW EXECUTE FUNCTION tasks_closed_at();
+'''
+
+CHANTIERS_SQL = '''
+SELECT nom, channel_id FROM chantiers WHERE status = 'actif' ORDER BY nom
+'''
+
+MESSAGES_SQL = '''
+SELECT created_at::date AS day, count(*) AS messages, count(DISTINCT user_id) AS authors
+FROM messages
+WHERE channel_id = $1 AND created_at >= $2 AND created_at < $3 AND NOT is_bot
+GROUP BY 1
+ORDER BY 1
+'''
+
+CONTRIBUTORS_SQL = '''
+SELECT user_id, max(user_name) AS user_name, count(*) AS messages
+FROM messages
+WHERE channel_id = $1 AND created_at >= $2 AND created_at < $3 AND NOT is_bot
+GROUP BY user_id
+ORDER BY messages DESC
+LIMIT $4
+'''
+
+TASK_COUNTS_SQL = '''
+SELECT
+    count(*) FILTER (WHERE status NOT IN ('done', 'cancelled')) AS open,
+    count(*) FILTER (WHERE created_at >= $2 AND created_at < $3) AS created,
+    count(*) FILTER (WHERE closed_at >= $2 AND closed_at < $3) AS closed,
+    count(*) FILTER (WHERE status NOT IN ('done', 'cancelled') AND due_date < $3) AS overdue
+FROM tasks
+WHERE chantier = $1
+'''
+
+OPEN_TASKS_SQL = '''
+SELECT id, description, assignee_name, status, due_date
+FROM tasks
+WHERE chantier = $1 AND status NOT IN ('done', 'cancelled')
+ORDER BY due_date NULLS LAST, id
+LIMIT $2
+'''
+
+PLANNING_SQL = '''
+SELECT user_name, type, date_debut, date_fin, notes
+FROM planning
+WHERE chantier = $1 AND date_debut < $3 AND COALESCE(date_fin, date_debut) >= $2
+ORDER BY date_debut, user_name
+'''
+
+FORMATS = ('csv', 'html')
+MEDIA_TYPES = {
+    'csv': 'text/csv; charset=utf-8',
+    'html': 'text/html; charset=utf-8',
+    'json': 'application/json',
+}
+
+# ================================================================
+# SEMAINES ISO
+# ================================================================
+
+def week_bounds(year: int, week: int) -> Tuple[date, date]:
+    """Lundi de la semaine, lundi suivant (exclu)"""
+    start = date.fromisocalendar(year, week, 1)
+    return start, start + timedelta(days=7)
+
+def previous_week(today: Optional[date] = None) -> Tuple[int, int]:
+    """Semaine ISO terminée la plus récente (le lundi : la semaine passée)"""
+    year, week, _ = ((today or date.today()) - timedelta(days=7)).isocalendar()
+    return year, week
+
+def parse_week(text: Optional[str], today: Optional[date] = None) -> Tuple[int, int]:
+    """'2026-W41', '2026-41', '41' (année courante) ; vide : semaine passée"""
+    today = today or date.today()
+    if not text:
+        return previous_week(today)
+    match = re.fullmatch(r'(?:(\d{4})-?W?)?(\d{1,2})', text.strip().upper())
+    try:
+        if not match:
+            raise ValueError(text)
+        year = int(match.group(1) or today.isocalendar()[0])
+        week = int(match.group(2))
+        week_bounds(year, week)  # Semaine 53 inexistante, semaine 0...
+    except ValueError:
+        raise ValueError(f"semaine invalide : {text} (attendu AAAA-Wss)") from None
+    return year, week
+
+def week_label(year: int, week: int) -> str:
+    return f"{year}-W{week:02d}"
+
+def slugify(name: str) -> str:
+    return re.sub(r'[^\w-]+', '-', name.lower()).strip('-') or 'chantier'
+
+# ================================================================
+# RENDU (processus séparé)
+# ================================================================
+
+def _csv(report: Dict[str, Any]) -> bytes:
+    """CSV par sections, séparateur ; (Excel français), BOM UTF-8"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, delimiter=';')
+    writer.writerow(['Chantier', report['chantier']])
+    writer.writerow(['Semaine', report['week'], report['start'], report['end']])
+    writer.writerow([])
+
+    writer.writerow(['Jour', 'Messages', 'Auteurs'])
+    for row in report['days']:
+        writer.writerow([row['day'], row['messages'], row['authors']])
+    writer.writerow([])
+
+    tasks = report['tasks']
+    writer.writerow(['Tâches ouvertes', 'Créées', 'Clôturées', 'En retard'])
+    writer.writerow([tasks['open'], tasks['created'], tasks['closed'], tasks['overdue']])
+    writer.writerow([])
+
+    writer.writerow(['Tâche', 'Description', 'Assignée à', 'Statut', 'Échéance'])
+    for task in report['open_tasks']:
+        writer.writerow([task['id'], task['description'], task['assignee_name'], task['status'], task['due_date'] or ''])
+    writer.writerow([])
+
+    writer.writerow(['Intervenant', 'Type', 'Début', 'Fin', 'Notes'])
+    for event in report['planning']:
+        writer.writerow([event['user_name'], event['type'], event['date_debut'], event['date_fin'] or '', event['notes'] or ''])
+    writer.writerow([])
+
+    writer.writerow(['Contributeur', 'Messages'])
+    for contributor in report['contributors']:
+        writer.writerow([contributor['user_name'], contributor['messages']])
+
+    return buffer.getvalue().encode('utf-8-sig')
+
+def _table(headers: List[str], rows: Iterable[Iterable[Any]]) -> str:
+    head = ''.join(f'<th>{html.escape(h)}</th>' for h in headers)
+    body = ''.join(
+        '<tr>' + ''.join(f'<td>{html.escape(str(v if v is not None else ""))}</td>' for v in row) + '</tr>'
+        for row in rows
+    )
+    return f'<table><thead><tr>{head}</tr></thead><tbody>{body or "<tr><td colspan=99>-</td></tr>"}</tbody></table>'
+
+def _html(report: Dict[str, Any]) -> bytes:
+    """Page autonome (CSS en ligne), imprimable en PDF depuis le navigateur"""
+    tasks = report['tasks']
+    peak = max([row['messages'] for row in report['days']] or [1])
+    bars = ''.join(
+        f'<div class="bar"><span>{html.escape(str(row["day"]))}</span>'
+        f'<i style="width:{row["messages"] * 100 // peak}%"></i><b>{row["messages"]}</b></div>'
+        for row in report['days']
+    )
+    title = f"{html.escape(report['chantier'])} — semaine {html.escape(report['week'])}"
+    page = f'''<!DOCTYPE html>
+<html lang="fr"><head><meta charset="utf-8"><title>{title}</title>
+<style>
+body{{font-family:system-ui,sans-serif;margin:2em;color:#222}}
+h1{{font-size:1.4em}} h2{{font-size:1.1em;margin-top:1.6em}}
+.kpi{{display:flex;gap:1em}} .kpi div{{border:1px solid #ddd;border-radius:6px;padding:.6em 1em}}
+.kpi b{{display:block;font-size:1.5em}}
+table{{border-collapse:collapse;width:100%}} th,td{{border-bottom:1px solid #eee;padding:.3em .5em;text-align:left}}
+.bar{{display:flex;align-items:center;gap:.5em}} .bar span{{width:7em}}
+.bar i{{display:inline-block;height:.8em;background:#5865f2}}
+</style></head><body>
+<h1>{title}</h1>
+<p>Du {report['start']} au {report['end']} · généré le {report['generated_at']}</p>
+<div class="kpi">
+<div><b>{report['messages']}</b>messages</div>
+<div><b>{tasks['open']}</b>tâches ouvertes</div>
+<div><b>{tasks['created']}</b>créées</div>
+<div><b>{tasks['closed']}</b>clôturées</div>
+<div><b>{tasks['overdue']}</b>en retard</div>
+<div><b>{len(report['planning'])}</b>interventions</div>
+</div>
+<h2>Messages par jour</h2>{bars or '<p>Aucun message.</p>'}
+<h2>Interventions</h2>{_table(['Intervenant', 'Type', 'Début', 'Fin', 'Notes'],
+    ([e['user_name'], e['type'], e['date_debut'], e['date_fin'], e['notes']] for e in report['planning']))}
+<h2>Tâches ouvertes</h2>{_table(['#', 'Description', 'Assignée à', 'Statut', 'Échéance'],
+    ([t['id'], t['description'], t['assignee_name'], t['status'], t['due_date']] for t in report['open_tasks']))}
+<h2>Contributeurs</h2>{_table(['Membre', 'Messages'],
+    ([c['user_name'], c['messages']] for c in report['contributors']))}
+</body></html>
+'''
+    return page.encode('utf-8')
+
+RENDERERS = {'csv': _csv, 'html': _html}
+
+def render_report(report: Dict[str, Any], directory: str, basename: str, formats: Tuple[str, ...] = FORMATS) -> Dict[str, str]:
+    """Écrire le JSON et les rendus demandés (exécuté dans le pool de processus)"""
+    os.makedirs(directory, exist_ok=True)
+    paths = {}
+    outputs = {'json': orjson.dumps(report, option=orjson.OPT_INDENT_2)}
+    outputs.update((fmt, RENDERERS[fmt](report)) for fmt in formats)
+    for fmt, content in outputs.items():
+        path = os.path.join(directory, f"{basename}.{fmt}")
+        temp = f"{path}.tmp"
+        with open(temp, 'wb') as handle:
+            handle.write(content)
+        os.replace(temp, path)
+        paths[fmt] = path
+    return paths
+
+# ================================================================
+# MOTEUR
+# ================================================================
+
+@dataclass
+class Report:
+    """Rapport d'un chantier pour une semaine ISO"""
+    chantier: str
+    year: int
+    week: int
+    summary: Dict[str, Any]
+    files: Dict[str, str] = field(default_factory=dict)   # format -> chemin
+
+    @property
+    def label(self) -> str:
+        return week_label(self.year, self.week)
+
+class ReportEngine:
+    """Agrégats bornés côté base, rendu hors de la boucle, cache par (chantier, semaine)"""
+
+    def __init__(
+        self,
+        pool_getter: Callable,
+        root: str,
+        workers: int = 2,
+        db_concurrency: int = 3,
+        top_contributors: int = 5,
+        max_open_tasks: int = 50,
+        metrics: Optional[Metrics] = None,
+    ):
+        self.pool_getter = pool_getter
+        self.root = root
+        self.workers = workers
+        self.db_concurrency = db_concurrency
+        self.top_contributors = top_contributors
+        self.max_open_tasks = max_open_tasks
+        self.metrics = metrics or Metrics(False)
+
+        self.cache = Cache(default_ttl=24 * 3600, max_items=500)
+        self._db_slots = asyncio.Semaphore(db_concurrency)
+        self._executor: Optional[ProcessPoolExecutor] = None
+
+    # === Cycle de vie ===
+
+    async def start(self):
+        """Colonne closed_at des tâches, dossier, pool de processus (idempotent)"""
+        if self._executor is not None:
+            return
+
+        os.makedirs(self.root, exist_ok=True)
+        pool = self.pool_getter()
+        if pool is not None:
+            try:
+                async with pool.acquire() as conn:
+                    await conn.execute(SCHEMA_SQL)
+            except Exception as e:
+                logger.error("reports_schema_failed", error=str(e))
+
+        self._executor = self._new_executor()
+
+    def _new_executor(self) -> ProcessPoolExecutor:
+        # spawn : pas de fork d'un processus multi-thread (sink de logs, boucle asyncio)
+        return ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context('spawn'))
+
+    async def stop(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    # === Lecture ===
+
+    async def chantiers(self) -> List[Dict[str, Any]]:
+        """Chantiers actifs (nom, channel_id)"""
+        async with self.pool_getter().acquire() as conn:
+            rows = await conn.fetch(CHANTIERS_SQL)
+        return [dict(row) for row in rows]
+
+    def directory(self, year: int, week: int) -> str:
+        return os.path.join(self.root, week_label(year, week))
+
+    async def report(self, chantier: str, channel_id: Optional[int], year: int, week: int,
+                     today: Optional[date] = None) -> Report:
+        """Rapport en cache, sinon lu sur disque (semaine terminée), sinon généré"""
+        start, end = week_bounds(year, week)
+        finished = end <= (today or date.today())
+        key = f"{slugify(chantier)}:{week_label(year, week)}"
+
+        async def _load() -> Report:
+            if finished:
+                cached = await self._from_disk(chantier, year, week)
+                if cached is not None:
+                    self.metrics.reports_total.labels(status='disk').inc()
+                    return cached
+            return await self._generate(chantier, channel_id, year, week, complete=finished)
+
+        # Semaine en cours : données encore mouvantes, cache court
+        return await self.cache.get_or_load(key, _load, ttl=None if finished else 600)
+
+    async def generate_all(
+        self,
+        chantiers: Iterable[Dict[str, Any]],
+        year: int,
+        week: int,
+    ) -> Tuple[List[Report], Dict[str, BaseException]]:
+        """Tous les chantiers en parallèle (connexions bornées par le sémaphore)"""
+        chantiers = list(chantiers)
+        results = await asyncio.gather(
+            *(self.report(c['nom'], c['channel_id'], year, week) for c in chantiers),
+            return_exceptions=True,
+        )
+        reports, errors = [], {}
+        for chantier, result in zip(chantiers, results):
+            if isinstance(result, BaseException):
+                errors[chantier['nom']] = result
+                logger.error("report_failed", chantier=chantier['nom'], week=week_label(year, week), error=str(result))
+            else:
+                reports.append(result)
+        return reports, errors
+
+    # === Génération ===
+
+    async def _from_disk(self, chantier: str, year: int, week: int) -> Optional[Report]:
+        directory = self.directory(year, week)
+        basename = slugify(chantier)
+        paths = {fmt: os.path.join(directory, f"{basename}.{fmt}") for fmt in ('json',) + FORMATS}
+
+        def _read():
+            if not all(os.path.exists(path) for path in paths.values()):
+                return None
+            with open(paths['json'], 'rb') as handle:
+                summary = orjson.loads(handle.read())
+            # Aperçu rendu pendant la semaine : données partielles, à régénérer
+            return summary if summary.get('complete') else None
+
+        summary = await asyncio.get_running_loop().run_in_executor(None, _read)
+        if summary is None:
+            return None
+        return Report(chantier, year, week, summary, paths)
+
+    async def _generate(self, chantier: str, channel_id: Optional[int], year: int, week: int,
+                        complete: bool = False) -> Report:
+        start_time = time.perf_counter()
+        summary = await self._collect(chantier, channel_id, year, week)
+        summary['complete'] = complete     # Semaine terminée : fichiers réutilisables par _from_disk
+        collected = time.perf_counter()
+        self.metrics.report_duration.labels(stage='collect').observe(collected - start_time)
+
+        loop = asyncio.get_running_loop()
+        args = (render_report, summary, self.directory(year, week), slugify(chantier))
+        try:
+            files = await loop.run_in_executor(self._executor, *args)
+        except BrokenProcessPool as e:
+            # Processus tué : pool recréé, une seconde tentative
+            logger.error("reports_process_pool_broken", chantier=chantier, error=str(e))
+            self._executor.shutdown(wait=False)
+            self._executor = self._new_executor()
+            files = await loop.run_in_executor(self._executor, *args)
+
+        self.metrics.report_duration.labels(stage='render').observe(time.perf_counter() - collected)
+        self.metrics.reports_total.labels(status='generated').inc()
+        logger.info("report_generated", chantier=chantier, week=week_label(year, week),
+                    messages=summary['messages'], duration_ms=round((time.perf_counter() - start_time) * 1000))
+        return Report(chantier, year, week, summary, files)
+
+    async def _collect(self, chantier: str, channel_id: Optional[int], year: int, week: int) -> Dict[str, Any]:
+        """Agrégats d'un chantier : une connexion batch, au plus db_concurrency à la fois"""
+        start, end = week_bounds(year, week)
+        async with self._db_slots:
+            async with self.pool_getter().acquire() as conn:
+                if channel_id:
+                    days = await conn.fetch(MESSAGES_SQL, channel_id, start, end)
+                    contributors = await conn.fetch(CONTRIBUTORS_SQL, channel_id, start, end, self.top_contributors)
+                else:
+                    days, contributors = [], []
+                counts = await conn.fetchrow(TASK_COUNTS_SQL, chantier, start, end)
+                open_tasks = await conn.fetch(OPEN_TASKS_SQL, chantier, self.max_open_tasks)
+                planning = await conn.fetch(PLANNING_SQL, chantier, start, end)
+
+        # Dicts simples (picklables, sérialisables) pour le processus de rendu
+        days = [dict(row) for row in days or ()]
+        return {
+            'chantier': chantier,
+            'channel_id': channel_id,
+            'week': week_label(year, week),
+            'start': start.isoformat(),
+            'end': (end - timedelta(days=1)).isoformat(),
+            'generated_at': datetime.now().strftime('%d/%m/%Y %H:%M'),
+            'messages': sum(row['messages'] for row in days),
+            'days': days,
+            'contributors': [dict(row) for row in contributors or ()],
+            'tasks': {key: (counts or {}).get(key) or 0 for key in ('open', 'created', 'closed', 'overdue')},
+            'open_tasks': [dict(row) for row in open_tasks or ()],
+            'planning': [dict(row) for row in planning or ()],
+        }
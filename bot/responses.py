@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+================================================================
+RESPONSES - Sérialisation et compression des réponses API
+================================================================
+JSON encodé par orjson (datetime, date, UUID natifs ; Decimal
+converti en nombre), compressé au-delà d'une taille minimale
+(zstd si le module zstandard est installé, sinon gzip) et
+identifié par un ETag faible : un client qui renvoie
+If-None-Match reçoit un 304 sans corps. Un Payload peut être
+gardé en cache : encodage, empreinte et compression ne sont
+alors faits qu'une fois.
+================================================================
+"""
+
+import gzip
+import hashlib
+from decimal import Decimal
+from typing import Any, Dict, Optional, Union
+
+import orjson
+from fastapi import Request
+from fastapi.responses import Response
+
+try:
+    import zstandard
+    _zstd = zstandard.ZstdCompressor(level=3)
+except ImportError:  # pragma: no cover
+    _zstd = None
+
+MEDIA_TYPE = 'application/json'
+
+# ================================================================
+# ENCODAGE
+# ================================================================
+
+def _default(obj: Any) -> Any:
+    """Types non gérés nativement par orjson"""
+    if isinstance(obj, Decimal):
+        # SUM / AVG PostgreSQL (numeric) : entier si possible
+        if obj.is_finite() and obj == obj.to_integral_value():
+            return int(obj)
+        return float(obj)
+    if isinstance(obj, (set, frozenset)):
+        return list(obj)
+    if hasattr(obj, 'items'):
+        return dict(obj.items())  # asyncpg.Record
+    raise TypeError(f"Type non sérialisable : {type(obj).__name__}")
+
+def dumps(data: Any) -> bytes:
+    return orjson.dumps(data, default=_default, option=orjson.OPT_NON_STR_KEYS)
+
+class FastJSONResponse(Response):
+    """Remplace JSONResponse (json stdlib) : orjson + Decimal"""
+    media_type = MEDIA_TYPE
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+# ================================================================
+# CORPS MIS EN CACHE
+# ================================================================
+
+class Payload:
+    """Corps JSON encodé une fois ; ETag et variantes compressées mémorisés"""
+
+    __slots__ = ('body', 'etag', '_encoded')
+
+    def __init__(self, data: Any = None, body: Optional[bytes] = None):
+        self.body = dumps(data) if body is None else body
+        self.etag = f'W/"{hashlib.blake2b(self.body, digest_size=12).hexdigest()}"'
+        self._encoded: Dict[str, bytes] = {}
+
+    def encoded(self, encoding: str) -> bytes:
+        content = self._encoded.get(encoding)
+        if content is None:
+            if encoding == 'zstd':
+                content = _zstd.compress(self.body)
+            else:
+                content = gzip.compress(self.body, compresslevel=5, mtime=0)
+            self._encoded[encoding] = content
+        return content
+
+def _accepted(header: str) -> Dict[str, float]:
+    """Accept-Encoding -> {encodage: q}"""
+    accepted = {}
+    for part in header.lower().split(','):
+        name, _, params = part.partition(';')
+        q = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        if name.strip():
+            accepted[name.strip()] = q
+    return accepted
+
+def negotiate(header: Optional[str]) -> Optional[str]:
+    """Encodage retenu : zstd (si disponible) puis gzip"""
+    if not header:
+        return None
+    accepted = _accepted(header)
+    if _zstd is not None and accepted.get('zstd', 0) > 0:
+        return 'zstd'
+    if accepted.get('gzip', 0) > 0:
+        return 'gzip'
+    return None
+
+def _matches(header: str, etag: str) -> bool:
+    """If-None-Match : comparaison faible (préfixe W/ ignoré)"""
+    if header.strip() == '*':
+        return True
+    opaque = etag.removeprefix('W/')
+    return any(candidate.strip().removeprefix('W/') == opaque for candidate in header.split(','))
+
+# ================================================================
+# RÉPONSE
+# ================================================================
+
+def json_response(
+    request: Request,
+    content: Union[Payload, Any],
+    status_code: int = 200,
+    max_age: int = 0,
+    minimum_size: int = 1024,
+) -> Response:
+    """Réponse JSON avec ETag, 304 conditionnel et compression
+
+    max_age = 0 : le client revalide à chaque appel (If-None-Match).
+    """
+    payload = content if isinstance(content, Payload) else Payload(content)
+    headers = {
+        'ETag': payload.etag,
+        'Cache-Control': f'private, max-age={max_age}' if max_age else 'private, no-cache',
+        'Vary': 'Accept-Encoding',
+    }
+
+    if_none_match = request.headers.get('if-none-match')
+    if status_code == 200 and if_none_match and _matches(if_none_match, payload.etag):
+        return Response(status_code=304, headers=headers)
+
+    body = payload.body
+    if len(body) >= minimum_size:
+        encoding = negotiate(request.headers.get('accept-encoding'))
+        if encoding:
+            body = payload.encoded(encoding)
+            headers['Content-Encoding'] = encoding
+
+    return Response(content=body, status_code=status_code, media_type=MEDIA_TYPE, headers=headers)
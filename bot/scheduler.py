@@ -0,0 +1,514 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+================================================================
+SCHEDULER - Tâches planifiées persistantes (cron)
+================================================================
+Chaque exécution planifiée est réclamée dans PostgreSQL
+(scheduled_jobs.last_scheduled_at) : une seule instance l'exécute,
+même après redémarrage ou reconnexion. Un bail Redis (ou un verrou
+consultatif PostgreSQL) empêche deux exécutions simultanées d'un
+même job. Les occurrences manquées sont rattrapées selon la
+politique du job ; l'historique va dans job_runs.
+================================================================
+"""
+
+import os
+import time
+import socket
+import random
+import asyncio
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Optional, List, Dict, Callable, Awaitable, Set
+from zoneinfo import ZoneInfo
+
+import structlog
+
+from services import Metrics, UnitOfWork
+
+logger = structlog.get_logger(__name__)
+
+# ================================================================
+# SCHÉMA
+# ================================================================
+
+SCHEMA_SQL = '''
+CREATE TABLE IF NOT EXISTS scheduled_jobs (
+    name VARCHAR(100) PRIMARY KEY,
+    cron VARCHAR(100) NOT NULL,
+    last_scheduled_at TIMESTAMPTZ,          -- Dernière occurrence réclamée
+    next_run_at TIMESTAMPTZ,
+    last_run_at TIMESTAMPTZ,
+    last_status VARCHAR(20),                -- ok | error | skipped
+    last_duration_ms INTEGER,
+    last_error TEXT
+);
+
+CREATE TABLE IF NOT EXISTS job_runs (
+    id BIGSERIAL PRIMARY KEY,
+    job VARCHAR(100) NOT NULL,
+    scheduled_for TIMESTAMPTZ,
+    started_at TIMESTAMPTZ NOT NULL,
+    finished_at TIMESTAMPTZ NOT NULL,
+    duration_ms INTEGER NOT NULL,
+    status VARCHAR(20) NOT NULL,            -- ok | error | skipped
+    trigger VARCHAR(20) NOT NULL,           -- schedule | catch_up | manual
+    error TEXT,
+    instance VARCHAR(100)
+);
+
+CREATE INDEX IF NOT EXISTS idx_job_runs_job
+    ON job_runs (job, started_at DESC);
+'''
+
+MISFIRE_POLICIES = ('skip', 'run_once', 'catch_up')
+
+# ================================================================
+# CRON
+# ================================================================
+
+CRON_ALIASES = {
+    '@hourly': '0 * * * *',
+    '@daily': '0 0 * * *',
+    '@weekly': '0 0 * * 1',
+    '@monthly': '0 0 1 * *',
+}
+
+class CronExpression:
+    """Expression cron 5 champs : minute heure jour mois jour-semaine (0/7 = dimanche)"""
+
+    FIELDS = ((0, 59), (0, 23), (1, 31), (1, 12), (0, 7))
+
+    def __init__(self, expression: str):
+        self.expression = expression
+        parts = CRON_ALIASES.get(expression, expression).split()
+        if len(parts) != 5:
+            raise ValueError(f"expression cron invalide : {expression!r}")
+
+        fields = [self._parse(part, low, high) for part, (low, high) in zip(parts, self.FIELDS)]
+        self.minutes, self.hours, self.days, self.months, weekdays = (sorted(f) for f in fields)
+        self.weekdays = {0 if d == 7 else d for d in weekdays}
+        self._any_day = parts[2] == '*'
+        self._any_weekday = parts[4] == '*'
+
+    @staticmethod
+    def _parse(part: str, low: int, high: int) -> Set[int]:
+        values = set()
+        for item in part.split(','):
+            item, _, step = item.partition('/')
+            if item == '*':
+                start, end = low, high
+            elif '-' in item:
+                start, end = (int(x) for x in item.split('-', 1))
+            else:
+                start = end = int(item)
+                if step:
+                    end = high
+            if start < low or end > high or start > end:
+                raise ValueError(f"valeur cron hors limites : {part!r}")
+            values.update(range(start, end + 1, int(step) if step else 1))
+        return values
+
+    def _day_matches(self, day: datetime) -> bool:
+        in_month = day.day in self.days
+        in_week = day.isoweekday() % 7 in self.weekdays
+        # Cron : si jour du mois ET jour de semaine sont restreints, l'un ou l'autre suffit
+        if self._any_day or self._any_weekday:
+            return in_month and in_week
+        return in_month or in_week
+
+    def next(self, after: datetime) -> datetime:
+        """Prochaine occurrence strictement après `after` (fuseau de `after`)"""
+        current = (after + timedelta(minutes=1)).replace(second=0, microsecond=0)
+
+        for _ in range(366 * 5):
+            if current.month in self.months and self._day_matches(current):
+                for hour in self.hours:
+                    if hour < current.hour:
+                        continue
+                    for minute in self.minutes:
+                        if hour == current.hour and minute < current.minute:
+                            continue
+                        return current.replace(hour=hour, minute=minute)
+            current = (current + timedelta(days=1)).replace(hour=0, minute=0)
+
+        raise ValueError(f"aucune occurrence pour {self.expression!r}")
+
+    def __str__(self) -> str:
+        return self.expression
+
+# ================================================================
+# JOBS
+# ================================================================
+
+@dataclass
+class Job:
+    """Job planifié et son état d'exécution"""
+    name: str
+    cron: CronExpression
+    func: Callable[[], Awaitable]
+    misfire: str = 'run_once'          # skip | run_once | catch_up
+    misfire_grace: float = 300.0       # Retard toléré avant de considérer une occurrence manquée
+    max_catch_up: int = 10
+    jitter: float = 0.0                # Décalage aléatoire (secondes) après l'heure prévue
+    lease_ttl: float = 600.0
+    timeout: Optional[float] = None
+
+    last_scheduled: Optional[datetime] = None
+    next_run: Optional[datetime] = None
+    due_at: Optional[datetime] = None
+    running: bool = False
+    last_status: Optional[str] = None
+    last_duration: Optional[float] = None
+    last_error: Optional[str] = None
+    runs: int = 0
+    failures: int = 0
+
+class Scheduler:
+    """Ordonnanceur cron persistant (PostgreSQL) avec baux (Redis ou verrou consultatif)"""
+
+    def __init__(
+        self,
+        pool_getter: Callable,
+        redis_getter: Optional[Callable] = None,
+        lock_connect: Optional[Callable[[], Awaitable]] = None,
+        timezone: str = 'Europe/Paris',
+        metrics: Optional[Metrics] = None,
+        instance: Optional[str] = None,
+    ):
+        self.pool_getter = pool_getter
+        self.redis_getter = redis_getter
+        self.lock_connect = lock_connect    # Connexion dédiée au verrou consultatif (hors pools)
+        self.tz = ZoneInfo(timezone)
+        self.metrics = metrics or Metrics(False)
+        self.instance = instance or f"{socket.gethostname()}:{os.getpid()}"
+
+        self.jobs: Dict[str, Job] = {}
+        self._task: Optional[asyncio.Task] = None
+        self._running: Set[asyncio.Task] = set()
+
+    # === Déclaration ===
+
+    def add(self, name: str, cron: str, func: Callable[[], Awaitable], **options) -> Job:
+        misfire = options.get('misfire', 'run_once')
+        if misfire not in MISFIRE_POLICIES:
+            raise ValueError(f"politique de rattrapage inconnue : {misfire}")
+        job = self.jobs[name] = Job(name=name, cron=CronExpression(cron), func=func, **options)
+        return job
+
+    def job(self, cron: str, name: Optional[str] = None, **options):
+        """Décorateur : @scheduler.job('0 6 * * 1', misfire='run_once')"""
+        def decorator(func):
+            self.add(name or func.__name__, cron, func, **options)
+            return func
+        return decorator
+
+    # === Cycle de vie ===
+
+    async def start(self):
+        """Charger l'état persistant et démarrer la boucle (idempotent)"""
+        if self._task and not self._task.done():
+            return  # on_ready peut être rappelé après reconnexion
+
+        await self._load_state()
+        now = self._now()
+        for job in self.jobs.values():
+            # Sans historique : première occurrence future, pas de rattrapage
+            job.next_run = job.cron.next(job.last_scheduled or now)
+            job.due_at = self._with_jitter(job)
+
+        self._task = asyncio.create_task(self._loop())
+        logger.info("scheduler_started", jobs=len(self.jobs), instance=self.instance)
+
+    async def stop(self):
+        tasks = [t for t in [self._task, *self._running] if t]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._task = None
+        self._running.clear()
+
+    async def _load_state(self):
+        pool = self.pool_getter()
+        if pool is None:
+            logger.warning("scheduler_no_database")
+            return
+
+        try:
+            async with pool.acquire() as conn:
+                await conn.execute(SCHEMA_SQL)
+                await conn.executemany('''
+                    INSERT INTO scheduled_jobs (name, cron) VALUES ($1, $2)
+                    ON CONFLICT (name) DO UPDATE SET cron = EXCLUDED.cron
+                ''', [(job.name, str(job.cron)) for job in self.jobs.values()])
+                rows = await conn.fetch(
+                    'SELECT name, last_scheduled_at, last_status, last_duration_ms, last_error FROM scheduled_jobs'
+                )
+        except Exception as e:
+            logger.error("scheduler_state_load_failed", error=str(e))
+            return
+
+        for row in rows:
+            job = self.jobs.get(row['name'])
+            if job is None:
+                continue
+            if row['last_scheduled_at']:
+                job.last_scheduled = row['last_scheduled_at'].astimezone(self.tz)
+            job.last_status = row['last_status']
+            job.last_duration = row['last_duration_ms'] / 1000 if row['last_duration_ms'] is not None else None
+            job.last_error = row['last_error']
+
+    # === Boucle ===
+
+    def _now(self) -> datetime:
+        return datetime.now(self.tz)
+
+    def _with_jitter(self, job: Job) -> datetime:
+        return job.next_run + timedelta(seconds=random.uniform(0, job.jitter)) if job.jitter else job.next_run
+
+    async def _loop(self):
+        while True:
+            now = self._now()
+            for job in self.jobs.values():
+                if job.due_at and job.due_at <= now:
+                    try:
+                        await self._fire(job, now)
+                    except Exception as e:
+                        logger.error("scheduler_fire_failed", job=job.name, error=str(e))
+
+            # Réveil au prochain job (max 60s : changement d'heure, veille)
+            upcoming = min((job.due_at for job in self.jobs.values() if job.due_at), default=None)
+            delay = 60.0 if upcoming is None else (upcoming - self._now()).total_seconds()
+            await asyncio.sleep(max(0.0, min(delay, 60.0)))
+
+    async def _fire(self, job: Job, now: datetime):
+        """Occurrences échues : appliquer la politique de rattrapage puis lancer"""
+        overdue, fire = [], job.next_run
+        while fire <= now and len(overdue) < 1000:
+            overdue.append(fire)
+            fire = job.cron.next(fire)
+
+        latest = overdue[-1]
+        job.next_run = fire
+        job.due_at = self._with_jitter(job)
+
+        # Une seule instance réclame l'occurrence
+        if not await self._claim(job, latest):
+            return
+        job.last_scheduled = latest
+
+        # Jitter : décalage voulu, pas un retard
+        grace = timedelta(seconds=job.misfire_grace + job.jitter)
+        late = [(f, 'catch_up') for f in overdue if now - f > grace]
+        on_time = [(f, 'schedule') for f in overdue if now - f <= grace]
+
+        if job.misfire == 'catch_up':
+            runs = late[-job.max_catch_up:] + on_time
+        else:
+            # run_once : l'occurrence manquée la plus récente, si encore dans le délai toléré
+            runs = on_time[-1:]
+
+        if len(overdue) > len(runs):
+            logger.info("job_misfired", job=job.name, missed=len(overdue) - len(runs), policy=job.misfire)
+        if runs:
+            self._spawn(job, runs)
+        elif job.misfire == 'run_once':
+            await self._record(job, latest, 'catch_up', 'skipped', 0.0,
+                               f"occurrence manquée de plus de {job.misfire_grace:.0f}s")
+
+    async def _claim(self, job: Job, scheduled_for: datetime) -> bool:
+        pool = self.pool_getter()
+        if pool is None:
+            return True  # Sans base : exécution locale
+
+        async with pool.acquire() as conn:
+            claimed = await conn.fetchval('''
+                UPDATE scheduled_jobs
+                SET last_scheduled_at = $2, next_run_at = $3
+                WHERE name = $1 AND (last_scheduled_at IS NULL OR last_scheduled_at < $2)
+                RETURNING name
+            ''', job.name, scheduled_for, job.next_run)
+        return claimed is not None
+
+    def _spawn(self, job: Job, runs: List):
+        task = asyncio.create_task(self._execute(job, runs))
+        self._running.add(task)
+        task.add_done_callback(self._running.discard)
+
+    # === Exécution ===
+
+    async def trigger(self, name: str) -> bool:
+        """Lancer un job immédiatement (hors planning)"""
+        job = self.jobs.get(name)
+        if job is None:
+            return False
+        self._spawn(job, [(None, 'manual')])
+        return True
+
+    async def _execute(self, job: Job, runs: List):
+        for scheduled_for, trigger in runs:
+            if job.running:
+                await self._record(job, scheduled_for, trigger, 'skipped', 0.0, "déjà en cours")
+                continue
+
+            async with self._lease(job) as acquired:
+                if not acquired:
+                    await self._record(job, scheduled_for, trigger, 'skipped', 0.0, "bail détenu par une autre instance")
+                    continue
+
+                job.running = True
+                started = time.perf_counter()
+                status, error = 'ok', None
+                try:
+                    async with asyncio.timeout(job.timeout):
+                        await job.func()
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    status, error = 'error', str(e) or type(e).__name__
+                    logger.error("job_failed", job=job.name, trigger=trigger, error=error)
+                finally:
+                    job.running = False
+
+                await self._record(job, scheduled_for, trigger, status, time.perf_counter() - started, error)
+
+    async def _record(self, job: Job, scheduled_for: Optional[datetime], trigger: str,
+                      status: str, duration: float, error: Optional[str]):
+        """Mettre à jour l'état du job et l'historique job_runs"""
+        job.runs += 1
+        job.failures += status == 'error'
+        job.last_status, job.last_duration, job.last_error = status, duration, error
+        self.metrics.job_runs_total.labels(job=job.name, status=status).inc()
+        if status != 'skipped':
+            self.metrics.job_duration.labels(job=job.name).observe(duration)
+        logger.info("job_finished", job=job.name, trigger=trigger, status=status, duration_ms=round(duration * 1000))
+
+        pool = self.pool_getter()
+        if pool is None:
+            return
+
+        finished = self._now()
+        started = finished - timedelta(seconds=duration)
+        duration_ms = round(duration * 1000)
+        try:
+            async with UnitOfWork(pool) as uow:
+                uow.execute('''
+                    INSERT INTO job_runs (job, scheduled_for, started_at, finished_at, duration_ms, status, trigger, error, instance)
+                    VALUES ($1, $2, $3, $4, $5, $6, $7, $8, $9)
+                ''', job.name, scheduled_for, started, finished, duration_ms, status, trigger, error, self.instance)
+                uow.execute('''
+                    UPDATE scheduled_jobs
+                    SET last_run_at = $2, last_status = $3, last_duration_ms = $4, last_error = $5
+                    WHERE name = $1
+                ''', job.name, finished, status, duration_ms, error)
+        except Exception as e:
+            logger.error("job_history_failed", job=job.name, error=str(e))
+
+    # === Baux ===
+
+    @asynccontextmanager
+    async def _lease(self, job: Job):
+        """Bail exclusif : Redis (SET NX PX + renouvellement), sinon verrou consultatif PostgreSQL"""
+        redis = self.redis_getter() if self.redis_getter else None
+        if redis is not None:
+            key = f"scheduler:lease:{job.name}"
+            token = f"{self.instance}:{time.time()}"
+            try:
+                acquired = await redis.set(key, token, nx=True, px=int(job.lease_ttl * 1000))
+            except Exception as e:
+                logger.warning("scheduler_lease_redis_failed", job=job.name, error=str(e))
+            else:
+                if not acquired:
+                    yield False
+                    return
+                renew = asyncio.create_task(self._renew(redis, key, token, job.lease_ttl))
+                try:
+                    yield True
+                finally:
+                    renew.cancel()
+                    await asyncio.gather(renew, return_exceptions=True)
+                    try:
+                        if await redis.get(key) == token:
+                            await redis.delete(key)
+                    except Exception:
+                        pass  # Expire de lui-même
+                return
+
+        # Verrou de session tenu toute la durée du job (parfois plusieurs minutes) :
+        # connexion dédiée plutôt qu'un emplacement du pool d'écriture
+        if self.lock_connect is not None:
+            conn = await self.lock_connect()
+            try:
+                async with self._advisory_lock(conn, job) as acquired:
+                    yield acquired
+            finally:
+                await conn.close()
+            return
+
+        pool = self.pool_getter()
+        if pool is None:
+            yield True
+            return
+
+        async with pool.acquire() as conn:
+            async with self._advisory_lock(conn, job) as acquired:
+                yield acquired
+
+    @staticmethod
+    @asynccontextmanager
+    async def _advisory_lock(conn, job: Job):
+        acquired = await conn.fetchval('SELECT pg_try_advisory_lock(hashtext($1))', f"job:{job.name}")
+        try:
+            yield bool(acquired)
+        finally:
+            if acquired:
+                await conn.execute('SELECT pg_advisory_unlock(hashtext($1))', f"job:{job.name}")
+
+    @staticmethod
+    async def _renew(redis, key: str, token: str, ttl: float):
+        while True:
+            await asyncio.sleep(ttl / 3)
+            try:
+                if await redis.get(key) != token:
+                    return
+                await redis.pexpire(key, int(ttl * 1000))
+            except Exception as e:
+                logger.warning("scheduler_lease_renew_failed", key=key, error=str(e))
+
+    # === Consultation ===
+
+    async def history(self, name: Optional[str] = None, limit: int = 20) -> List[Dict]:
+        """Dernières exécutions (toutes ou d'un job)"""
+        pool = self.pool_getter()
+        if pool is None:
+            return []
+        async with pool.acquire() as conn:
+            rows = await conn.fetch('''
+                SELECT job, scheduled_for, started_at, duration_ms, status, trigger, error, instance
+                FROM job_runs
+                WHERE $1::text IS NULL OR job = $1
+                ORDER BY started_at DESC
+                LIMIT $2
+            ''', name, limit)
+        return [dict(row) for row in rows]
+
+    def describe(self) -> List[Dict]:
+        """État courant des jobs"""
+        return [
+            {
+                'name': job.name,
+                'cron': str(job.cron),
+                'misfire': job.misfire,
+                'next_run': job.next_run.isoformat() if job.next_run else None,
+                'last_scheduled': job.last_scheduled.isoformat() if job.last_scheduled else None,
+                'running': job.running,
+                'last_status': job.last_status,
+                'last_duration_ms': round(job.last_duration * 1000) if job.last_duration is not None else None,
+                'last_error': job.last_error,
+                'runs': job.runs,
+                'failures': job.failures,
+            }
+            for job in self.jobs.values()
+        ]
@@ -0,0 +1,442 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+================================================================
+SERVICES - Conteneur partagé (bot.services)
+================================================================
+Pools PostgreSQL (écriture / lecture / batch), client Redis,
+cache mémoire, métriques et unit-of-work. Attaché au bot : handlers, API et cogs passent
+tous par bot.services au lieu de globals de module.
+================================================================
+"""
+
+import time
+import asyncio
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from typing import Optional, Any, Dict, List, Tuple, Callable, Awaitable
+
+import structlog
+from prometheus_client import Counter, Histogram, Gauge
+
+logger = structlog.get_logger(__name__)
+
+# ================================================================
+# MÉTRIQUES
+# ================================================================
+
+class _NoopMetric:
+    """Métrique inactive (ENABLE_METRICS=false)"""
+
+    def labels(self, *args, **kwargs):
+        return self
+
+    def inc(self, amount: float = 1):
+        pass
+
+    def dec(self, amount: float = 1):
+        pass
+
+    def set(self, value: float):
+        pass
+
+    def observe(self, value: float):
+        pass
+
+class Metrics:
+    """Métriques Prometheus, no-op si désactivées"""
+
+    def __init__(self, enabled: bool = False):
+        self.enabled = enabled
+
+        # Compteurs
+        self.commands_total = self._metric(Counter, 'discord_commands_total', 'Total commands executed', ['command'])
+        self.messages_total = self._metric(Counter, 'discord_messages_total', 'Total messages logged')
+        self.api_requests_total = self._metric(Counter, 'api_requests_total', 'Total API requests', ['endpoint', 'method'])
+        self.duplicates_skipped = self._metric(Counter, 'discord_messages_duplicate_skipped_total', 'Duplicate messages not inserted')
+        self.db_pool_rejected = self._metric(Counter, 'postgres_pool_rejected_total', 'Acquires rejected (pool queue full)', ['pool'])
+        self.job_runs_total = self._metric(Counter, 'scheduler_job_runs_total', 'Scheduled job runs', ['job', 'status'])
+        self.reminders_sent = self._metric(Counter, 'reminders_sent_total', 'Reminders delivered', ['status'])
+        self.logs_dropped = self._metric(Counter, 'log_events_dropped_total', 'Log events dropped (sampling or full queue)', ['reason'])
+        self.media_files_total = self._metric(Counter, 'media_files_total', 'Chantier attachments processed', ['status'])
+        self.message_events = self._metric(Counter, 'discord_message_events_total', 'Message edits/deletes tracked', ['kind'])
+        self.db_slow_queries = self._metric(Counter, 'postgres_slow_queries_total', 'Statements above SLOW_QUERY_MS', ['statement'])
+        self.reports_total = self._metric(Counter, 'reports_total', 'Weekly chantier reports', ['status'])
+        self.db_plan_changes = self._metric(Counter, 'postgres_query_plan_changes_total', 'Sampled plans differing from the last known plan', ['statement'])
+        self.backups_total = self._metric(Counter, 'backups_total', 'Backups and restore checks', ['kind', 'status'])
+        self.backup_rows = self._metric(Counter, 'backup_rows_total', 'Rows exported by backups', ['table'])
+        self.backup_bytes = self._metric(Counter, 'backup_bytes_total', 'Uncompressed COPY bytes exported by backups', ['table'])
+        self.warmup_sections = self._metric(Counter, 'cache_warmup_sections_total', 'Cache sections warmed at startup', ['section', 'source'])
+        self.webhooks_received = self._metric(Counter, 'webhooks_received_total', 'Inbound webhook requests', ['source', 'status'])
+        self.webhooks_processed = self._metric(Counter, 'webhooks_processed_total', 'Inbound webhook events processed', ['source', 'status'])
+
+        # Histogrammes
+        self.command_duration = self._metric(Histogram, 'discord_command_duration_seconds', 'Command execution time', ['command'])
+        self.api_duration = self._metric(Histogram, 'api_request_duration_seconds', 'API request duration', ['endpoint'])
+        self.cog_duration = self._metric(Histogram, 'discord_cog_duration_seconds', 'Per-cog command and DB timings', ['cog', 'kind'])
+        self.job_duration = self._metric(Histogram, 'scheduler_job_duration_seconds', 'Scheduled job duration', ['job'])
+        self.message_flush_duration = self._metric(Histogram, 'discord_message_flush_seconds', 'Batched edit/delete flush duration')
+        self.db_acquire_duration = self._metric(
+            Histogram, 'postgres_pool_acquire_seconds', 'Time waiting for a pooled connection', ['pool'],
+            buckets=(.0005, .001, .005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10)
+        )
+        self.report_duration = self._metric(Histogram, 'report_duration_seconds', 'Report generation time', ['stage'])
+        self.db_query_duration = self._metric(
+            Histogram, 'postgres_query_duration_seconds', 'Statement latency (client side)', ['statement'],
+            buckets=(.0005, .001, .0025, .005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10, 30, 60)
+        )
+        self.backup_duration = self._metric(
+            Histogram, 'backup_duration_seconds', 'Backup stage duration', ['stage'],
+            buckets=(1, 5, 15, 30, 60, 120, 300, 600, 1200, 1800, 3600, 7200)
+        )
+        self.warmup_duration = self._metric(Histogram, 'cache_warmup_duration_seconds', 'Cache section load time at startup', ['section'])
+        self.webhook_processing = self._metric(Histogram, 'webhook_processing_seconds', 'Webhook event handler duration', ['source'])
+        self.webhook_delivery_lag = self._metric(
+            Histogram, 'webhook_delivery_lag_seconds', 'Time from webhook reception to processing',
+            buckets=(.01, .05, .1, .25, .5, 1, 2.5, 5, 10, 30, 60, 300, 900, 3600)
+        )
+
+        # Gauges
+        self.guild_members = self._metric(Gauge, 'discord_guild_members_total', 'Total guild members', ['guild'])
+        self.db_connections = self._metric(Gauge, 'postgres_connections_active', 'Active PostgreSQL connections')
+        self.db_pool_in_use = self._metric(Gauge, 'postgres_pool_in_use', 'Connections checked out', ['pool'])
+        self.db_pool_waiting = self._metric(Gauge, 'postgres_pool_waiting', 'Callers queued for a connection', ['pool'])
+        self.moderation_queue = self._metric(Gauge, 'moderation_queue_size', 'Messages waiting for moderation')
+        self.reminders_pending = self._metric(Gauge, 'reminders_pending', 'Reminders waiting in memory')
+        self.media_queue = self._metric(Gauge, 'media_queue_size', 'Attachments waiting for download')
+        self.moderation_violations = self._metric(Gauge, 'moderation_violations_total', 'Moderation violations since start')
+        self.backup_tables_pending = self._metric(Gauge, 'backup_tables_pending', 'Tables left to export in the running backup')
+        self.backup_last_success = self._metric(Gauge, 'backup_last_success_timestamp_seconds', 'Last successful backup or restore check', ['kind'])
+        self.webhook_stream_lag = self._metric(Gauge, 'webhook_stream_lag', 'Webhook events not yet read by the consumer group')
+        self.webhook_pending = self._metric(Gauge, 'webhook_pending', 'Webhook events read but not acknowledged')
+        self.webhook_dead_letters = self._metric(Gauge, 'webhook_dead_letters', 'Webhook events in the dead-letter stream')
+
+    def _metric(self, kind, name: str, documentation: str, labelnames: Optional[List[str]] = None, **kwargs):
+        if not self.enabled:
+            return _NoopMetric()
+        return kind(name, documentation, labelnames or (), **kwargs)
+
+# ================================================================
+# POOLS POSTGRESQL
+# ================================================================
+
+class PoolBusy(RuntimeError):
+    """File d'attente du pool pleine"""
+
+class MeteredPool:
+    """Pool asyncpg avec file d'attente FIFO bornée et métriques par pool
+
+    Les appelants au-delà de max_size attendent dans l'ordre d'arrivée ;
+    au-delà de max_waiters, PoolBusy immédiat plutôt qu'une attente sans fin.
+    """
+
+    def __init__(self, name: str, pool, metrics: Optional[Metrics] = None, max_size: Optional[int] = None,
+                 max_waiters: int = 1000, acquire_timeout: Optional[float] = None):
+        self.name = name
+        self.pool = pool
+        self.metrics = metrics or Metrics(False)
+        self.max_waiters = max_waiters
+        self.acquire_timeout = acquire_timeout
+        self.max_size = min(max_size or pool.get_max_size(), pool.get_max_size())
+
+        self._slots = asyncio.Semaphore(self.max_size)
+        self.in_use = 0
+        self.waiting = 0
+        self.acquires = 0
+        self.rejected = 0
+        self.wait_seconds = 0.0
+        self.wait_max = 0.0
+
+    @asynccontextmanager
+    async def acquire(self, timeout: Optional[float] = None):
+        timeout = timeout if timeout is not None else self.acquire_timeout
+        if self._slots.locked() and self.waiting >= self.max_waiters:
+            self.rejected += 1
+            self.metrics.db_pool_rejected.labels(pool=self.name).inc()
+            raise PoolBusy(f"pool {self.name} saturé ({self.waiting} en attente)")
+
+        start = time.perf_counter()
+        self.waiting += 1
+        self.metrics.db_pool_waiting.labels(pool=self.name).set(self.waiting)
+        try:
+            # asyncio.timeout plutôt que wait_for : ne perd pas une annulation concurrente
+            async with asyncio.timeout(timeout):
+                await self._slots.acquire()
+        finally:
+            self.waiting -= 1
+            self.metrics.db_pool_waiting.labels(pool=self.name).set(self.waiting)
+
+        try:
+            async with self.pool.acquire(timeout=timeout) as conn:
+                waited = time.perf_counter() - start
+                self.acquires += 1
+                self.wait_seconds += waited
+                self.wait_max = max(self.wait_max, waited)
+                self.metrics.db_acquire_duration.labels(pool=self.name).observe(waited)
+
+                self.in_use += 1
+                self.metrics.db_pool_in_use.labels(pool=self.name).set(self.in_use)
+                try:
+                    yield conn
+                finally:
+                    self.in_use -= 1
+                    self.metrics.db_pool_in_use.labels(pool=self.name).set(self.in_use)
+        finally:
+            self._slots.release()
+
+    async def execute(self, query: str, *args, timeout: Optional[float] = None) -> str:
+        async with self.acquire() as conn:
+            return await conn.execute(query, *args, timeout=timeout)
+
+    async def fetch(self, query: str, *args, timeout: Optional[float] = None):
+        async with self.acquire() as conn:
+            return await conn.fetch(query, *args, timeout=timeout)
+
+    async def fetchrow(self, query: str, *args, timeout: Optional[float] = None):
+        async with self.acquire() as conn:
+            return await conn.fetchrow(query, *args, timeout=timeout)
+
+    async def fetchval(self, query: str, *args, timeout: Optional[float] = None):
+        async with self.acquire() as conn:
+            return await conn.fetchval(query, *args, timeout=timeout)
+
+    def get_size(self) -> int:
+        return self.pool.get_size()
+
+    def get_idle_size(self) -> int:
+        return self.pool.get_idle_size()
+
+    def get_max_size(self) -> int:
+        return self.max_size
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'size': self.get_size(),
+            'max_size': self.max_size,
+            'in_use': self.in_use,
+            'waiting': self.waiting,
+            'acquires': self.acquires,
+            'rejected': self.rejected,
+            'wait_avg_ms': round(self.wait_seconds / self.acquires * 1000, 2) if self.acquires else 0.0,
+            'wait_max_ms': round(self.wait_max * 1000, 2),
+        }
+
+    async def close(self):
+        await self.pool.close()
+
+# ================================================================
+# CACHE
+# ================================================================
+
+class Cache:
+    """Cache mémoire TTL, chargements concurrents fusionnés"""
+
+    def __init__(self, default_ttl: float = 300.0, max_items: int = 10000):
+        self.default_ttl = default_ttl
+        self.max_items = max_items
+        self._data: Dict[str, Tuple[float, Any]] = {}
+        self._loading: Dict[str, asyncio.Future] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: str, default: Any = None) -> Any:
+        item = self._data.get(key)
+        if item is None or item[0] < time.monotonic():
+            self.misses += 1
+            return default
+        self.hits += 1
+        return item[1]
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None):
+        if len(self._data) >= self.max_items and key not in self._data:
+            self._evict()
+        self._data[key] = (time.monotonic() + (ttl or self.default_ttl), value)
+
+    def peek(self, key: str, default: Any = None) -> Any:
+        """Dernière valeur connue, même expirée (sans compter hit / miss)"""
+        item = self._data.get(key)
+        return default if item is None else item[1]
+
+    def invalidate(self, key: str):
+        self._data.pop(key, None)
+
+    def invalidate_prefix(self, prefix: str):
+        for key in [k for k in self._data if k.startswith(prefix)]:
+            del self._data[key]
+
+    async def get_or_load(self, key: str, loader: Callable[[], Awaitable[Any]], ttl: Optional[float] = None) -> Any:
+        """Valeur en cache, sinon un seul loader partagé par les appelants concurrents"""
+        sentinel = object()
+        value = self.get(key, sentinel)
+        if value is not sentinel:
+            return value
+
+        pending = self._loading.get(key)
+        if pending is not None:
+            try:
+                return await asyncio.shield(pending)
+            except asyncio.CancelledError:
+                if not pending.cancelled() or asyncio.current_task().cancelling():
+                    raise
+                # Chargeur annulé (client déconnecté, timeout) : prendre le relais
+                return await self.get_or_load(key, loader, ttl)
+
+        future = asyncio.get_running_loop().create_future()
+        self._loading[key] = future
+        try:
+            value = await loader()
+            self.set(key, value, ttl)
+            future.set_result(value)
+            return value
+        except asyncio.CancelledError:
+            future.cancel()  # Réveille les appelants en attente
+            raise
+        except BaseException as e:
+            future.set_exception(e)
+            future.exception()  # Marquer comme récupérée si personne n'attend
+            raise
+        finally:
+            del self._loading[key]
+
+    def _evict(self):
+        """Supprimer les expirés, sinon les plus proches de l'expiration"""
+        now = time.monotonic()
+        expired = [k for k, (expires, _) in self._data.items() if expires < now]
+        if not expired:
+            expired = sorted(self._data, key=lambda k: self._data[k][0])[:max(1, self.max_items // 10)]
+        for key in expired:
+            del self._data[key]
+
+# ================================================================
+# UNIT OF WORK
+# ================================================================
+
+class UnitOfWork:
+    """Regroupe plusieurs requêtes sur une connexion et une transaction
+
+    async with services.unit_of_work() as uow:
+        uow.execute('INSERT ...', a, b)
+        uow.executemany('UPDATE ...', rows)
+    # -> un acquire, une transaction, commit à la sortie
+    """
+
+    def __init__(self, pool):
+        self.pool = pool
+        self.statements: List[Tuple[str, str, Any]] = []
+
+    def execute(self, query: str, *args):
+        self.statements.append(('execute', query, args))
+
+    def executemany(self, query: str, rows):
+        rows = list(rows)
+        if rows:
+            self.statements.append(('executemany', query, rows))
+
+    async def commit(self):
+        """Exécuter les requêtes en attente (vide la liste)"""
+        if not self.statements:
+            return
+        statements, self.statements = self.statements, []
+
+        async with self.pool.acquire() as conn:
+            async with conn.transaction():
+                for kind, query, args in statements:
+                    if kind == 'execute':
+                        await conn.execute(query, *args)
+                    else:
+                        await conn.executemany(query, args)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            await self.commit()
+        else:
+            self.statements.clear()
+        return False
+
+# ================================================================
+# LISTEN / NOTIFY
+# ================================================================
+
+LISTEN_CHECK_SECONDS = 30.0     # Vérification de la connexion LISTEN
+LISTEN_MAX_BACKOFF = 60.0       # Attente maximale entre deux reconnexions
+
+async def listen(
+    connect: Callable[[], Awaitable],
+    channel: str,
+    callback: Callable,
+    on_reconnect: Optional[Callable[[], Awaitable]] = None,
+):
+    """LISTEN sur une connexion dédiée (hors pools), reconnectée avec backoff
+
+    Après une coupure, on_reconnect() rattrape les notifications manquées.
+    Connexion sans LISTEN (faux backends) : retour immédiat.
+    """
+    delay = 1.0
+    reconnecting = False
+    while True:
+        try:
+            conn = await connect()
+            if not hasattr(conn, 'add_listener'):
+                await conn.close()
+                return
+            try:
+                lost = asyncio.Event()
+                conn.add_termination_listener(lambda connection: lost.set())
+                await conn.add_listener(channel, callback)
+                if reconnecting and on_reconnect is not None:
+                    await on_reconnect()
+                    logger.info("listen_reconnected", channel=channel)
+                delay = 1.0
+                while not lost.is_set() and not conn.is_closed():
+                    try:
+                        await asyncio.wait_for(lost.wait(), LISTEN_CHECK_SECONDS)
+                    except asyncio.TimeoutError:
+                        pass
+            finally:
+                if not conn.is_closed():
+                    conn.terminate()
+            logger.warning("listen_lost", channel=channel, retry_in=delay)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.warning("listen_failed", channel=channel, error=str(e), retry_in=delay)
+        reconnecting = True
+        await asyncio.sleep(delay)
+        delay = min(delay * 2, LISTEN_MAX_BACKOFF)
+
+# ================================================================
+# CONTENEUR
+# ================================================================
+
+@dataclass
+class Services:
+    """Dépendances partagées du bot"""
+    db: Optional[Any] = None            # Écritures courtes (asyncpg.Pool / MeteredPool / FakePool)
+    redis: Optional[Any] = None         # redis.asyncio.Redis (ou FakeRedis)
+    cache: Cache = field(default_factory=Cache)
+    metrics: Metrics = field(default_factory=Metrics)
+    db_read: Optional[Any] = None       # Lectures interactives (réplica possible)
+    db_batch: Optional[Any] = None      # Agrégats, exports, maintenance
+
+    @property
+    def reader(self):
+        """Pool de lecture (à défaut, pool d'écriture)"""
+        return self.db_read or self.db
+
+    @property
+    def batch(self):
+        """Pool batch (à défaut, pool d'écriture)"""
+        return self.db_batch or self.db
+
+    def pools(self) -> Dict[str, Any]:
+        """Pools distincts par rôle"""
+        named = {'write': self.db, 'read': self.db_read, 'batch': self.db_batch}
+        return {name: pool for name, pool in named.items() if pool is not None}
+
+    def unit_of_work(self) -> UnitOfWork:
+        if self.db is None:
+            raise RuntimeError("Base de données non initialisée")
+        return UnitOfWork(self.db)
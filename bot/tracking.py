@@ -0,0 +1,258 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+================================================================
+TRACKING - Modifications et suppressions de messages
+================================================================
+Les événements bruts (on_raw_message_edit / _delete / _bulk_delete)
+sont fusionnés en mémoire : seule la dernière version d'un message
+modifié plusieurs fois dans la fenêtre est écrite. Chaque lot est
+appliqué en une instruction (UPDATE ... FROM unnest(...)), l'ancien
+contenu étant conservé dans message_edits. Les suppressions sont
+logiques (deleted_at) : le contenu reste disponible pour la
+modération et les exports.
+================================================================
+"""
+
+import time
+import asyncio
+from datetime import datetime, timezone
+from typing import Optional, Dict, Tuple, Callable, Iterable
+
+import structlog
+
+from services import Metrics
+
+logger = structlog.get_logger(__name__)
+
+# ================================================================
+# SCHÉMA
+# ================================================================
+
+SCHEMA_SQL = '''
+ALTER TABLE messages ADD COLUMN IF NOT EXISTS edited_at TIMESTAMPTZ;
+ALTER TABLE messages ADD COLUMN IF NOT EXISTS edit_count SMALLINT NOT NULL DEFAULT 0;
+ALTER TABLE messages ADD COLUMN IF NOT EXISTS deleted_at TIMESTAMPTZ;
+
+-- Partiels : seules les lignes modifiées / supprimées (sauvegardes incrémentales)
+CREATE INDEX IF NOT EXISTS idx_messages_edited_at ON messages (edited_at) WHERE edited_at IS NOT NULL;
+CREATE INDEX IF NOT EXISTS idx_messages_deleted_at ON messages (deleted_at) WHERE deleted_at IS NOT NULL;
+
+CREATE TABLE IF NOT EXISTS message_edits (
+    message_id BIGINT NOT NULL,
+    edited_at TIMESTAMPTZ NOT NULL,
+    previous_content TEXT NOT NULL              -- Contenu remplacé par cette modification
+);
+
+CREATE INDEX IF NOT EXISTS idx_message_edits_message ON message_edits (message_id, edited_at);
+'''
+
+# Une seule instruction par lot : l'ancien contenu est lu dans le même
+# instantané que la mise à jour (CTE), puis archivé
+EDITS_SQL = '''
+WITH v AS (
+    SELECT * FROM unnest($1::bigint[], $2::text[], $3::timestamptz[]) AS v(message_id, content, edited_at)
+), changed AS (
+    SELECT m.message_id, m.content AS previous_content, v.content, v.edited_at
+    FROM messages m
+    JOIN v ON v.message_id = m.message_id
+    WHERE m.content IS DISTINCT FROM v.content
+), history AS (
+    INSERT INTO message_edits (message_id, edited_at, previous_content)
+    SELECT message_id, edited_at, previous_content FROM changed
+)
+UPDATE messages m
+SET content = changed.content,
+    edited_at = changed.edited_at,
+    edit_count = LEAST(m.edit_count + 1, 32767)
+FROM changed
+WHERE m.message_id = changed.message_id
+'''
+
+DELETES_SQL = '''
+UPDATE messages m
+SET deleted_at = v.deleted_at
+FROM unnest($1::bigint[], $2::timestamptz[]) AS v(message_id, deleted_at)
+WHERE m.message_id = v.message_id
+  AND m.deleted_at IS NULL
+'''
+
+# ================================================================
+# SUIVI
+# ================================================================
+
+class MessageTracker:
+    """Tampon de modifications / suppressions, vidé par lots"""
+
+    def __init__(
+        self,
+        pool_getter: Callable,
+        window: float = 2.0,
+        batch_size: int = 500,
+        max_pending: int = 50000,
+        metrics: Optional[Metrics] = None,
+    ):
+        self.pool_getter = pool_getter
+        self.window = window
+        self.batch_size = batch_size
+        self.max_pending = max_pending
+        self.metrics = metrics or Metrics(False)
+
+        self._edits: Dict[int, Tuple[str, datetime]] = {}
+        self._deletes: Dict[int, datetime] = {}
+        self._wake = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._flush_lock = asyncio.Lock()
+
+        self.stats: Dict[str, int] = {
+            'edits': 0,
+            'coalesced': 0,
+            'deletes': 0,
+            'applied_edits': 0,
+            'applied_deletes': 0,
+            'dropped': 0,
+            'flushes': 0,
+        }
+
+    # === Cycle de vie ===
+
+    async def start(self):
+        """Créer le schéma et démarrer la boucle de vidage (idempotent)"""
+        if self._task is not None:
+            return
+
+        pool = self.pool_getter()
+        if pool is not None:
+            try:
+                async with pool.acquire() as conn:
+                    await conn.execute(SCHEMA_SQL)
+            except Exception as e:
+                logger.error("tracking_schema_failed", error=str(e))
+
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Arrêter la boucle puis écrire ce qui reste"""
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        await self.flush()
+
+    @property
+    def pending(self) -> int:
+        return len(self._edits) + len(self._deletes)
+
+    # === Entrée (gateway) ===
+
+    def edit(self, message_id: int, content: str, edited_at: Optional[datetime] = None):
+        """Modification : remplace une version en attente du même message"""
+        self.stats['edits'] += 1
+        if message_id in self._edits:
+            self.stats['coalesced'] += 1
+            self.metrics.message_events.labels(kind='coalesced').inc()
+        elif not self._admit():
+            return
+        self._edits[message_id] = (content[:2000], edited_at or datetime.now(timezone.utc))
+        self.metrics.message_events.labels(kind='edit').inc()
+        self._maybe_wake()
+
+    def delete(self, message_ids: Iterable[int], deleted_at: Optional[datetime] = None):
+        """Suppression (simple ou en masse)"""
+        deleted_at = deleted_at or datetime.now(timezone.utc)
+        for message_id in message_ids:
+            self.stats['deletes'] += 1
+            if message_id not in self._deletes and not self._admit():
+                continue
+            self._deletes.setdefault(message_id, deleted_at)
+            self.metrics.message_events.labels(kind='delete').inc()
+        self._maybe_wake()
+
+    def on_raw_edit(self, payload):
+        """discord.RawMessageUpdateEvent : seules les modifications de contenu comptent"""
+        data = payload.data
+        if 'content' not in data or data.get('author', {}).get('bot'):
+            return  # Embeds déroulés, messages de bots (non journalisés)
+        edited = data.get('edited_timestamp')
+        self.edit(payload.message_id, data['content'], datetime.fromisoformat(edited) if edited else None)
+
+    def _admit(self) -> bool:
+        if self.pending < self.max_pending:
+            return True
+        self.stats['dropped'] += 1
+        self.metrics.message_events.labels(kind='dropped').inc()
+        return False
+
+    def _maybe_wake(self):
+        if self.pending >= self.batch_size:
+            self._wake.set()
+
+    # === Vidage ===
+
+    async def _run(self):
+        while True:
+            try:
+                async with asyncio.timeout(self.window):
+                    await self._wake.wait()
+            except TimeoutError:
+                pass
+            self._wake.clear()
+            if self.pending:
+                await self.flush()
+
+    async def flush(self):
+        """Écrire les modifications puis les suppressions en attente, par lots"""
+        async with self._flush_lock:
+            edits, self._edits = self._edits, {}
+            deletes, self._deletes = self._deletes, {}
+            if not edits and not deletes:
+                return
+
+            pool = self.pool_getter()
+            if pool is None:
+                return
+
+            start = time.perf_counter()
+            edit_items = list(edits.items())
+            delete_items = list(deletes.items())
+            try:
+                async with pool.acquire() as conn:
+                    for i in range(0, len(edit_items), self.batch_size):
+                        chunk = edit_items[i:i + self.batch_size]
+                        await conn.execute(
+                            EDITS_SQL,
+                            [message_id for message_id, _ in chunk],
+                            [content for _, (content, _) in chunk],
+                            [edited_at for _, (_, edited_at) in chunk],
+                        )
+                        self.stats['applied_edits'] += len(chunk)
+                        for message_id, _ in chunk:  # Écrits : exclus d'une reprise après échec
+                            edits.pop(message_id, None)
+
+                    for i in range(0, len(delete_items), self.batch_size):
+                        chunk = delete_items[i:i + self.batch_size]
+                        await conn.execute(
+                            DELETES_SQL,
+                            [message_id for message_id, _ in chunk],
+                            [deleted_at for _, deleted_at in chunk],
+                        )
+                        self.stats['applied_deletes'] += len(chunk)
+                        for message_id, _ in chunk:
+                            deletes.pop(message_id, None)
+            except Exception as e:
+                logger.error("tracking_flush_failed", edits=len(edits), deletes=len(deletes), error=str(e))
+                self._requeue(edits, deletes)
+                return
+            finally:
+                self.metrics.message_flush_duration.observe(time.perf_counter() - start)
+
+            self.stats['flushes'] += 1
+
+    def _requeue(self, edits: Dict[int, Tuple[str, datetime]], deletes: Dict[int, datetime]):
+        """Remettre en attente ce qui n'a pas été écrit (les versions plus récentes gagnent)"""
+        for message_id, value in edits.items():
+            if message_id not in self._edits and self._admit():
+                self._edits[message_id] = value
+        for message_id, value in deletes.items():
+            if message_id not in self._deletes and self._admit():
+                self._deletes[message_id] = value
@@ -6,11 +6,16 @@ UTILS - Fonctions utilitaires Discord Bot Monster
 ================================================================
 """
 
+import abc
+import asyncio
 import discord
+from collections import OrderedDict
 from datetime import datetime, timedelta
-from typing import Optional, List
+from typing import Optional, List, Dict, Tuple, Any, Callable, Sequence
 import humanize
 
+from permissions import PermissionIndex, Capability
+
 # ================================================================
 # EMBEDS HELPERS
 # ================================================================
@@ -102,17 +107,33 @@ def format_number(num: int) -> str:
 # PERMISSIONS
 # ================================================================
 
+# Index du bot (bot.permissions), utilisé quand aucun index n'est passé
+_permission_index: Optional[PermissionIndex] = None
+
+def set_permission_index(index: Optional[PermissionIndex]):
+    """Brancher l'index du bot sur is_manager / is_admin"""
+    global _permission_index
+    _permission_index = index
+
 def has_role(member: discord.Member, role_names: List[str]) -> bool:
-    """Vérifier si membre a un des rôles"""
+    """Vérifier si membre a un des rôles (scan des noms, sans index)"""
     member_roles = [role.name for role in member.roles]
     return any(role in member_roles for role in role_names)
 
-def is_manager(member: discord.Member) -> bool:
+def is_manager(member: discord.Member, index: Optional[PermissionIndex] = None) -> bool:
     """Vérifier si membre est Manager ou Admin"""
+    if index is None:
+        index = _permission_index
+    if index is not None:
+        return index.has(member, Capability.MANAGER)
     return has_role(member, ['Manager', 'Admin', 'Administrateur'])
 
-def is_admin(member: discord.Member) -> bool:
+def is_admin(member: discord.Member, index: Optional[PermissionIndex] = None) -> bool:
     """Vérifier si membre est Admin"""
+    if index is None:
+        index = _permission_index
+    if index is not None:
+        return index.has(member, Capability.ADMIN)
     return has_role(member, ['Admin', 'Administrateur'])
 
 # ================================================================
@@ -150,26 +171,202 @@ def parse_user_mention(mention: str) -> Optional[int]:
 # PAGINATION
 # ================================================================
 
+class PageSource(abc.ABC):
+    """Source de pages : fetch(curseur) -> (éléments, curseur suivant ou None)"""
+
+    per_page: int = 10
+    total_pages: Optional[int] = None  # Inconnu pour une requête keyset
+
+    @abc.abstractmethod
+    async def fetch(self, cursor: Any) -> Tuple[List[Any], Any]:
+        """Éléments de la page à partir du curseur, curseur suivant (None : dernière page)"""
+
+    @abc.abstractmethod
+    def format(self, items: List[Any], page: int) -> discord.Embed:
+        """Embed d'une page"""
+
+class ListPageSource(PageSource):
+    """Embeds déjà construits (compatibilité paginate_embeds)"""
+
+    def __init__(self, embeds: List[discord.Embed]):
+        self.embeds = embeds
+        self.per_page = 1
+        self.total_pages = len(embeds)
+
+    async def fetch(self, cursor: Any) -> Tuple[List[Any], Any]:
+        index = cursor or 0
+        return self.embeds[index:index + 1], (index + 1 if index + 1 < len(self.embeds) else None)
+
+    def format(self, items: List[Any], page: int) -> discord.Embed:
+        return items[0]
+
+class KeysetPageSource(PageSource):
+    """Requête paginée par clé : seules les lignes de la page demandée sont lues
+
+    La requête reçoit les paramètres fournis, puis le curseur (NULL pour
+    la première page) et la limite :
+
+        SELECT id, description FROM tasks
+        WHERE assignee_id = $1 AND ($2::int IS NULL OR id > $2)
+        ORDER BY id LIMIT $3
+    """
+
+    def __init__(
+        self,
+        pool_getter: Callable,
+        query: str,
+        formatter: Callable[[List[Any], int], discord.Embed],
+        params: Sequence[Any] = (),
+        key: str = 'id',
+        per_page: int = 10,
+    ):
+        self.pool_getter = pool_getter
+        self.query = query
+        self.formatter = formatter
+        self.params = tuple(params)
+        self.key = key
+        self.per_page = per_page
+
+    async def fetch(self, cursor: Any) -> Tuple[List[Any], Any]:
+        # Une ligne de plus que la page : indique s'il existe une page suivante
+        async with self.pool_getter().acquire() as conn:
+            rows = await conn.fetch(self.query, *self.params, cursor, self.per_page + 1)
+        items = rows[:self.per_page]
+        return items, (items[-1][self.key] if len(rows) > self.per_page else None)
+
+    def format(self, items: List[Any], page: int) -> discord.Embed:
+        return self.formatter(items, page)
+
+class Paginator(discord.ui.View):
+    """Pagination à boutons : rendu à la demande, page suivante préchargée, LRU des pages vues"""
+
+    def __init__(self, source: PageSource, author_id: Optional[int] = None, timeout: float = 120, cache_pages: int = 5):
+        super().__init__(timeout=timeout)
+        self.source = source
+        self.author_id = author_id
+        self.cache_pages = cache_pages
+        self.page = 0
+        self.message: Optional[discord.Message] = None
+
+        self._cursors: List[Any] = [None]     # Curseur de début de chaque page visitée (+ suivante)
+        self._pages: OrderedDict = OrderedDict()  # page -> (éléments, curseur suivant)
+        self._loading: Dict[int, asyncio.Task] = {}
+
+    # === Chargement ===
+
+    async def _load(self, page: int) -> Tuple[List[Any], Any]:
+        cached = self._pages.get(page)
+        if cached is not None:
+            self._pages.move_to_end(page)
+            return cached
+
+        task = self._loading.get(page)
+        if task is None:
+            task = asyncio.create_task(self.source.fetch(self._cursors[page]))
+            self._loading[page] = task
+        try:
+            result = await asyncio.shield(task)
+        finally:
+            if task.done():
+                self._loading.pop(page, None)
+
+        self._pages[page] = result
+        while len(self._pages) > self.cache_pages:
+            self._pages.popitem(last=False)
+
+        next_cursor = result[1]
+        if next_cursor is not None and len(self._cursors) == page + 1:
+            self._cursors.append(next_cursor)
+        return result
+
+    def _prefetch(self, page: int):
+        if page < len(self._cursors) and page not in self._pages and page not in self._loading:
+            task = asyncio.create_task(self._load(page))
+            task.add_done_callback(lambda t: t.cancelled() or t.exception())
+
+    def _has_next(self) -> bool:
+        return self.page + 1 < len(self._cursors)
+
+    async def render(self) -> Optional[discord.Embed]:
+        items, _ = await self._load(self.page)
+        if not items:
+            return None
+
+        embed = self.source.format(items, self.page)
+        total = f"/{self.source.total_pages}" if self.source.total_pages else ("" if self._has_next() else f"/{self.page + 1}")
+        embed.set_footer(text=f"Page {self.page + 1}{total}")
+
+        self.previous_page.disabled = self.page == 0
+        self.next_page.disabled = not self._has_next()
+        self._prefetch(self.page + 1)
+        return embed
+
+    # === Interactions ===
+
+    async def start(self, ctx):
+        embed = await self.render()
+        if embed is None:
+            await ctx.send("Aucune donnée à afficher.")
+            self.stop()
+            return
+        if not self._has_next() and self.page == 0:
+            await ctx.send(embed=embed)  # Page unique : pas de boutons
+            self.stop()
+            return
+        self.message = await ctx.send(embed=embed, view=self)
+
+    async def interaction_check(self, interaction: discord.Interaction) -> bool:
+        if self.author_id is not None and interaction.user.id != self.author_id:
+            await interaction.response.send_message("❌ Seul l'auteur de la commande peut changer de page.", ephemeral=True)
+            return False
+        return True
+
+    async def _show(self, interaction: discord.Interaction, page: int):
+        self.page = page
+        await interaction.response.defer()
+        embed = await self.render()
+        if embed is not None:
+            await interaction.edit_original_response(embed=embed, view=self)
+
+    @discord.ui.button(emoji="◀️", style=discord.ButtonStyle.secondary)
+    async def previous_page(self, interaction: discord.Interaction, button: discord.ui.Button):
+        await self._show(interaction, max(0, self.page - 1))
+
+    @discord.ui.button(emoji="▶️", style=discord.ButtonStyle.secondary)
+    async def next_page(self, interaction: discord.Interaction, button: discord.ui.Button):
+        await self._show(interaction, self.page + 1 if self._has_next() else self.page)
+
+    @discord.ui.button(emoji="⏹️", style=discord.ButtonStyle.secondary)
+    async def close(self, interaction: discord.Interaction, button: discord.ui.Button):
+        await interaction.response.defer()
+        await self.on_timeout()
+        self.stop()
+
+    async def on_timeout(self):
+        """Libérer pages, curseurs et préchargements ; désactiver les boutons"""
+        for task in self._loading.values():
+            task.cancel()
+        self._loading.clear()
+        self._pages.clear()
+        self._cursors = [None]
+
+        for item in self.children:
+            item.disabled = True
+        if self.message:
+            try:
+                await self.message.edit(view=self)
+            except discord.HTTPException:
+                pass
+        self.message = None
+
 async def paginate_embeds(
     ctx,
     embeds: List[discord.Embed],
     timeout: int = 60
 ):
     """Paginer une liste d'embeds avec boutons"""
-    if not embeds:
-        await ctx.send("Aucune donnée à afficher.")
-        return
-    
-    if len(embeds) == 1:
-        await ctx.send(embed=embeds[0])
-        return
-    
-    # Ajouter numéro de page
-    for i, embed in enumerate(embeds, 1):
-        embed.set_footer(text=f"Page {i}/{len(embeds)}")
-    
-    # Envoyer première page
-    message = await ctx.send(embed=embeds[0])
-    
-    # TODO: Ajouter boutons pagination
-    # Nécessite discord.ui.View (voir doc discord.py)
+    await Paginator(ListPageSource(embeds), author_id=ctx.author.id, timeout=timeout).start(ctx)
+
+async def paginate(ctx, source: PageSource, timeout: int = 120):
+    """Paginer une source (requête keyset) : pages rendues à la demande"""
+    await Paginator(source, author_id=ctx.author.id, timeout=timeout).start(ctx)
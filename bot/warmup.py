@@ -0,0 +1,238 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+================================================================
+WARMUP - Préchargement des caches au démarrage
+================================================================
+Chaque section (stats globales, planning de la semaine, chantiers
+actifs, configuration des serveurs) est chargée en parallèle
+avant l'acceptation des commandes. À l'arrêt, l'état des sections
+est écrit dans un instantané local (JSON) : au démarrage suivant,
+il est restauré en quelques millisecondes, puis revalidé depuis
+PostgreSQL en arrière-plan. Les valeurs sont normalisées en JSON
+dès le chargement : identiques qu'elles viennent de la base ou de
+l'instantané.
+================================================================
+"""
+
+import os
+import time
+import asyncio
+from dataclasses import dataclass
+from typing import Optional, List, Dict, Any, Callable, Awaitable
+
+import orjson
+import structlog
+
+from services import Metrics, Cache
+from responses import dumps
+
+logger = structlog.get_logger(__name__)
+
+SNAPSHOT_VERSION = 1
+
+def to_json(value: Any) -> Any:
+    """Valeur telle qu'elle sera relue de l'instantané (dates ISO, Decimal -> nombre)"""
+    return orjson.loads(dumps(value))
+
+@dataclass
+class Section:
+    """Partie du cache : chargée depuis la source, exportée / restaurée via l'instantané"""
+    name: str
+    load: Callable[[], Awaitable[None]]     # Source (PostgreSQL) -> cache
+    export: Callable[[], Any]               # Cache -> données JSON (None : rien à garder)
+    restore: Callable[[Any], bool]          # Données JSON -> cache (False : périmées)
+
+class CacheWarmer:
+    """Sections chargées en parallèle, instantané écrit à l'arrêt"""
+
+    def __init__(
+        self,
+        path: Optional[str] = None,
+        concurrency: int = 4,
+        timeout: float = 10.0,
+        max_age: float = 24 * 3600,
+        metrics: Optional[Metrics] = None,
+    ):
+        self.path = path                    # None : pas d'instantané
+        self.concurrency = max(1, concurrency)
+        self.timeout = timeout              # Attente max avant d'accepter les commandes
+        self.max_age = max_age
+        self.metrics = metrics or Metrics(False)
+
+        self.sections: Dict[str, Section] = {}
+        self.ready = asyncio.Event()
+        self.stats: Dict[str, Any] = {'restored': [], 'loaded': [], 'failed': [], 'duration_ms': None}
+        self._task: Optional[asyncio.Task] = None
+        self._started = False
+
+    # === Déclaration ===
+
+    def add(self, name: str, load: Callable[[], Awaitable[None]], export: Callable[[], Any],
+            restore: Callable[[Any], bool]):
+        self.sections[name] = Section(name, load, export, restore)
+
+    def cached(self, name: str, cache: Cache, key: Callable[[], str], loader: Callable[[], Awaitable[Any]], ttl: float):
+        """Section d'une entrée de Cache (clé calculée : ex. semaine courante)"""
+
+        async def _load():
+            cache.set(key(), to_json(await loader()), ttl)
+
+        def _export():
+            current = key()
+            value = cache.peek(current)
+            return None if value is None else {'key': current, 'value': value}
+
+        def _restore(data: Dict[str, Any]) -> bool:
+            if data.get('key') != key():
+                return False  # Semaine passée, etc.
+            cache.set(data['key'], data['value'], ttl)
+            return True
+
+        self.add(name, _load, _export, _restore)
+
+    # === Démarrage ===
+
+    async def start(self):
+        """Restaurer l'instantané, charger le reste (borné par timeout), revalider en arrière-plan
+
+        Idempotent : on_ready est rappelé après chaque reconnexion.
+        """
+        if self._started:
+            return
+        self._started = True
+
+        start = time.perf_counter()
+        restored = await self._restore()
+        missing = [name for name in self.sections if name not in restored]
+
+        if missing:
+            try:
+                async with asyncio.timeout(self.timeout):
+                    await self.warm(missing)
+            except TimeoutError:
+                logger.warning("warmup_timeout", sections=missing, timeout_s=self.timeout)
+
+        self.stats['duration_ms'] = round((time.perf_counter() - start) * 1000, 1)
+        self.ready.set()
+        logger.info("warmup_done", restored=restored, loaded=self.stats['loaded'],
+                    failed=self.stats['failed'], duration_ms=self.stats['duration_ms'])
+
+        # Instantané possiblement ancien : relu depuis PostgreSQL sans bloquer les commandes
+        if restored:
+            self._task = asyncio.create_task(self.warm(restored))
+
+    async def wait(self):
+        """Attendre la fin du préchargement (au plus timeout ; immédiat si non démarré)"""
+        if self.ready.is_set() or not self._started:
+            return
+        try:
+            async with asyncio.timeout(self.timeout):
+                await self.ready.wait()
+        except TimeoutError:
+            pass
+
+    async def warm(self, names: Optional[List[str]] = None) -> Dict[str, bool]:
+        """Charger des sections depuis la source, N à la fois"""
+        slots = asyncio.Semaphore(self.concurrency)
+
+        async def _one(section: Section) -> bool:
+            async with slots:
+                started = time.perf_counter()
+                try:
+                    await section.load()
+                except Exception as e:
+                    logger.error("warmup_section_failed", section=section.name, error=str(e))
+                    self.metrics.warmup_sections.labels(section=section.name, source='error').inc()
+                    self.stats['failed'].append(section.name)
+                    return False
+                finally:
+                    self.metrics.warmup_duration.labels(section=section.name).observe(time.perf_counter() - started)
+                self.metrics.warmup_sections.labels(section=section.name, source='database').inc()
+                self.stats['loaded'].append(section.name)
+                return True
+
+        sections = [self.sections[name] for name in (names or self.sections)]
+        results = await asyncio.gather(*(_one(section) for section in sections))
+        return {section.name: ok for section, ok in zip(sections, results)}
+
+    async def stop(self):
+        """Arrêter la revalidation puis écrire l'instantané"""
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        await self.dump()
+
+    # === Instantané ===
+
+    async def _restore(self) -> List[str]:
+        if not self.path:
+            return []
+
+        def _read() -> Optional[bytes]:
+            try:
+                with open(self.path, 'rb') as f:
+                    return f.read()
+            except FileNotFoundError:
+                return None
+
+        try:
+            raw = await asyncio.get_running_loop().run_in_executor(None, _read)
+            if raw is None:
+                return []
+            snapshot = orjson.loads(raw)
+        except (OSError, orjson.JSONDecodeError) as e:
+            logger.warning("warmup_snapshot_unreadable", path=self.path, error=str(e))
+            return []
+
+        age = time.time() - snapshot.get('saved_at', 0)
+        if snapshot.get('version') != SNAPSHOT_VERSION or age > self.max_age:
+            logger.info("warmup_snapshot_stale", age_s=round(age), max_age_s=self.max_age)
+            return []
+
+        restored = []
+        for name, data in snapshot.get('sections', {}).items():
+            section = self.sections.get(name)
+            if section is None or data is None:
+                continue
+            try:
+                if section.restore(data):
+                    restored.append(name)
+                    self.metrics.warmup_sections.labels(section=name, source='snapshot').inc()
+            except Exception as e:
+                logger.warning("warmup_restore_failed", section=name, error=str(e))
+        self.stats['restored'] = restored
+        return restored
+
+    async def dump(self) -> int:
+        """Écrire l'état courant des sections (fichier remplacé atomiquement)"""
+        if not self.path:
+            return 0
+
+        sections = {}
+        for name, section in self.sections.items():
+            try:
+                data = section.export()
+            except Exception as e:
+                logger.warning("warmup_export_failed", section=name, error=str(e))
+                continue
+            if data is not None:
+                sections[name] = data
+
+        body = dumps({'version': SNAPSHOT_VERSION, 'saved_at': time.time(), 'sections': sections})
+
+        def _write():
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            temp = self.path + '.tmp'
+            with open(temp, 'wb') as f:
+                f.write(body)
+            os.replace(temp, self.path)
+
+        try:
+            await asyncio.get_running_loop().run_in_executor(None, _write)
+        except OSError as e:
+            logger.error("warmup_snapshot_failed", path=self.path, error=str(e))
+            return 0
+        logger.info("warmup_snapshot_saved", path=self.path, sections=sorted(sections), bytes=len(body))
+        return len(sections)
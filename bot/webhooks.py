@@ -0,0 +1,416 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+================================================================
+WEBHOOKS - Événements entrants (ERP, alarmes, fournisseurs)
+================================================================
+POST /api/webhooks/{source} : signature HMAC-SHA256 vérifiée, puis
+un seul XADD dans un Redis Stream ; la réponse (202) n'attend pas
+le traitement. Un lecteur par processus (groupe de consommateurs)
+alimente des workers en nombre fixe, qui transforment les
+événements en messages Discord ou en tâches. Un événement en échec
+reste en attente dans le groupe (PEL) : il est repris avec un délai
+croissant, puis déplacé dans une file de lettres mortes après
+max_attempts tentatives. Rien n'est perdu à l'arrêt : les entrées
+non acquittées sont reprises au démarrage suivant.
+================================================================
+"""
+
+import hmac
+import time
+import socket
+import asyncio
+import hashlib
+from dataclasses import dataclass
+from typing import Optional, List, Dict, Any, Callable, Awaitable, Mapping, Set
+
+import orjson
+import structlog
+
+from services import Metrics
+
+logger = structlog.get_logger(__name__)
+
+STREAM = 'webhooks:events'
+DEAD_STREAM = 'webhooks:dead'
+GROUP = 'gvbot'
+SEEN_PREFIX = 'webhooks:seen:'      # Identifiants de livraison déjà traités
+
+SIGNATURE_HEADER = 'x-signature-256'    # sha256=<hex> de "<timestamp>.<corps>"
+TIMESTAMP_HEADER = 'x-webhook-timestamp'
+DELIVERY_HEADER = 'x-webhook-id'        # Optionnel : dédoublonnage des renvois
+
+MAX_BACKOFF = 3600.0
+
+class WebhookError(Exception):
+    """Requête refusée (code HTTP associé)"""
+
+    def __init__(self, status: int, reason: str):
+        super().__init__(reason)
+        self.status = status
+        self.reason = reason
+
+@dataclass(frozen=True)
+class WebhookSource:
+    name: str
+    secret: str
+    channel_id: Optional[int] = None    # Channel par défaut des messages
+
+@dataclass
+class WebhookEvent:
+    id: str                 # Identifiant dans le stream
+    source: str
+    delivery: Optional[str]
+    payload: Dict[str, Any]
+    received_at: float
+    attempt: int
+
+def parse_sources(spec: Optional[str]) -> Dict[str, WebhookSource]:
+    """'erp:secret:channel_id,alarme:secret' -> sources"""
+    sources = {}
+    for item in (spec or '').split(','):
+        parts = item.strip().split(':')
+        if len(parts) < 2 or not parts[0] or not parts[1]:
+            continue
+        name = parts[0].lower()
+        channel_id = int(parts[2]) if len(parts) > 2 and parts[2].isdigit() else None
+        sources[name] = WebhookSource(name, parts[1], channel_id)
+    return sources
+
+def sign(secret: str, timestamp: str, body: bytes) -> str:
+    """Signature attendue dans X-Signature-256"""
+    digest = hmac.new(secret.encode(), timestamp.encode() + b'.' + body, hashlib.sha256).hexdigest()
+    return f"sha256={digest}"
+
+class WebhookQueue:
+    """Réception signée -> Redis Stream -> workers (reprises, lettres mortes)"""
+
+    def __init__(
+        self,
+        redis_getter: Callable,
+        handler: Callable[[WebhookEvent], Awaitable[None]],
+        sources: Dict[str, WebhookSource],
+        workers: int = 4,
+        max_attempts: int = 5,
+        retry_seconds: float = 30.0,
+        stream_maxlen: int = 100000,
+        max_bytes: int = 256 * 1024,
+        tolerance: float = 300.0,
+        dedupe_ttl: int = 86400,
+        block_ms: int = 2000,
+        metrics: Optional[Metrics] = None,
+    ):
+        self.redis_getter = redis_getter
+        self.handler = handler
+        self.sources = sources
+        self.workers = max(1, workers)
+        self.max_attempts = max(1, max_attempts)
+        self.retry_seconds = retry_seconds
+        self.stream_maxlen = stream_maxlen
+        self.max_bytes = max_bytes
+        self.tolerance = tolerance
+        self.dedupe_ttl = dedupe_ttl
+        self.block_ms = block_ms
+        self.metrics = metrics or Metrics(False)
+
+        self.consumer = socket.gethostname()
+        self.stats: Dict[str, int] = {'accepted': 0, 'rejected': 0, 'ok': 0, 'duplicate': 0, 'retry': 0, 'dead': 0}
+
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=self.workers * 2)
+        self._inflight: Set[str] = set()        # Lus par ce processus, pas encore acquittés
+        self._errors: Dict[str, str] = {}       # Dernière erreur par entrée (lettres mortes)
+        self._tasks: List[asyncio.Task] = []
+
+    # === Réception (API) ===
+
+    def verify(self, name: str, body: bytes, headers: Mapping[str, str]) -> WebhookSource:
+        """Source connue, taille, horodatage récent, signature HMAC (comparaison à temps constant)"""
+        source = self.sources.get(name.lower())
+        if source is None:
+            raise WebhookError(404, "Unknown source")
+        if len(body) > self.max_bytes:
+            raise WebhookError(413, "Payload too large")
+
+        timestamp = headers.get(TIMESTAMP_HEADER) or ''
+        signature = headers.get(SIGNATURE_HEADER) or ''
+        try:
+            skew = abs(time.time() - float(timestamp))
+        except ValueError:
+            raise WebhookError(401, "Missing timestamp")
+        if skew > self.tolerance:
+            raise WebhookError(401, "Expired timestamp")  # Rejeu d'une requête capturée
+        if not hmac.compare_digest(signature, sign(source.secret, timestamp, body)):
+            raise WebhookError(401, "Invalid signature")
+        return source
+
+    async def accept(self, name: str, body: bytes, headers: Mapping[str, str]) -> str:
+        """Vérifier puis ajouter au stream ; identifiant de l'entrée"""
+        try:
+            source = self.verify(name, body, headers)
+            try:
+                payload = orjson.loads(body)
+            except orjson.JSONDecodeError:
+                raise WebhookError(400, "Invalid JSON")
+            if not isinstance(payload, dict):
+                raise WebhookError(400, "JSON object expected")
+        except WebhookError as e:
+            self.stats['rejected'] += 1
+            label = name.lower() if name.lower() in self.sources else 'unknown'
+            self.metrics.webhooks_received.labels(source=label, status=str(e.status)).inc()
+            logger.warning("webhook_rejected", source=name, status=e.status, reason=e.reason)
+            raise
+
+        redis = self.redis_getter()
+        if redis is None:
+            raise WebhookError(503, "Queue unavailable")
+
+        fields = {
+            'source': source.name,
+            'body': body.decode(),
+            'delivery': headers.get(DELIVERY_HEADER) or '',
+            'received_at': f"{time.time():.3f}",
+        }
+        try:
+            entry_id = await redis.xadd(STREAM, fields, maxlen=self.stream_maxlen, approximate=True)
+        except Exception as e:
+            logger.error("webhook_enqueue_failed", source=source.name, error=str(e))
+            raise WebhookError(503, "Queue unavailable")
+
+        self.stats['accepted'] += 1
+        self.metrics.webhooks_received.labels(source=source.name, status='202').inc()
+        return entry_id
+
+    # === Cycle de vie ===
+
+    async def start(self):
+        """Créer le groupe, démarrer lecteur, workers et reprises (idempotent)"""
+        if self._tasks:
+            return
+
+        redis = self.redis_getter()
+        if redis is None:
+            logger.warning("webhooks_not_started", reason="redis unavailable")
+            return
+        await self._ensure_group(redis)
+
+        self._tasks = [
+            asyncio.create_task(self._reader()),
+            asyncio.create_task(self._retry_loop()),
+            *(asyncio.create_task(self._worker()) for _ in range(self.workers)),
+        ]
+        logger.info("webhooks_started", sources=sorted(self.sources), workers=self.workers, consumer=self.consumer)
+
+    async def stop(self):
+        """Arrêter sans attendre : les entrées non acquittées restent dans le groupe"""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self._inflight.clear()
+        self._queue = asyncio.Queue(maxsize=self.workers * 2)
+
+    async def _ensure_group(self, redis):
+        try:
+            # '0' : événements reçus par l'API avant la création du groupe
+            await redis.xgroup_create(STREAM, GROUP, id='0', mkstream=True)
+        except Exception as e:
+            if 'BUSYGROUP' not in str(e):
+                raise
+
+    # === Traitement ===
+
+    async def _reader(self):
+        """Nouvelles entrées du groupe -> file locale (bornée : pas de lecture d'avance)"""
+        while True:
+            redis = self.redis_getter()
+            if redis is None:
+                await asyncio.sleep(1)
+                continue
+            try:
+                response = await redis.xreadgroup(GROUP, self.consumer, {STREAM: '>'}, count=self.workers, block=self.block_ms)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                if 'NOGROUP' in str(e):
+                    await self._ensure_group(redis)  # Stream supprimé (FLUSHALL, restauration)
+                else:
+                    logger.error("webhook_read_failed", error=str(e))
+                await asyncio.sleep(1)
+                continue
+
+            for _, entries in response or []:
+                for entry_id, fields in entries:
+                    self._inflight.add(entry_id)
+                    await self._queue.put((entry_id, fields, 1))
+
+    async def _worker(self):
+        while True:
+            entry_id, fields, attempt = await self._queue.get()
+            try:
+                await self._process(entry_id, fields, attempt)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error("webhook_worker_error", entry_id=entry_id, error=str(e))
+            finally:
+                self._inflight.discard(entry_id)
+                self._queue.task_done()
+
+    async def _process(self, entry_id: str, fields: Dict[str, str], attempt: int):
+        redis = self.redis_getter()
+        source = fields.get('source', 'unknown')
+        delivery = fields.get('delivery') or None
+        seen_key = f"{SEEN_PREFIX}{source}:{delivery}" if delivery else None
+        started = time.perf_counter()
+
+        try:
+            if seen_key and await redis.exists(seen_key):
+                status = 'duplicate'
+            else:
+                event = WebhookEvent(
+                    id=entry_id,
+                    source=source,
+                    delivery=delivery,
+                    payload=orjson.loads(fields['body']),
+                    received_at=float(fields.get('received_at') or time.time()),
+                    attempt=attempt,
+                )
+                await self.handler(event)
+                if seen_key:
+                    await redis.set(seen_key, entry_id, ex=self.dedupe_ttl)
+                status = 'ok'
+        except (ValueError, KeyError) as e:
+            # Événement invalide (champ manquant, channel inconnu) : inutile de réessayer
+            self._errors[entry_id] = f"{type(e).__name__}: {e}"[:500]
+            await self._dead(redis, entry_id, attempt)
+            return
+        except Exception as e:
+            self._errors[entry_id] = f"{type(e).__name__}: {e}"[:500]
+            self.stats['retry'] += 1
+            self.metrics.webhooks_processed.labels(source=source, status='retry').inc()
+            logger.warning("webhook_failed", entry_id=entry_id, source=source, attempt=attempt, error=str(e))
+            if attempt >= self.max_attempts:
+                await self._dead(redis, entry_id, attempt)
+            return  # Reste en attente : repris par _retry_loop
+        finally:
+            self.metrics.webhook_processing.labels(source=source).observe(time.perf_counter() - started)
+
+        await redis.xack(STREAM, GROUP, entry_id)
+        self._errors.pop(entry_id, None)
+        self.stats[status] += 1
+        self.metrics.webhooks_processed.labels(source=source, status=status).inc()
+        self.metrics.webhook_delivery_lag.observe(max(0.0, time.time() - float(fields.get('received_at') or time.time())))
+
+    def _backoff(self, deliveries: int) -> float:
+        return min(self.retry_seconds * 2 ** max(0, deliveries - 1), MAX_BACKOFF)
+
+    async def _retry_loop(self):
+        """Reprendre les entrées en attente (échecs, consommateur arrêté) et publier le retard"""
+        interval = max(1.0, min(self.retry_seconds / 2, 15.0))
+        while True:
+            await asyncio.sleep(interval)
+            if self.redis_getter() is None:
+                continue
+            try:
+                await self._retry_pending()
+                await self.refresh_gauges()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error("webhook_retry_failed", error=str(e))
+
+    async def _retry_pending(self):
+        redis = self.redis_getter()
+        pending = await redis.xpending_range(
+            STREAM, GROUP, min='-', max='+', count=100, idle=int(self.retry_seconds * 1000)
+        )
+        for item in pending:
+            entry_id = item['message_id']
+            deliveries = item['times_delivered']
+            if entry_id in self._inflight:
+                continue  # Dans la file locale : pas un échec
+            if item['time_since_delivered'] < self._backoff(deliveries) * 1000:
+                continue
+            if deliveries >= self.max_attempts:
+                await self._dead(redis, entry_id, deliveries)
+                continue
+
+            claimed = await redis.xclaim(
+                STREAM, GROUP, self.consumer, min_idle_time=int(self.retry_seconds * 1000), message_ids=[entry_id]
+            )
+            if not claimed:
+                await redis.xack(STREAM, GROUP, entry_id)  # Entrée supprimée du stream (MAXLEN)
+                continue
+            for claimed_id, fields in claimed:
+                self._inflight.add(claimed_id)
+                await self._queue.put((claimed_id, fields, deliveries + 1))
+
+    async def _dead(self, redis, entry_id: str, attempts: int):
+        """Copier dans la file des lettres mortes, puis acquitter"""
+        entries = await redis.xrange(STREAM, min=entry_id, max=entry_id)
+        fields = dict(entries[0][1]) if entries else {}
+        error = self._errors.pop(entry_id, '')
+        if fields:
+            fields.update({
+                'original_id': entry_id,
+                'attempts': str(attempts),
+                'error': error,
+                'failed_at': f"{time.time():.3f}",
+            })
+            await redis.xadd(DEAD_STREAM, fields, maxlen=self.stream_maxlen, approximate=True)
+        await redis.xack(STREAM, GROUP, entry_id)
+
+        source = fields.get('source', 'unknown')
+        self.stats['dead'] += 1
+        self.metrics.webhooks_processed.labels(source=source, status='dead').inc()
+        logger.error("webhook_dead_letter", entry_id=entry_id, source=source, attempts=attempts, error=error)
+
+    # === Supervision ===
+
+    async def refresh_gauges(self) -> Dict[str, Any]:
+        """Retard du groupe (non lus), en attente (non acquittés), lettres mortes"""
+        redis = self.redis_getter()
+        groups = await redis.xinfo_groups(STREAM)
+        group = next((g for g in groups if g['name'] == GROUP), {})
+        state = {
+            'length': await redis.xlen(STREAM),
+            'lag': group.get('lag') or 0,
+            'pending': group.get('pending', 0),
+            'dead': await redis.xlen(DEAD_STREAM),
+        }
+        self.metrics.webhook_stream_lag.set(state['lag'])
+        self.metrics.webhook_pending.set(state['pending'])
+        self.metrics.webhook_dead_letters.set(state['dead'])
+        return state
+
+    async def status(self, dead_limit: int = 5) -> Dict[str, Any]:
+        """État du stream + dernières lettres mortes"""
+        redis = self.redis_getter()
+        state = await self.refresh_gauges()
+        dead = await redis.xrevrange(DEAD_STREAM, count=dead_limit)
+        state['recent_dead'] = [
+            {'id': entry_id, 'source': fields.get('source'), 'attempts': int(fields.get('attempts') or 0),
+             'error': fields.get('error'), 'failed_at': float(fields.get('failed_at') or 0)}
+            for entry_id, fields in dead
+        ]
+        state['stats'] = dict(self.stats)
+        return state
+
+    async def replay(self, entry_id: Optional[str] = None) -> int:
+        """Remettre une lettre morte (ou toutes) dans le stream principal"""
+        redis = self.redis_getter()
+        if entry_id:
+            entries = await redis.xrange(DEAD_STREAM, min=entry_id, max=entry_id)
+        else:
+            entries = await redis.xrange(DEAD_STREAM, count=1000)
+
+        for dead_id, fields in entries:
+            original = {key: fields[key] for key in ('source', 'body', 'delivery', 'received_at') if key in fields}
+            async with redis.pipeline(transaction=True) as pipe:
+                pipe.xadd(STREAM, original, maxlen=self.stream_maxlen, approximate=True)
+                pipe.xdel(DEAD_STREAM, dead_id)
+                await pipe.execute()
+
+        if entries:
+            logger.info("webhook_replayed", count=len(entries), entry_id=entry_id)
+        return len(entries)
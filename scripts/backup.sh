@@ -1,9 +1,12 @@
 #!/bin/bash
 #================================================================
-# DISCORD BOT MONSTER - SCRIPT BACKUP AUTOMATIQUE
+# DISCORD BOT MONSTER - SCRIPT BACKUP
 #================================================================
 # Usage: ./scripts/backup.sh
-# Cron: 0 3 * * * /opt/stacks/discord-bot-monster/scripts/backup.sh
+# Les sauvegardes PostgreSQL / Redis sont faites par le bot (tâche
+# nightly_backup, chaque nuit à 3h) : ce script la déclenche via
+# l'API, attend la fin, puis archive les configs.
+# Cron (optionnel) : 0 3 * * * /opt/stacks/discord-bot-monster/scripts/backup.sh
 #================================================================
 
 set -e
@@ -11,8 +14,15 @@ set -e
 # Configuration
 BACKUP_DIR="${BACKUP_PATH:-/opt/backups/discord-bot}"
 RETENTION_DAYS="${BACKUP_RETENTION_DAYS:-30}"
+TIMEOUT_MINUTES="${BACKUP_TIMEOUT_MINUTES:-120}"
 DATE=$(date +%Y%m%d_%H%M%S)
 
+# Appel API depuis le conteneur (API_KEY / API_PORT de son environnement)
+api() {
+  docker compose exec -T gvbot sh -c \
+    "curl -sf -X $1 -H \"Authorization: Bearer \$API_KEY\" http://localhost:\${API_PORT:-5000}$2"
+}
+
 echo "================================"
 echo "DISCORD BOT - BACKUP"
 echo "================================"
@@ -20,20 +30,31 @@ echo "Date: $(date)"
 echo "Backup dir: $BACKUP_DIR"
 echo ""
 
-# Créer dossier backup
-mkdir -p "$BACKUP_DIR"/{postgres,redis,configs}
+mkdir -p "$BACKUP_DIR"/configs
+
+# Sauvegarde PostgreSQL + Redis (COPY parallèle, incrémentale, BGSAVE)
+echo "📦 Sauvegarde PostgreSQL + Redis (nightly_backup)..."
+STARTED=$(date -u +%Y-%m-%dT%H:%M:%S)
+api POST /api/jobs/nightly_backup/run > /dev/null
 
-# Backup PostgreSQL
-echo "📦 Backup PostgreSQL..."
-docker compose exec -T postgres_discord pg_dump -U gvb discord_gvb | \
-  gzip > "$BACKUP_DIR/postgres/discord_gvb_$DATE.sql.gz"
-echo "✅ PostgreSQL backup: discord_gvb_$DATE.sql.gz"
+# Attendre la fin : exécution enregistrée (à la fin) après le lancement
+STATUS=""
+for _ in $(seq 1 $((TIMEOUT_MINUTES * 6))); do
+  sleep 10
+  STATUS=$(api GET "/api/jobs?job=nightly_backup&limit=1" | python3 -c "
+import json, sys
+runs = json.load(sys.stdin)['runs']
+if runs and runs[0]['started_at'][:19] >= '$STARTED':
+    print(runs[0]['status'] + (' ' + runs[0]['error'] if runs[0]['error'] else ''))
+" 2>/dev/null || true)
+  [ -n "$STATUS" ] && break
+done
 
-# Backup Redis
-echo "📦 Backup Redis..."
-docker compose exec redis_discord redis-cli SAVE
-docker compose cp redis_discord:/data/dump.rdb "$BACKUP_DIR/redis/dump_$DATE.rdb"
-echo "✅ Redis backup: dump_$DATE.rdb"
+case "$STATUS" in
+  ok*) echo "✅ Sauvegarde terminée" ;;
+  "")  echo "⚠️  Sauvegarde toujours en cours après ${TIMEOUT_MINUTES} min (voir !backup)" ;;
+  *)   echo "❌ Sauvegarde en échec : $STATUS"; exit 1 ;;
+esac
 
 # Backup configs
 echo "📦 Backup configs..."
@@ -41,10 +62,10 @@ tar -czf "$BACKUP_DIR/configs/configs_$DATE.tar.gz" \
   .env docker-compose.yml configs/ bot/*.py 2>/dev/null || true
 echo "✅ Configs backup: configs_$DATE.tar.gz"
 
-# Nettoyage anciens backups
+# Nettoyage anciennes archives de configs (rétention des sauvegardes : gérée par le bot)
 echo ""
-echo "🧹 Nettoyage backups > $RETENTION_DAYS jours..."
-find "$BACKUP_DIR" -type f -mtime +$RETENTION_DAYS -delete
+echo "🧹 Nettoyage configs > $RETENTION_DAYS jours..."
+find "$BACKUP_DIR/configs" -type f -mtime +$RETENTION_DAYS -delete
 echo "✅ Nettoyage terminé"
 
 # Résumé
@@ -52,9 +73,8 @@ echo ""
 echo "================================"
 echo "✅ BACKUP TERMINÉ"
 echo "================================"
-echo "PostgreSQL: $(ls -lh $BACKUP_DIR/postgres/discord_gvb_$DATE.sql.gz | awk '{print $5}')"
-echo "Redis: $(ls -lh $BACKUP_DIR/redis/dump_$DATE.rdb | awk '{print $5}')"
+echo "Dernière sauvegarde: $(ls -1d "$BACKUP_DIR"/*Z 2>/dev/null | tail -1)"
 echo "Configs: $(ls -lh $BACKUP_DIR/configs/configs_$DATE.tar.gz | awk '{print $5}')"
 echo ""
-echo "Total backups: $(find $BACKUP_DIR -type f | wc -l) fichiers"
+echo "Sauvegardes: $(ls -1d "$BACKUP_DIR"/*Z 2>/dev/null | wc -l)"
 echo "Espace utilisé: $(du -sh $BACKUP_DIR | awk '{print $1}')"